@@ -0,0 +1,352 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from saas.logger import get_logger
+
+logger = get_logger("admission")
+
+# Fair-queuing weight of the LLM calls made in the current context. Interactive requests
+# keep the default of 1; background and batch work sets a lower weight with admission_weight().
+admission_weight_var: ContextVar[float] = ContextVar("admission_weight", default=1.0)
+
+
+@contextmanager
+def admission_weight(weight: float):
+    """Queue the LLM calls made inside the block with `weight` (e.g. 0.25 for batch jobs)."""
+    token = admission_weight_var.set(weight)
+    try:
+        yield
+    finally:
+        admission_weight_var.reset(token)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a model's wait queue is full, or a queued call waited too long for a slot."""
+
+    def __init__(self, model: str, retry_after: int, reason: str):
+        super().__init__(f"{model} is at capacity ({reason})")
+        self.model = model
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionSlot:
+    """One admitted call. release() is idempotent, so cleanup paths can all call it."""
+
+    __slots__ = ("_limiter", "_granted_at", "_released", "queued_seconds")
+
+    def __init__(self, limiter: "ModelLimiter", queued_seconds: float):
+        self._limiter = limiter
+        self._granted_at = time.monotonic()
+        self._released = False
+        self.queued_seconds = queued_seconds
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release(time.monotonic() - self._granted_at)
+
+    def __enter__(self) -> "AdmissionSlot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class _Waiter:
+    """A queued caller: a thread blocked on `event`, or a coroutine awaiting `future` on `loop`."""
+
+    __slots__ = ("event", "loop", "future", "user", "start_tag", "granted", "abandoned")
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.user = ""
+        self.start_tag = 0.0
+        self.granted = False
+        self.abandoned = False
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ModelLimiter:
+    """
+    Concurrency limit for one upstream model: at most `max_concurrency` calls in flight,
+    up to `max_queue` more waiting for at most `queue_timeout` seconds, of which one
+    user may hold at most `max_queue_per_user`. Callers beyond that are rejected at once
+    with a Retry-After estimated from recent slot hold times.
+
+    The queue is weighted-fair across users (start-time fair queuing): each waiter is
+    tagged with a virtual finish time of max(now, the user's previous tag) + 1/weight,
+    and a freed slot goes straight to the lowest tag. A user with a burst of queued
+    calls is served in turn with everyone else instead of ahead of them, and a call
+    with half the weight waits as if it cost two.
+
+    Works from threads (acquire) and from the event loop (acquire_async) at once.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        max_queue_per_user: int | None = None,
+        window: int = 2000,
+    ):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user or max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        # (finish tag, arrival order, waiter); abandoned waiters are skipped when popped
+        self._queue: list[tuple[float, int, _Waiter]] = []
+        self._arrivals = itertools.count()
+        self._waiting = 0
+        self._user_waiting: dict[str, int] = {}
+        self._user_finish: dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._lock = threading.Lock()
+        self._avg_hold = 1.0
+        self._queue_waits: deque[float] = deque(maxlen=window)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def acquire(self, user_id: str | None = None) -> AdmissionSlot:
+        """Block the calling thread until a slot is free for user_id. Raises AdmissionRejected."""
+        started = time.monotonic()
+        waiter = self._enqueue(user_id, lambda: _Waiter(event=threading.Event()))
+        if waiter is None:
+            return AdmissionSlot(self, 0.0)
+        waiter.event.wait(self.queue_timeout)
+        return self._admit_or_reject(waiter, started)
+
+    async def acquire_async(self, user_id: str | None = None) -> AdmissionSlot:
+        """Wait on the event loop until a slot is free for user_id. Raises AdmissionRejected."""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        waiter = self._enqueue(user_id, lambda: _Waiter(loop=loop, future=loop.create_future()))
+        if waiter is None:
+            return AdmissionSlot(self, 0.0)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Caller went away while queued: give back a slot handed over in the meantime
+            with self._lock:
+                if not waiter.granted:
+                    self._abandon(waiter)
+                    raise
+            self._release(0.0)
+            raise
+        return self._admit_or_reject(waiter, started)
+
+    def _enqueue(self, user_id: str | None, make_waiter) -> _Waiter | None:
+        """Take a free slot (returns None) or join the queue (returns the waiter)."""
+        user = user_id or ""
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiting:
+                self._active += 1
+                self.admitted += 1
+                self._queue_waits.append(0.0)
+                return None
+            user_waiting = self._user_waiting.get(user, 0)
+            if self._waiting >= self.max_queue or user_waiting >= self.max_queue_per_user:
+                reason = "queue full" if self._waiting >= self.max_queue else "user queue full"
+                self.rejected += 1
+                retry_after = self._retry_after()
+                logger.warning(
+                    "Model at capacity, request rejected",
+                    extra={"model": self.model, "user_id": user_id, "reason": reason, "active": self._active,
+                           "queued": self._waiting, "user_queued": user_waiting, "retry_after": retry_after},
+                )
+                raise AdmissionRejected(self.model, retry_after, reason)
+            waiter = make_waiter()
+            waiter.user = user
+            waiter.start_tag = max(self._virtual_time, self._user_finish.get(user, 0.0))
+            finish_tag = waiter.start_tag + 1.0 / max(admission_weight_var.get(), 0.01)
+            self._user_finish[user] = finish_tag
+            heapq.heappush(self._queue, (finish_tag, next(self._arrivals), waiter))
+            self._waiting += 1
+            self._user_waiting[user] = user_waiting + 1
+            self.queued += 1
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Take a timed-out or cancelled waiter out of the queue. Caller holds the lock."""
+        waiter.abandoned = True
+        self._dequeued(waiter.user)
+
+    def _dequeued(self, user: str) -> None:
+        self._waiting -= 1
+        remaining = self._user_waiting[user] - 1
+        if remaining:
+            self._user_waiting[user] = remaining
+        else:
+            del self._user_waiting[user]
+        if not self._waiting:
+            # Nothing queued: past tags cannot make anyone wait longer, so start afresh
+            self._queue.clear()
+            self._user_finish.clear()
+            self._virtual_time = 0.0
+
+    def _admit_or_reject(self, waiter: _Waiter, started: float) -> AdmissionSlot:
+        waited = time.monotonic() - started
+        with self._lock:
+            if not waiter.granted:
+                self._abandon(waiter)
+                self.timed_out += 1
+                raise AdmissionRejected(self.model, self._retry_after(), "queue timeout")
+            self.admitted += 1
+            self._queue_waits.append(waited)
+        return AdmissionSlot(self, waited)
+
+    def _release(self, held: float) -> None:
+        with self._lock:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+            waiter = None
+            while self._queue and waiter is None:
+                waiter = heapq.heappop(self._queue)[2]
+                if waiter.abandoned:
+                    waiter = None
+            if waiter is not None:
+                self._virtual_time = waiter.start_tag
+                self._dequeued(waiter.user)
+                waiter.granted = True  # the slot passes to the waiter; _active is unchanged
+                if waiter.event is not None:
+                    waiter.event.set()
+                else:
+                    waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+            else:
+                self._active -= 1
+
+    def _retry_after(self) -> int:
+        """Seconds until the queue has likely drained by one slot's worth. Caller holds the lock."""
+        estimate = self._avg_hold * (self._waiting + 1) / max(1, self.max_concurrency)
+        return min(60, max(1, math.ceil(estimate)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._queue_waits)
+
+            def pct(q: float) -> float | None:
+                return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 1) if waits else None
+
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "max_queue_per_user": self.max_queue_per_user,
+                "active": self._active,
+                "waiting": self._waiting,
+                "waiting_users": len(self._user_waiting),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "queue_wait_ms_p50": pct(0.5),
+                "queue_wait_ms_p95": pct(0.95),
+                "queue_wait_ms_max": round(waits[-1] * 1000, 1) if waits else None,
+            }
+
+
+class AdmissionController:
+    """One ModelLimiter per upstream model, created on first use from the configured limits."""
+
+    def __init__(
+        self,
+        limits: dict[str, tuple[int, int]],
+        default_limit: tuple[int, int],
+        queue_timeout: float,
+        user_queue_share: float = 1.0,
+    ):
+        self.limits = limits
+        self.default_limit = default_limit
+        self.queue_timeout = queue_timeout
+        self.user_queue_share = user_queue_share
+        self._limiters: dict[str, ModelLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model: str) -> ModelLimiter:
+        """The limiter for an upstream model name (e.g. "llama-3.3-70b-versatile")."""
+        limiter = self._limiters.get(model)
+        if limiter is not None:
+            return limiter
+        with self._lock:
+            if model not in self._limiters:
+                max_concurrency, max_queue = self.limits.get(model, self.default_limit)
+                self._limiters[model] = ModelLimiter(
+                    model,
+                    max_concurrency,
+                    max_queue,
+                    self.queue_timeout,
+                    max_queue_per_user=max(1, math.ceil(max_queue * self.user_queue_share)),
+                )
+            return self._limiters[model]
+
+    def stats(self) -> dict:
+        return {model: limiter.stats() for model, limiter in list(self._limiters.items())}
+
+
+def _parse_limit(value: str) -> tuple[int, int]:
+    """Parse "concurrency:queue"."""
+    concurrency, _, queue = value.partition(":")
+    return int(concurrency), int(queue or concurrency)
+
+
+def _parse_limits(value: str) -> dict[str, tuple[int, int]]:
+    """Parse "gpt-4o-mini=64:128,meta-llama/Llama-3.1-70B-Instruct=8:16" into a dict."""
+    limits = {}
+    for pair in value.split(","):
+        if "=" in pair:
+            model, limit = pair.rsplit("=", 1)
+            limits[model.strip()] = _parse_limit(limit.strip())
+    return limits
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_admission_controller: AdmissionController | None = None
+_admission_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Return the process-wide admission controller, creating it on first call.
+
+    Configured via env vars:
+        LLM_ADMISSION_LIMITS            upstream model=concurrency:queue pairs, comma-separated
+                                        (default "gpt-4o-mini=64:128,llama-3.3-70b-versatile=16:32,
+                                        meta-llama/Llama-3.1-70B-Instruct=8:16")
+        LLM_ADMISSION_DEFAULT           concurrency:queue for other models (default 32:64)
+        LLM_ADMISSION_QUEUE_TIMEOUT     longest wait for a slot, in seconds (default 10)
+        LLM_ADMISSION_USER_QUEUE_SHARE  largest fraction of a model's queue one user may hold (default 0.5)
+    """
+    global _admission_controller
+    if _admission_controller is None:
+        with _admission_controller_lock:
+            if _admission_controller is None:
+                _admission_controller = AdmissionController(
+                    limits=_parse_limits(os.getenv(
+                        "LLM_ADMISSION_LIMITS",
+                        "gpt-4o-mini=64:128,llama-3.3-70b-versatile=16:32,meta-llama/Llama-3.1-70B-Instruct=8:16",
+                    )),
+                    default_limit=_parse_limit(os.getenv("LLM_ADMISSION_DEFAULT", "32:64")),
+                    queue_timeout=float(os.getenv("LLM_ADMISSION_QUEUE_TIMEOUT", "10")),
+                    user_queue_share=float(os.getenv("LLM_ADMISSION_USER_QUEUE_SHARE", "0.5")),
+                )
+    return _admission_controller
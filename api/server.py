@@ -1,13 +1,21 @@
 import os
+import asyncio
 import base64
-import io
 import json
+import random
+import re
 import time
 import uuid # for generating unique correlation IDs for request tracing
 import threading
+from contextlib import asynccontextmanager
+from difflib import SequenceMatcher
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
 from datetime import datetime, timezone
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,17 +23,50 @@ from pydantic import BaseModel
 from fastapi_clerk_auth import ClerkConfig, ClerkHTTPBearer, HTTPAuthorizationCredentials
 from openai import OpenAI
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
 import boto3
 from botocore.exceptions import ClientError
 from saas.prompts.resume_generator_prompt import system_prompt
-from saas.prompts.message_rewriter_prompt import message_rewriter_system_prompt
+from saas.prompts.message_rewriter_prompt import (
+    VARIATION_SEPARATOR,
+    message_rewriter_system_prompt,
+    single_variation_instructions,
+    variation_strategies,
+)
 from saas.prompts.company_research_prompt import company_research_system_prompt
 from saas.prompts.ats_scorer_prompt import ats_scorer_system_prompt
 from saas.logger import setup_logging, get_logger, correlation_id_var
 from saas.analytics import log_event, log_login_if_new
+from saas.parse_cache import get_parse_cache, make_cache_key
+from saas.document_parser import (
+    DocumentTooLarge,
+    PARSE_MAX_BYTES,
+    PARSE_MAX_OCR_PAGES,
+    PARSE_MAX_RENDER_PIXELS,
+    PARSE_MAX_SECONDS,
+    extract_pdf_layers,
+    ocr_render_pixels,
+    render_pages_job,
+    parse_docx_bytes,
+    prepare_image_for_ocr,
+)
+from saas.parse_pool import get_parse_pool, ParsePoolFull, ParseJobTimeout
+from saas.admission import admission_weight, get_admission_controller
+from saas.llm_providers import PROVIDERS, get_llm_client, get_provider_registry
+from saas.json_stream import JSONStreamParser
+from saas.prompt_budget import fit_prompt
+from saas.rate_limit import RateLimitExceeded, get_rate_limiter
+from saas.response_cache import get_response_cache, make_response_key
+from saas.llm_engine import LLMStream, complete, get_llm_metrics, open_stream, require_provider_key, resolve_route
+from saas.token_usage import get_token_usage, usage_counts
+from saas.document_store import get_document_store, STATUS_FAILED, STATUS_PROCESSING
+from saas.single_flight import (
+    IdempotencyConflict,
+    get_idempotency_store,
+    get_request_coalescer,
+    request_fingerprint,
+)
 from tavily import TavilyClient
-from typing import Literal
+from typing import AsyncIterator, Callable, Iterable, Literal
 from deepagents import create_deep_agent
 from langchain_openai import ChatOpenAI
 
@@ -43,7 +84,31 @@ def _log_event_bg(user_id: str, event_type: str, **kwargs) -> None:
         daemon=True,
     ).start()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the pooled LLM provider clients before the first request; close them on shutdown."""
+    registry = get_provider_registry()
+    registry.build()
+    yield
+    registry.close()
+    await registry.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def _ai_response_logger(user_id: str, endpoint: str, model: str, stream: LLMStream) -> Callable[[str], None]:
+    """on_complete callback for LLMStream.sse(): record the finished response and its token usage in analytics."""
+    def log_response(full_response: str) -> None:
+        _log_event_bg(
+            user_id, "ai_response",
+            endpoint=endpoint,
+            model=model,
+            response_text=full_response[:100_000],
+            response_char_count=len(full_response),
+            **(stream.usage or {}),
+        )
+    return log_response
 
 # Add CORS middleware (allows frontend to call backend)
 app.add_middleware(
@@ -52,6 +117,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Parse-Partial", "X-Parse-Limits"],
 )
 
 
@@ -102,6 +168,37 @@ async def request_logging_middleware(request: Request, call_next):
 clerk_config = ClerkConfig(jwks_url=os.getenv("CLERK_JWKS_URL"))
 clerk_guard = ClerkHTTPBearer(clerk_config)
 
+
+def rate_limited(endpoint: str):
+    """
+    Dependency for AI endpoints: authenticate with clerk_guard, then spend one request
+    from the caller's token bucket for `endpoint` (429 with Retry-After when empty).
+    An endpoint's JSON and /upload variants share one bucket.
+    """
+    def guard(creds: HTTPAuthorizationCredentials = Depends(clerk_guard)) -> HTTPAuthorizationCredentials:
+        try:
+            get_rate_limiter().check(creds.decoded["sub"], endpoint)
+        except RateLimitExceeded as exc:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many requests. Please retry in {exc.retry_after} seconds",
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+        return creds
+    return guard
+
+
+# Clerk user ids allowed to read server-wide operational data; unset means nobody
+ADMIN_USER_IDS = {user_id.strip() for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+
+def admin_only(creds: HTTPAuthorizationCredentials = Depends(clerk_guard)) -> HTTPAuthorizationCredentials:
+    """Dependency for operator endpoints: authenticate with clerk_guard, then 403 unless in ADMIN_USER_IDS."""
+    if creds.decoded["sub"] not in ADMIN_USER_IDS:
+        logger.warning("Admin endpoint access denied", extra={"user_id": creds.decoded["sub"]})
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return creds
+
 # S3 client setup for application tracking
 s3_client = boto3.client(
     's3',
@@ -119,6 +216,8 @@ class ResumeRequest(BaseModel):
     linkedin_profile_pdf: str | None = None
     resume_filename: str | None = None
     linkedin_filename: str | None = None
+    resume_document_id: str | None = None     # from POST /api/documents, in place of resume_pdf
+    linkedin_document_id: str | None = None   # from POST /api/documents, in place of linkedin_profile_pdf
     job_description: str | None = None
     additional_notes: str
     model: str
@@ -130,11 +229,31 @@ class ATSScoreRequest(BaseModel):
     resume_filename: str | None = None
     linkedin_profile_pdf: str | None = None
     linkedin_filename: str | None = None
+    resume_document_id: str | None = None   # from POST /api/documents, in place of resume_pdf
+    linkedin_document_id: str | None = None
     job_description: str | None = None
     role_applied_for: str | None = None
     model: str = "gpt-4o-mini"             # accepted but ignored — scoring always uses gpt-4o-mini for json_object mode
 
 
+class ATSBatchJob(BaseModel):
+    job_description: str
+    id: str | None = None                   # caller's reference (e.g. application id), echoed back
+    role_applied_for: str | None = None     # overrides the batch's role_applied_for
+
+
+class ATSBatchRequest(BaseModel):
+    resume_text: str | None = None
+    resume_pdf: str | None = None
+    resume_filename: str | None = None
+    linkedin_profile_pdf: str | None = None
+    linkedin_filename: str | None = None
+    resume_document_id: str | None = None
+    linkedin_document_id: str | None = None
+    role_applied_for: str | None = None
+    jobs: list[ATSBatchJob]
+
+
 class RoadmapRequest(BaseModel):
     current_job_title: str
     time_to_prep_in_months: int
@@ -143,6 +262,8 @@ class RoadmapRequest(BaseModel):
     linkedin_profile_pdf: str | None = None
     resume_filename: str | None = None
     linkedin_filename: str | None = None
+    resume_document_id: str | None = None     # from POST /api/documents, in place of resume_pdf
+    linkedin_document_id: str | None = None   # from POST /api/documents, in place of linkedin_profile_pdf
     additional_notes: str
     model: str
 
@@ -162,6 +283,7 @@ class MessageRewriteRequest(BaseModel):
     recipient_type: str  # recruiter, hiring_manager, employee, peer
     additional_context: str
     model: str
+    parallel: bool = False  # generate the 3 variations concurrently, as indexed SSE events
 
 
 class CompanyResearchRequest(BaseModel):
@@ -171,133 +293,245 @@ class CompanyResearchRequest(BaseModel):
     model: str
 
 
-#Function to parse PDF content
-def parse_pdf_content(base64_pdf: str) -> str:
+## Hybrid file parsing: PyMuPDF text layer for text-based PDF pages, GPT-4o-mini Vision OCR for scanned pages and images
+
+_IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp", "bmp", "tiff"}
+_MIME_MAP = {
+    "jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png",
+    "gif": "image/gif", "webp": "image/webp", "bmp": "image/bmp", "tiff": "image/tiff",
+}
+_DOC_EXTENSIONS = {"doc", "docx"}
+
+
+# OCR fan-out settings: pages are sent to the vision model concurrently, up to this cap
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "4"))
+OCR_PAGE_TIMEOUT_SECONDS = float(os.getenv("OCR_PAGE_TIMEOUT_SECONDS", "60"))
+OCR_PAGE_RETRIES = int(os.getenv("OCR_PAGE_RETRIES", "1"))
+# Vision detail level for prepared images ("high", "low" or "auto")
+OCR_IMAGE_DETAIL = os.getenv("OCR_IMAGE_DETAIL", "high")
+# Fraction of OCR pages also run with the original settings (2× colour PNG / raw image,
+# detail "high") so accuracy, bytes and vision tokens can be compared in the logs.
+OCR_SHADOW_SAMPLE_RATE = float(os.getenv("OCR_SHADOW_SAMPLE_RATE", "0"))
+# Pages rendered per parse-pool job when rasterizing PDF pages for OCR
+PARSE_RENDER_CHUNK_PAGES = int(os.getenv("PARSE_RENDER_CHUNK_PAGES", "2"))
+
+_OCR_INSTRUCTIONS = (
+    "Extract all text from this document page exactly as it appears. "
+    "Preserve the structure, bullet points, section headings, and formatting. "
+    "Return only the extracted text with no additional commentary."
+)
+
+
+def _ocr_request(client: OpenAI, img_bytes: bytes, mime: str, detail: str, page_num: int) -> tuple[str, int | None]:
+    """
+    Send one page image to the vision model, retrying only this page on failure.
+
+    Returns:
+        (extracted text, prompt tokens billed for the request if reported)
+    """
+    img_b64 = base64.b64encode(img_bytes).decode("utf-8")
+    for attempt in range(OCR_PAGE_RETRIES + 1):
+        try:
+            with get_admission_controller().limiter("gpt-4o-mini").acquire():
+                response = client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[{
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": _OCR_INSTRUCTIONS},
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:{mime};base64,{img_b64}",
+                                    "detail": detail,
+                                },
+                            },
+                        ],
+                    }],
+                    max_tokens=2048,
+                    timeout=OCR_PAGE_TIMEOUT_SECONDS,
+                )
+            page_text = response.choices[0].message.content or ""
+            prompt_tokens = response.usage.prompt_tokens if response.usage else None
+            get_token_usage().record("ocr", "gpt-4o-mini", None, usage_counts(response.usage))
+            logger.debug(
+                "OCR page extracted",
+                extra={
+                    "page": page_num,
+                    "char_count": len(page_text),
+                    "attempt": attempt + 1,
+                    "image_bytes": len(img_bytes),
+                    "prompt_tokens": prompt_tokens,
+                },
+            )
+            return page_text, prompt_tokens
+        except Exception as e:
+            if attempt >= OCR_PAGE_RETRIES:
+                logger.error("OCR page failed", extra={"page": page_num, "error_type": type(e).__name__})
+                raise
+            logger.warning(
+                "OCR page failed, retrying",
+                extra={"page": page_num, "attempt": attempt + 1, "error_type": type(e).__name__},
+            )
+            time.sleep(0.5 * (2 ** attempt))
+    return "", None
+
+
+def _ocr_page(
+    client: OpenAI,
+    img_bytes: bytes,
+    mime: str,
+    page_num: int,
+    baseline: tuple[bytes, str] | None = None,
+) -> str:
     """
-    Parse PDF content from base64 string and extract text.
+    OCR one prepared page image. When a baseline image (original OCR settings) is
+    supplied, OCR it as well and log how closely the prepared image's text matches,
+    alongside the upload bytes and prompt tokens of both.
 
     Args:
-        base64_pdf: Base64 encoded PDF file
+        client:    OpenAI client (constructed with SDK retries disabled)
+        img_bytes: Prepared page image
+        mime:      MIME type of the prepared image
+        page_num:  1-based page number, for logging
+        baseline:  Optional (image_bytes, mime) rendered with the original settings
 
     Returns:
-        Extracted text from the PDF
+        Extracted page text (always from the prepared image)
     """
-    try:
-        # Decode base64 to bytes
-        pdf_bytes = base64.b64decode(base64_pdf)
-        logger.debug("Decoded PDF", extra={"size_bytes": len(pdf_bytes)})
-
-        # Create a BytesIO object from the bytes
-        pdf_file = io.BytesIO(pdf_bytes)
-
-        # Read PDF using PyPDF2
-        pdf_reader = PdfReader(pdf_file)
-        logger.debug("PDF opened", extra={"page_count": len(pdf_reader.pages)})
-
-        # Extract text from all pages
-        text_content = []
-        for i, page in enumerate(pdf_reader.pages):
-            text = page.extract_text()
-            logger.debug("Extracted page text", extra={"page": i + 1, "char_count": len(text)})
-            text_content.append(text)
-
-        # Join all pages with double newline
-        full_text = "\n\n".join(text_content)
-        logger.debug("PDF parsing complete", extra={"total_chars": len(full_text)})
-        return full_text
-    except Exception as e:
-        logger.error("PDF parsing failed", extra={"error_type": type(e).__name__}, exc_info=True)
-        raise HTTPException(status_code=400, detail=f"Error parsing PDF: {str(e)}")
-    
+    page_text, prompt_tokens = _ocr_request(client, img_bytes, mime, OCR_IMAGE_DETAIL, page_num)
+    if baseline is not None:
+        try:
+            baseline_text, baseline_tokens = _ocr_request(client, baseline[0], baseline[1], "high", page_num)
+            logger.info(
+                "OCR shadow comparison",
+                extra={
+                    "page": page_num,
+                    "similarity": round(SequenceMatcher(None, baseline_text, page_text).ratio(), 4),
+                    "image_bytes": len(img_bytes),
+                    "baseline_image_bytes": len(baseline[0]),
+                    "prompt_tokens": prompt_tokens,
+                    "baseline_prompt_tokens": baseline_tokens,
+                    "detail": OCR_IMAGE_DETAIL,
+                },
+            )
+        except Exception as e:
+            logger.warning("OCR shadow comparison failed", extra={"page": page_num, "error_type": type(e).__name__})
+    return page_text
 
-## Hybrid file parsing: PyPDF2 for text-based PDFs, GPT-4o-mini Vision OCR for scanned PDFs and images
 
-_IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp", "bmp", "tiff"}
-_MIME_MAP = {
-    "jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png",
-    "gif": "image/gif", "webp": "image/webp", "bmp": "image/bmp", "tiff": "image/tiff",
-}
-_DOC_EXTENSIONS = {"doc", "docx"}
+def _shadow_sampled() -> bool:
+    """Return True for the fraction of OCR pages selected for a baseline comparison."""
+    return OCR_SHADOW_SAMPLE_RATE > 0 and random.random() < OCR_SHADOW_SAMPLE_RATE
 
 
-def extract_text_with_ocr(file_bytes: bytes, filename: str | None = None) -> str:
+def _ocr_image_file(file_bytes: bytes, ext: str, deadline: float | None = None) -> list[str | None]:
+    """Prepare an uploaded image (see prepare_image_for_ocr) and OCR it as a single page."""
+    logger.debug("OCR: image input detected", extra={"ext": ext})
+    mime = _MIME_MAP.get(ext, "image/jpeg")
+    img_bytes, img_mime = prepare_image_for_ocr(file_bytes, mime)
+    baseline = (file_bytes, mime) if _shadow_sampled() else None
+    return _ocr_images([(img_bytes, img_mime, 1, baseline)], deadline)
+
+
+def ocr_pdf_pages(file_bytes: bytes, pages: list[int], deadline: float | None = None) -> list[str | None]:
     """
-    Extract text from a PDF or image file using GPT-4o-mini Vision OCR.
+    OCR selected pages of a PDF.
 
-    For PDFs: each page is rendered to a PNG via PyMuPDF and sent to the vision model.
-    For images (jpg/png/etc.): the raw bytes are sent directly to the vision model.
+    Pages are rendered in the parse pool in chunks of PARSE_RENDER_CHUNK_PAGES (each
+    chunk opens the document once). Chunks are submitted a few ahead of the OCR
+    consumer, so rasterization overlaps with the OCR requests already in flight.
 
     Args:
-        file_bytes: Raw bytes of the file (PDF or image)
-        filename:   Original filename, used to detect the file type
+        file_bytes: PDF bytes
+        pages:      0-based page indices to OCR
+        deadline:   time.monotonic() value after which no further pages are OCR'd
 
     Returns:
-        Extracted text, one page per block joined with double newlines
+        Extracted text per requested page, in the order requested; None for pages
+        that could not be finished before the deadline
+    """
+    logger.debug("OCR: rendering PDF pages", extra={"ocr_pages": len(pages)})
+    pool = get_parse_pool()
+    chunk_size = max(1, PARSE_RENDER_CHUNK_PAGES)
+    chunks = [pages[i:i + chunk_size] for i in range(0, len(pages), chunk_size)]
+
+    def rendered():
+        pending: deque = deque()
+        next_chunk = 0
+        try:
+            while pending or next_chunk < len(chunks):
+                # Keep a couple of render jobs ahead of the OCR submissions
+                while next_chunk < len(chunks) and len(pending) < 2:
+                    chunk = chunks[next_chunk]
+                    baseline_pages = [i for i in chunk if _shadow_sampled()]
+                    pending.append((chunk, pool.submit(render_pages_job, file_bytes, chunk, baseline_pages)))
+                    next_chunk += 1
+                chunk, future = pending.popleft()
+                for page_index, (img_bytes, mime, baseline_png) in zip(chunk, pool.result(future)):
+                    baseline = (baseline_png, "image/png") if baseline_png else None
+                    yield img_bytes, mime, page_index + 1, baseline
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    results = _ocr_images(rendered(), deadline)
+    # Pages the generator never reached (deadline passed) are missing from the tail
+    return results + [None] * (len(pages) - len(results))
+
+
+def _ocr_images(
+    images: Iterable[tuple[bytes, str, int, tuple[bytes, str] | None]],
+    deadline: float | None = None,
+) -> list[str | None]:
     """
-    import fitz  # PyMuPDF
+    OCR a stream of page images with GPT-4o-mini Vision.
+
+    Pages are OCR'd concurrently (up to OCR_MAX_CONCURRENCY in flight). Each image is
+    submitted as soon as the iterable yields it; a failed page is retried on its own
+    (OCR_PAGE_RETRIES) with a per-request timeout of OCR_PAGE_TIMEOUT_SECONDS.
+
+    Args:
+        images:   Iterable of (image_bytes, mime, 1-based page number, optional baseline image)
+        deadline: time.monotonic() value after which no new pages are submitted and
+                  unfinished pages are abandoned
 
+    Returns:
+        Extracted text per submitted image, in iteration order; None for pages
+        abandoned at the deadline
+    """
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key or api_key.startswith("your_"):
         raise HTTPException(status_code=400, detail="OpenAI API key not configured for OCR")
-    client = OpenAI(api_key=api_key)
+    client = get_llm_client("openai").with_options(max_retries=0)
 
-    ext = (filename or "").lower().rsplit(".", 1)[-1]
-    is_image = ext in _IMAGE_EXTENSIONS
-
-    if is_image:
-        # Direct image upload — send base64 straight to the vision model
-        mime = _MIME_MAP.get(ext, "image/jpeg")
-        pages_b64 = [(base64.b64encode(file_bytes).decode("utf-8"), mime)]
-        logger.debug("OCR: image input detected", extra={"ext": ext})
-    else:
-        # PDF — render each page to PNG at 2× zoom for legibility
-        doc = fitz.open(stream=file_bytes, filetype="pdf")
-        logger.debug("OCR: PDF opened", extra={"page_count": doc.page_count})
-        pages_b64 = []
-        for page_num in range(doc.page_count):
-            page = doc[page_num]
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-            pages_b64.append((base64.b64encode(pix.tobytes("png")).decode("utf-8"), "image/png"))
-        doc.close()
-
-    all_text: list[str] = []
-    for i, (img_b64, mime) in enumerate(pages_b64):
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": (
-                            "Extract all text from this document page exactly as it appears. "
-                            "Preserve the structure, bullet points, section headings, and formatting. "
-                            "Return only the extracted text with no additional commentary."
-                        ),
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:{mime};base64,{img_b64}",
-                            "detail": "high",
-                        },
-                    },
-                ],
-            }],
-            max_tokens=2048,
-        )
-        page_text = response.choices[0].message.content
-        all_text.append(page_text)
-        logger.debug("OCR page extracted", extra={"page": i + 1, "char_count": len(page_text)})
-
-    full_text = "\n\n".join(all_text)
-    logger.debug("OCR extraction complete", extra={"total_chars": len(full_text)})
-    return full_text
+    executor = ThreadPoolExecutor(max_workers=max(1, OCR_MAX_CONCURRENCY), thread_name_prefix="ocr")
+    futures = []
+    try:
+        for img_bytes, mime, page_num, baseline in images:
+            futures.append(executor.submit(_ocr_page, client, img_bytes, mime, page_num, baseline))
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.warning("OCR: parse deadline reached, not submitting further pages", extra={"submitted": len(futures)})
+                break
+
+        # Collect in submission order so page order is preserved
+        results: list[str | None] = []
+        for future in futures:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                results.append(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                results.append(None)
+        return results
+    finally:
+        # Drop pages that have not started; abandoned in-flight requests finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def parse_docx_content(file_bytes: bytes) -> str:
     """
-    Extract text from a .docx (or .doc) file using python-docx.
+    Extract text from a .docx (or .doc) file in the parse pool (streaming XML
+    extraction, python-docx as fallback).
 
     Args:
         file_bytes: Raw bytes of the Word document
@@ -306,20 +540,11 @@ def parse_docx_content(file_bytes: bytes) -> str:
         Extracted text string
     """
     try:
-        from docx import Document as DocxDocument
-        doc = DocxDocument(io.BytesIO(file_bytes))
-        parts: list[str] = []
-        for para in doc.paragraphs:
-            if para.text.strip():
-                parts.append(para.text)
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    if cell.text.strip():
-                        parts.append(cell.text)
-        full_text = "\n\n".join(parts)
+        full_text = get_parse_pool().run(parse_docx_bytes, file_bytes)
         logger.debug("parse_docx_content: succeeded", extra={"char_count": len(full_text)})
         return full_text
+    except (ParsePoolFull, ParseJobTimeout, DocumentTooLarge):
+        raise
     except Exception as e:
         logger.error("DOCX parsing failed", extra={"error_type": type(e).__name__}, exc_info=True)
         raise HTTPException(
@@ -328,253 +553,733 @@ def parse_docx_content(file_bytes: bytes) -> str:
         )
 
 
-def parse_file_content(base64_file: str, filename: str | None = None) -> str:
+class ParseResult(BaseModel):
+    text: str
+    partial: bool = False            # True when a parse budget limit stopped extraction early
+    limits_hit: list[str] = []       # which limits: max_pages, max_ocr_pages, max_rendered_pixels, max_seconds
+    page_count: int = 1
+    ocr_page_count: int = 0
+
+
+def _parse_limits_hit(*results: ParseResult | None) -> list[str]:
+    """Union of the parse limits hit across an endpoint's uploaded documents."""
+    return sorted({limit for r in results if r is not None and r.partial for limit in r.limits_hit})
+
+
+def _parse_warning_headers(*results: ParseResult | None) -> dict[str, str]:
+    """Response headers telling the client that an upload was only partially parsed."""
+    limits = _parse_limits_hit(*results)
+    if not limits:
+        return {}
+    return {"X-Parse-Partial": "true", "X-Parse-Limits": ",".join(limits)}
+
+
+def decode_base64_file(base64_file: str, filename: str | None = None) -> tuple[bytes, str | None]:
+    """Decode a base64 JSON upload into the (file_bytes, filename) pair the parsers take."""
+    # Reject oversized uploads from the encoded length, before allocating the decoded copy
+    if len(base64_file) * 3 // 4 > PARSE_MAX_BYTES:
+        raise _too_large(f"File exceeds {PARSE_MAX_BYTES // (1024 * 1024)} MB")
+    try:
+        return base64.b64decode(base64_file), filename
+    except Exception as e:
+        logger.error("Base64 decode failed", extra={"error_type": type(e).__name__})
+        raise HTTPException(status_code=400, detail=f"Error parsing file: {str(e)}")
+
+
+def decode_request_files(
+    request: ResumeRequest | ATSScoreRequest | RoadmapRequest,
+) -> tuple[tuple[bytes, str | None] | None, tuple[bytes, str | None] | None]:
+    """Decode a JSON request's base64 resume and LinkedIn uploads, either of which may be absent."""
+    resume_file = decode_base64_file(request.resume_pdf, request.resume_filename) if request.resume_pdf else None
+    linkedin_file = (
+        decode_base64_file(request.linkedin_profile_pdf, request.linkedin_filename)
+        if request.linkedin_profile_pdf else None
+    )
+    return resume_file, linkedin_file
+
+
+def read_upload(upload: UploadFile | None) -> tuple[bytes, str | None] | None:
+    """
+    Read a multipart file part into bytes, without any base64 round-trip.
+
+    Starlette spools the part to a SpooledTemporaryFile while receiving the body, so the
+    only full copy held in memory is the bytes handed to the parser.
+
+    Returns:
+        (file_bytes, filename), or None when the part was not sent or is empty
+    """
+    if upload is None:
+        return None
+    upload.file.seek(0)
+    file_bytes = upload.file.read(PARSE_MAX_BYTES + 1)
+    if len(file_bytes) > PARSE_MAX_BYTES:
+        raise _too_large(f"File exceeds {PARSE_MAX_BYTES // (1024 * 1024)} MB")
+    if not file_bytes:
+        return None
+    logger.debug("Multipart file received", extra={"upload_filename": upload.filename, "size_bytes": len(file_bytes)})
+    return file_bytes, upload.filename
+
+
+def _too_large(reason: str) -> HTTPException:
+    logger.warning("Upload rejected by parse budget", extra={"reason": reason})
+    return HTTPException(status_code=413, detail=f"Document too large: {reason}")
+
+
+def parse_document(file_bytes: bytes, filename: str | None = None) -> ParseResult:
     """
     Hybrid file parser. Strategy:
-    - Word documents (.doc, .docx) → python-docx text extraction.
+    - Word documents (.doc, .docx) → streaming extraction of word/document.xml,
+              paragraphs and table cells in document order (python-docx as fallback).
     - Image files (.jpg, .png, etc.) → OCR via GPT-4o-mini Vision directly.
-    - PDFs → try PyPDF2 text extraction first (fast, free).
-              If extracted text is sparse (<200 chars, likely a scanned PDF),
-              fall back to OCR via GPT-4o-mini Vision.
+    - PDFs → PyMuPDF text extraction per page (fast, free). Each page's text layer
+              is classified on its own (see page_text_is_usable); only pages without
+              a usable layer (scanned, image-only, garbled fonts) are rendered and
+              OCR'd via GPT-4o-mini Vision, then merged back in page order.
+
+    Extraction runs under the parse budget (PARSE_MAX_* in saas.document_parser).
+    Uploads over a hard limit get a 413; when a page, pixel, OCR-page or time limit is
+    reached, extraction stops early and the result is flagged partial — or a 422 if
+    nothing usable was extracted by then.
+
+    Complete results are cached by content hash (see saas.parse_cache), so re-uploading
+    the same file to another endpoint skips PDF parsing and OCR entirely.
 
     Args:
-        base64_file: Base64-encoded file content
-        filename:    Original filename (used to detect file type)
+        file_bytes: Raw file content (decoded from base64 or read from a multipart part)
+        filename:   Original filename (used to detect file type)
 
     Returns:
-        Extracted text string
+        ParseResult with the extracted text and partial-result flags
     """
+    if len(file_bytes) > PARSE_MAX_BYTES:
+        raise _too_large(f"File exceeds {PARSE_MAX_BYTES // (1024 * 1024)} MB")
+
     try:
-        file_bytes = base64.b64decode(base64_file)
-        ext = (filename or "").lower().rsplit(".", 1)[-1]
+        file_type = _detect_file_type(filename)
+        cache = get_parse_cache()
+        cache_key = make_cache_key(file_bytes, file_type)
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            logger.debug("parse_document: cache hit", extra={"file_type": file_type, "char_count": len(cached_text)})
+            return ParseResult(text=cached_text)
 
-        if ext in _DOC_EXTENSIONS:
-            logger.debug("parse_file_content: Word document detected, using python-docx", extra={"ext": ext})
-            return parse_docx_content(file_bytes)
+        deadline = time.monotonic() + PARSE_MAX_SECONDS
+        result = _parse_document(file_bytes, file_type, filename, deadline)
 
-        if ext in _IMAGE_EXTENSIONS:
-            logger.debug("parse_file_content: image detected, using OCR", extra={"ext": ext})
-            return extract_text_with_ocr(file_bytes, filename)
+    except HTTPException:
+        raise
+    except DocumentTooLarge as e:
+        raise _too_large(str(e))
+    except ParsePoolFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except ParseJobTimeout:
+        logger.error("parse_document timed out", extra={"upload_filename": filename})
+        raise HTTPException(status_code=422, detail="Document took too long to parse. Please upload a smaller file.")
+    except Exception as e:
+        logger.error("parse_document failed", extra={"error_type": type(e).__name__}, exc_info=True)
+        raise HTTPException(status_code=400, detail=f"Error parsing file: {str(e)}")
 
-        # PDF path — attempt PyPDF2 first
-        try:
-            pdf_reader = PdfReader(io.BytesIO(file_bytes))
-            text_parts = [page.extract_text() or "" for page in pdf_reader.pages]
-            full_text = "\n\n".join(t for t in text_parts if t.strip())
-            if len(full_text.strip()) >= 200:
-                logger.debug("parse_file_content: PyPDF2 succeeded", extra={"char_count": len(full_text)})
-                return full_text
-            logger.debug("parse_file_content: PyPDF2 text sparse, falling back to OCR",
-                         extra={"char_count": len(full_text.strip())})
-        except Exception:
-            logger.debug("parse_file_content: PyPDF2 failed, falling back to OCR")
+    if result.partial:
+        logger.warning(
+            "parse_document: parse budget reached, returning partial result",
+            extra={"upload_filename": filename, "limits_hit": result.limits_hit, "char_count": len(result.text)},
+        )
+        if not result.text.strip():
+            raise HTTPException(
+                status_code=422,
+                detail=f"Could not extract any text within the parse limits ({', '.join(result.limits_hit)})",
+            )
+    else:
+        cache.put(cache_key, result.text)
+    return result
 
-        return extract_text_with_ocr(file_bytes, filename)
 
-    except HTTPException:
+def _detect_file_type(filename: str | None) -> str:
+    """Map an upload's extension to the parser that handles it: "docx", "image" or "pdf"."""
+    ext = (filename or "").lower().rsplit(".", 1)[-1]
+    if ext in _DOC_EXTENSIONS:
+        return "docx"
+    if ext in _IMAGE_EXTENSIONS:
+        return "image"
+    return "pdf"
+
+
+def _parse_document(file_bytes: bytes, file_type: str, filename: str | None, deadline: float) -> ParseResult:
+    """Run the uncached extraction for an already-decoded file."""
+    if file_type == "docx":
+        logger.debug("parse_document: Word document detected, streaming word/document.xml", extra={"upload_filename": filename})
+        return ParseResult(text=parse_docx_content(file_bytes))
+
+    if file_type == "image":
+        logger.debug("parse_document: image detected, using OCR", extra={"upload_filename": filename})
+        image_text = _ocr_image_file(file_bytes, (filename or "").lower().rsplit(".", 1)[-1], deadline)[0]
+        if image_text is None:
+            return ParseResult(text="", partial=True, limits_hit=["max_seconds"], ocr_page_count=1)
+        return ParseResult(text=image_text, ocr_page_count=1)
+
+    # PDF path — open once with PyMuPDF in the parse pool, classify each page's text
+    # layer, and OCR only the pages without one
+    try:
+        text_parts, ocr_indices, page_count, ocr_sizes = get_parse_pool().run(extract_pdf_layers, file_bytes)
+    except (ParsePoolFull, ParseJobTimeout):
         raise
     except Exception as e:
-        logger.error("parse_file_content failed", extra={"error_type": type(e).__name__}, exc_info=True)
-        raise HTTPException(status_code=400, detail=f"Error parsing file: {str(e)}")
+        logger.error("PDF open failed", extra={"error_type": type(e).__name__}, exc_info=True)
+        raise HTTPException(status_code=400, detail=f"Error parsing PDF: {str(e)}")
 
+    limits_hit: list[str] = []
+    if page_count > len(text_parts):
+        limits_hit.append("max_pages")
+    if len(ocr_indices) > PARSE_MAX_OCR_PAGES:
+        limits_hit.append("max_ocr_pages")
+        ocr_indices, ocr_sizes = ocr_indices[:PARSE_MAX_OCR_PAGES], ocr_sizes[:PARSE_MAX_OCR_PAGES]
+
+    # Spend the rendered-pixel budget on pages in document order
+    pixels_left = PARSE_MAX_RENDER_PIXELS
+    budgeted: list[int] = []
+    for i, (width, height) in zip(ocr_indices, ocr_sizes):
+        pixels = ocr_render_pixels(width, height)
+        if pixels > pixels_left:
+            limits_hit.append("max_rendered_pixels")
+            break
+        pixels_left -= pixels
+        budgeted.append(i)
+    ocr_indices = budgeted
+
+    if ocr_indices:
+        logger.debug(
+            "parse_document: pages without a usable text layer, using OCR",
+            extra={"page_count": page_count, "ocr_pages": [i + 1 for i in ocr_indices]},
+        )
+        for i, page_text in zip(ocr_indices, ocr_pdf_pages(file_bytes, ocr_indices, deadline)):
+            if page_text is None:
+                if "max_seconds" not in limits_hit:
+                    limits_hit.append("max_seconds")
+                continue
+            text_parts[i] = page_text
 
+    full_text = "\n\n".join(t for t in text_parts if t.strip())
+    logger.debug(
+        "parse_document: PDF parsed",
+        extra={"char_count": len(full_text), "page_count": page_count, "ocr_page_count": len(ocr_indices)},
+    )
+    return ParseResult(
+        text=full_text,
+        partial=bool(limits_hit),
+        limits_hit=limits_hit,
+        page_count=page_count,
+        ocr_page_count=len(ocr_indices),
+    )
 
 
+## Document ingestion: parse an upload once in the background, then reference it by document_id
 
+DOCUMENT_INGEST_WORKERS = int(os.getenv("DOCUMENT_INGEST_WORKERS", "4"))
+# How long an AI endpoint waits for a referenced document that is still being parsed
+DOCUMENT_WAIT_SECONDS = float(os.getenv("DOCUMENT_WAIT_SECONDS", str(PARSE_MAX_SECONDS)))
 
+# Uploads waiting for an ingest worker, beyond those being parsed; each holds its file in memory
+DOCUMENT_INGEST_MAX_QUEUE = int(os.getenv("DOCUMENT_INGEST_MAX_QUEUE", "16"))
 
-def user_prompt_for(request: ResumeRequest) -> str:
-    prompt_parts = [
-        "Create a professional resume for:",
-        f"Applicant Name: {request.applicant_name}",
-        f"Application Date: {request.application_date}",
-        f"Role Applied For: {request.role_applied_for}",
-    ]
+_ingest_executor = ThreadPoolExecutor(max_workers=DOCUMENT_INGEST_WORKERS, thread_name_prefix="ingest")
+# One slot per queued or running ingest job; POST /api/documents returns 503 when none is free
+_ingest_slots = threading.BoundedSemaphore(DOCUMENT_INGEST_WORKERS + DOCUMENT_INGEST_MAX_QUEUE)
 
-    # Add existing resume content if PDF/image was uploaded
-    if request.resume_pdf:
-        pdf_content = parse_file_content(request.resume_pdf, request.resume_filename)
-        prompt_parts.extend([
-            "",
-            "=== EXISTING RESUME CONTENT ===",
-            pdf_content,
-            "=== END OF EXISTING RESUME ===",
-            "",
-            "Please use the above existing resume as a reference and improve it for the role applied for."
-        ])
 
-    if request.linkedin_profile_pdf:
-        linkedin_pdf_content = parse_file_content(request.linkedin_profile_pdf, request.linkedin_filename)
-        prompt_parts.extend([
-            "",
-            "=== LINKEDIN PROFILE CONTENT ===",
-            "(This is the user's LinkedIn PDF export - use this as the PRIMARY source for contact info and to enrich resume content)",
-            "",
-            linkedin_pdf_content,
-            "",
-            "=== END OF LINKEDIN PROFILE ===",
-            "",
-            "IMPORTANT: When generating the resume, prioritize LinkedIn data for contact information (email, phone, location). Merge skills, experience details, and certifications from both sources. Extract valuable content like headline, recommendations, and endorsements."
-        ])
+def _ingest_document(user_id: str, document_id: str, file_bytes: bytes, filename: str | None) -> None:
+    """Background job: parse (and OCR) an ingested file and store the result."""
+    store = get_document_store()
+    try:
+        result = parse_document(file_bytes, filename)
+    except HTTPException as exc:
+        store.fail(user_id, document_id, str(exc.detail), exc.status_code)
+        logger.warning(
+            "Document ingestion failed",
+            extra={"user_id": user_id, "document_id": document_id, "status_code": exc.status_code},
+        )
+        return
+    except Exception as exc:
+        store.fail(user_id, document_id, f"Error parsing file: {exc}", 500)
+        logger.error("Document ingestion failed", extra={"user_id": user_id, "document_id": document_id}, exc_info=True)
+        return
+    store.complete(
+        user_id, document_id, result.text,
+        partial=result.partial,
+        limits_hit=result.limits_hit,
+        page_count=result.page_count,
+        ocr_page_count=result.ocr_page_count,
+    )
+    logger.info(
+        "Document ingested",
+        extra={
+            "user_id": user_id,
+            "document_id": document_id,
+            "char_count": len(result.text),
+            "partial": result.partial,
+            "ocr_page_count": result.ocr_page_count,
+        },
+    )
+
+
+def _document_response(record: dict, include_text: bool = False) -> dict:
+    """Public view of a stored document record."""
+    response = {k: v for k, v in record.items() if k not in ("text", "content_key")}
+    if include_text:
+        response["text"] = record["text"]
+    return response
+
 
-    if request.job_description:
+def _stored_document(user_id: str, document_id: str) -> ParseResult:
+    """
+    Load a previously ingested document as a ParseResult, waiting up to
+    DOCUMENT_WAIT_SECONDS if it is still being parsed.
+    """
+    record = get_document_store().get(user_id, document_id, wait=DOCUMENT_WAIT_SECONDS)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Document {document_id} not found or expired")
+    if record["status"] == STATUS_PROCESSING:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Document {document_id} is still being processed, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    if record["status"] == STATUS_FAILED:
+        raise HTTPException(
+            status_code=record["error_status"] or 422,
+            detail=f"Document {document_id} could not be parsed: {record['error']}",
+        )
+    logger.debug("Using stored document", extra={"user_id": user_id, "document_id": document_id})
+    return ParseResult(
+        text=record["text"],
+        partial=record["partial"],
+        limits_hit=record["limits_hit"],
+        page_count=record["page_count"],
+        ocr_page_count=record["ocr_page_count"],
+    )
+
+
+def _load_documents(
+    user_id: str,
+    resume_file: tuple[bytes, str | None] | None,
+    linkedin_file: tuple[bytes, str | None] | None,
+    resume_document_id: str | None,
+    linkedin_document_id: str | None,
+) -> tuple[ParseResult | None, ParseResult | None]:
+    """
+    Resolve an endpoint's resume and LinkedIn inputs to parsed documents: an uploaded
+    file is parsed now, a document_id is loaded from the document store.
+
+    Returns:
+        (resume_doc, linkedin_doc), either of which may be None
+    """
+    def load(file: tuple[bytes, str | None] | None, document_id: str | None) -> ParseResult | None:
+        if file is not None:
+            return parse_document(*file)
+        if document_id:
+            return _stored_document(user_id, document_id)
+        return None
+
+    return load(resume_file, resume_document_id), load(linkedin_file, linkedin_document_id)
+
+
+def user_prompt_for(request: ResumeRequest, resume_text: str | None, linkedin_text: str | None) -> str:
+    """Build the resume generation prompt, trimmed to the model's token budget (JD > resume > LinkedIn > notes)."""
+
+    def render(sections: dict[str, str | None]) -> str:
+        prompt_parts = [
+            "Create a professional resume for:",
+            f"Applicant Name: {request.applicant_name}",
+            f"Application Date: {request.application_date}",
+            f"Role Applied For: {request.role_applied_for}",
+        ]
+
+        # Add existing resume content if PDF/image was uploaded
+        if sections["resume"] is not None:
+            prompt_parts.extend([
+                "",
+                "=== EXISTING RESUME CONTENT ===",
+                sections["resume"],
+                "=== END OF EXISTING RESUME ===",
+                "",
+                "Please use the above existing resume as a reference and improve it for the role applied for."
+            ])
+
+        if sections["linkedin"] is not None:
+            prompt_parts.extend([
+                "",
+                "=== LINKEDIN PROFILE CONTENT ===",
+                "(This is the user's LinkedIn PDF export - use this as the PRIMARY source for contact info and to enrich resume content)",
+                "",
+                sections["linkedin"],
+                "",
+                "=== END OF LINKEDIN PROFILE ===",
+                "",
+                "IMPORTANT: When generating the resume, prioritize LinkedIn data for contact information (email, phone, location). Merge skills, experience details, and certifications from both sources. Extract valuable content like headline, recommendations, and endorsements."
+            ])
+
+        if sections["job_description"]:
+            prompt_parts.extend([
+                "",
+                "=== JOB DESCRIPTION (HIGH PRIORITY — tailor resume to match this) ===",
+                sections["job_description"],
+                "=== END OF JOB DESCRIPTION ===",
+                "",
+                "CRITICAL: Use the job description above as the primary tailoring guide. "
+                "Mirror its exact keywords, prioritise matching skills, and rewrite experience "
+                "bullets to directly address the responsibilities and requirements listed."
+            ])
+
+        # Add additional notes
         prompt_parts.extend([
             "",
-            "=== JOB DESCRIPTION (HIGH PRIORITY — tailor resume to match this) ===",
-            request.job_description,
-            "=== END OF JOB DESCRIPTION ===",
-            "",
-            "CRITICAL: Use the job description above as the primary tailoring guide. "
-            "Mirror its exact keywords, prioritise matching skills, and rewrite experience "
-            "bullets to directly address the responsibilities and requirements listed."
+            "Additional Instructions from Applicant:",
+            sections["notes"] if sections["notes"] else "None provided"
         ])
 
-    # Add additional notes
-    prompt_parts.extend([
-        "",
-        "Additional Instructions from Applicant:",
-        request.additional_notes if request.additional_notes else "None provided"
-    ])
-
-    return "\n".join(prompt_parts)
+        return "\n".join(prompt_parts)
+
+    return fit_prompt(
+        "/api/consultation",
+        request.model,
+        render,
+        {
+            "job_description": request.job_description,
+            "resume": resume_text,
+            "linkedin": linkedin_text,
+            "notes": request.additional_notes,
+        },
+    )
 
 
-def user_prompt_for_roadmap(request: RoadmapRequest) -> str:
+def user_prompt_for_roadmap(request: RoadmapRequest, resume_text: str | None, linkedin_text: str | None) -> str:
     """
     Generate user prompt for career roadmap consultation.
 
     Args:
-        request: RoadmapRequest containing career transition details
+        request:       RoadmapRequest containing career transition details
+        resume_text:   Extracted resume text, if a resume was uploaded
+        linkedin_text: Extracted LinkedIn profile text, if one was uploaded
 
     Returns:
-        Formatted prompt string for the AI model
+        Formatted prompt string for the AI model, trimmed to the model's token
+        budget (resume > LinkedIn > notes)
     """
-    prompt_parts = [
-        "Create a detailed career transition roadmap for:",
-        f"Current Role: {request.current_job_title}",
-        f"Target Role: {request.role_applied_for}",
-        f"Preparation Time: {request.time_to_prep_in_months} months",
-    ]
-
-    # Add existing resume content if PDF/image was uploaded
-    if request.resume_pdf:
-        pdf_content = parse_file_content(request.resume_pdf, request.resume_filename)
-        prompt_parts.extend([
-            "",
-            "=== CURRENT RESUME/BACKGROUND ===",
-            pdf_content,
-            "=== END OF RESUME ===",
-            "",
-            "Please analyze the above resume to understand the candidate's current skills and experience."
-        ])
+    def render(sections: dict[str, str | None]) -> str:
+        prompt_parts = [
+            "Create a detailed career transition roadmap for:",
+            f"Current Role: {request.current_job_title}",
+            f"Target Role: {request.role_applied_for}",
+            f"Preparation Time: {request.time_to_prep_in_months} months",
+        ]
 
-    # Add LinkedIn profile content if PDF/image was uploaded
-    if request.linkedin_profile_pdf:
-        linkedin_pdf_content = parse_file_content(request.linkedin_profile_pdf, request.linkedin_filename)
+        # Add existing resume content if PDF/image was uploaded
+        if sections["resume"] is not None:
+            prompt_parts.extend([
+                "",
+                "=== CURRENT RESUME/BACKGROUND ===",
+                sections["resume"],
+                "=== END OF RESUME ===",
+                "",
+                "Please analyze the above resume to understand the candidate's current skills and experience."
+            ])
+
+        # Add LinkedIn profile content if PDF/image was uploaded
+        if sections["linkedin"] is not None:
+            prompt_parts.extend([
+                "",
+                "=== LINKEDIN PROFILE CONTENT ===",
+                "(This provides additional context about the candidate's professional network, endorsements, and career history)",
+                "",
+                sections["linkedin"],
+                "",
+                "=== END OF LINKEDIN PROFILE ===",
+                "",
+                "Use the LinkedIn profile to understand: skills with endorsements (indicating validated strengths), career progression, professional network/connections in target industry, recommendations from colleagues, and any relevant certifications or courses."
+            ])
+
+        # Add additional notes
         prompt_parts.extend([
             "",
-            "=== LINKEDIN PROFILE CONTENT ===",
-            "(This provides additional context about the candidate's professional network, endorsements, and career history)",
-            "",
-            linkedin_pdf_content,
-            "",
-            "=== END OF LINKEDIN PROFILE ===",
+            "Additional Information:",
+            sections["notes"] if sections["notes"] else "None provided",
             "",
-            "Use the LinkedIn profile to understand: skills with endorsements (indicating validated strengths), career progression, professional network/connections in target industry, recommendations from colleagues, and any relevant certifications or courses."
+            "Please provide a comprehensive roadmap that includes:",
+            "- Month-by-month learning plan",
+            "- Recommended resources and courses",
+            "- Key projects to build",
+            "- Interview preparation timeline",
+            "- Networking and application strategy"
         ])
 
-    # Add additional notes
-    prompt_parts.extend([
-        "",
-        "Additional Information:",
-        request.additional_notes if request.additional_notes else "None provided",
-        "",
-        "Please provide a comprehensive roadmap that includes:",
-        "- Month-by-month learning plan",
-        "- Recommended resources and courses",
-        "- Key projects to build",
-        "- Interview preparation timeline",
-        "- Networking and application strategy"
-    ])
+        return "\n".join(prompt_parts)
 
-    return "\n".join(prompt_parts)
+    return fit_prompt(
+        "/api/roadmap_consultation",
+        request.model,
+        render,
+        {"resume": resume_text, "linkedin": linkedin_text, "notes": request.additional_notes},
+    )
 
 
 def build_ats_score_prompt(request: ATSScoreRequest, resume_text: str, linkedin_text: str | None) -> str:
-    parts = ["Score the following resume for ATS compatibility."]
-    if request.role_applied_for:
-        parts.append(f"Target Role: {request.role_applied_for}")
-    parts += ["", "=== RESUME CONTENT ===", resume_text, "=== END OF RESUME ==="]
-    if linkedin_text:
-        parts += [
-            "",
-            "=== LINKEDIN PROFILE (supplementary context) ===",
-            linkedin_text,
-            "=== END OF LINKEDIN ===",
-        ]
-    if request.job_description:
-        parts += [
-            "",
-            "=== JOB DESCRIPTION ===",
-            request.job_description,
-            "=== END OF JOB DESCRIPTION ===",
-        ]
-    else:
-        parts += [
-            "",
-            "NOTE: No job description was provided. Set keyword_matching.score = 0 and keyword_matching.max = 0. "
-            "Score only structural and formatting quality for the remaining categories.",
-        ]
-    return "\n".join(parts)
+    """
+    Build the ATS scoring prompt, trimmed to gpt-4o-mini's token budget (JD > resume > LinkedIn).
+    The resume comes before the role and job description, so scoring one resume against
+    several postings repeats the same prompt prefix and hits the provider's prompt cache.
+    """
+
+    def render(sections: dict[str, str | None]) -> str:
+        parts = ["Score the following resume for ATS compatibility."]
+        parts += ["", "=== RESUME CONTENT ===", sections["resume"], "=== END OF RESUME ==="]
+        if sections["linkedin"]:
+            parts += [
+                "",
+                "=== LINKEDIN PROFILE (supplementary context) ===",
+                sections["linkedin"],
+                "=== END OF LINKEDIN ===",
+            ]
+        if request.role_applied_for:
+            parts += ["", f"Target Role: {request.role_applied_for}"]
+        if sections["job_description"]:
+            parts += [
+                "",
+                "=== JOB DESCRIPTION ===",
+                sections["job_description"],
+                "=== END OF JOB DESCRIPTION ===",
+            ]
+        else:
+            parts += [
+                "",
+                "NOTE: No job description was provided. Set keyword_matching.score = 0 and keyword_matching.max = 0. "
+                "Score only structural and formatting quality for the remaining categories.",
+            ]
+        return "\n".join(parts)
+
+    return fit_prompt(
+        "/api/ats-score",
+        "gpt-4o-mini",
+        render,
+        {"job_description": request.job_description, "resume": resume_text, "linkedin": linkedin_text},
+    )
+
+
+# Document ingestion endpoints
+@app.post("/api/documents", status_code=202)
+def ingest_document(
+    file: UploadFile = File(...),
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/documents")),
+):
+    """
+    Upload a resume or LinkedIn export once and get a document_id back immediately.
+    Parsing (including OCR) runs in the background; poll GET /api/documents/{document_id}
+    or pass the id straight to an AI endpoint as resume_document_id / linkedin_document_id,
+    which waits for parsing to finish. Re-uploading the same file returns the same document.
+    Returns 503 with Retry-After when DOCUMENT_INGEST_MAX_QUEUE uploads are already waiting.
+    """
+    user_id = creds.decoded["sub"]
+    # Take the slot before reading the upload, so a full queue never holds another file
+    if not _ingest_slots.acquire(blocking=False):
+        logger.warning("Document ingest queue full, rejecting upload", extra={"user_id": user_id})
+        raise HTTPException(
+            status_code=503,
+            detail="Document ingestion is at capacity, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    try:
+        upload = read_upload(file)
+        if upload is None:
+            raise HTTPException(status_code=422, detail="Uploaded file is empty")
+        file_bytes, filename = upload
+
+        content_key = make_cache_key(file_bytes, _detect_file_type(filename))
+        record, created = get_document_store().create(user_id, filename, len(file_bytes), content_key)
+        if created:
+            future = _ingest_executor.submit(_ingest_document, user_id, record["document_id"], file_bytes, filename)
+            future.add_done_callback(lambda _: _ingest_slots.release())
+        else:
+            _ingest_slots.release()
+    except BaseException:
+        _ingest_slots.release()
+        raise
+    logger.info(
+        "Document ingestion requested",
+        extra={
+            "user_id": user_id,
+            "document_id": record["document_id"],
+            "size_bytes": len(file_bytes),
+            "reused": not created,
+        },
+    )
+    return _document_response(record)
+
+
+@app.get("/api/documents/{document_id}")
+def get_document(
+    document_id: str,
+    include_text: bool = False,
+    creds: HTTPAuthorizationCredentials = Depends(clerk_guard),
+):
+    """Parse status of an ingested document, optionally with its extracted text."""
+    record = get_document_store().get(creds.decoded["sub"], document_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Document not found or expired")
+    return _document_response(record, include_text=include_text)
+
+
+@app.delete("/api/documents/{document_id}")
+def delete_document(
+    document_id: str,
+    creds: HTTPAuthorizationCredentials = Depends(clerk_guard),
+):
+    """Remove an ingested document before its TTL runs out."""
+    if not get_document_store().delete(creds.decoded["sub"], document_id):
+        raise HTTPException(status_code=404, detail="Document not found or expired")
+    return {"message": "Document deleted successfully", "document_id": document_id}
+
+
+# Duplicate request suppression
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def _with_idempotency(
+    endpoint: str,
+    user_id: str,
+    idempotency_key: str | None,
+    fingerprint: str,
+    response: Response,
+    fn: Callable[[], dict],
+) -> dict:
+    """
+    Run fn() at most once per (user, endpoint, Idempotency-Key). A retry with the same
+    key attaches to the original call while it runs and replays its result afterwards
+    (marked with an Idempotent-Replayed header); reusing the key for a different
+    request is a 422. Without a key, fn() just runs.
+    """
+    if not idempotency_key:
+        return fn()
+    if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters",
+        )
+    try:
+        result, replayed = get_idempotency_store().run(
+            f"{user_id}:{endpoint}:{idempotency_key}", fn, fingerprint
+        )
+    except IdempotencyConflict:
+        logger.warning("Idempotency-Key reused for a different request", extra={"endpoint": endpoint, "user_id": user_id})
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key has already been used for a different request",
+        )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+        logger.info("Idempotent request replayed", extra={"endpoint": endpoint, "user_id": user_id})
+    return result
+
+
+def _ats_score_once(
+    request: ATSScoreRequest,
+    user_id: str,
+    resume_file: tuple[bytes, str | None] | None,
+    linkedin_file: tuple[bytes, str | None] | None,
+    idempotency_key: str | None,
+    response: Response,
+) -> dict:
+    """
+    Score an ATS request, sharing one upstream call between identical concurrent
+    requests from the same user (double-clicks, client retries) and honouring
+    Idempotency-Key.
+    """
+    _require_ats_resume(request, resume_file)
+    fingerprint = request_fingerprint(
+        request.model_dump_json(exclude={"resume_pdf", "linkedin_profile_pdf"}),
+        resume_file[0] if resume_file else None,
+        linkedin_file[0] if linkedin_file else None,
+    )
+
+    def score() -> dict:
+        # Per caller, so requests that join another's upstream call are counted too
+        _log_ats_call("/api/ats-score", request, user_id, resume_file)
+        result, shared = get_request_coalescer().run(
+            f"/api/ats-score:{user_id}:{fingerprint}",
+            lambda: _run_ats_score(request, user_id, resume_file, linkedin_file),
+            fingerprint,
+        )
+        if shared:
+            logger.info("ATS score request coalesced", extra={"endpoint": "/api/ats-score", "user_id": user_id})
+        return result
+
+    return _with_idempotency("/api/ats-score", user_id, idempotency_key, fingerprint, response, score)
 
 
 # API endpoint for ATS scoring
 @app.post("/api/ats-score")
 def ats_score(
     request: ATSScoreRequest,
-    creds: HTTPAuthorizationCredentials = Depends(clerk_guard),
+    response: Response,
+    idempotency_key: str | None = Header(None),
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/ats-score")),
 ):
-    user_id = creds.decoded["sub"]
-    log_login_if_new(user_id)
-    _log_event_bg(
-        user_id, "ai_call",
-        endpoint="/api/ats-score",
-        model="gpt-4o-mini",
-        has_resume_pdf=bool(request.resume_pdf),
-        has_resume_text=bool(request.resume_text),
-        has_job_description=bool(request.job_description),
-        role_applied_for=request.role_applied_for or "",
+    resume_file, linkedin_file = decode_request_files(request)
+    return _ats_score_once(request, creds.decoded["sub"], resume_file, linkedin_file, idempotency_key, response)
+
+
+@app.post("/api/ats-score/upload")
+def ats_score_upload(
+    response: Response,
+    resume_text: str | None = Form(None),
+    job_description: str | None = Form(None),
+    role_applied_for: str | None = Form(None),
+    model: str = Form("gpt-4o-mini"),
+    resume_document_id: str | None = Form(None),
+    linkedin_document_id: str | None = Form(None),
+    resume_file: UploadFile | None = File(None),
+    linkedin_file: UploadFile | None = File(None),
+    idempotency_key: str | None = Header(None),
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/ats-score")),
+):
+    """Multipart/form-data variant of /api/ats-score: files arrive as binary parts, not base64."""
+    request = ATSScoreRequest(
+        resume_text=resume_text,
+        resume_filename=resume_file.filename if resume_file else None,
+        linkedin_filename=linkedin_file.filename if linkedin_file else None,
+        resume_document_id=resume_document_id,
+        linkedin_document_id=linkedin_document_id,
+        job_description=job_description,
+        role_applied_for=role_applied_for,
+        model=model,
     )
-    logger.info(
-        "ATS score request received",
-        extra={"endpoint": "/api/ats-score", "user_id": user_id},
+    return _ats_score_once(
+        request, creds.decoded["sub"], read_upload(resume_file), read_upload(linkedin_file), idempotency_key, response
     )
 
-    if not request.resume_text and not request.resume_pdf:
-        raise HTTPException(status_code=422, detail="Either resume_text or resume_pdf is required")
-
-    if request.resume_text:
-        resume_text = request.resume_text
-    else:
-        resume_text = parse_file_content(request.resume_pdf, request.resume_filename)
 
-    linkedin_text = None
-    if request.linkedin_profile_pdf:
-        linkedin_text = parse_file_content(request.linkedin_profile_pdf, request.linkedin_filename)
+def _score_resume(
+    endpoint: str,
+    request: ATSScoreRequest,
+    user_id: str,
+    resume_text: str,
+    linkedin_text: str | None,
+) -> tuple[dict, dict | None]:
+    """
+    Score already-extracted resume text against request.job_description with gpt-4o-mini.
 
+    Returns:
+        (validated score JSON, usage_counts of the call)
+    """
     user_prompt = build_ats_score_prompt(request, resume_text, linkedin_text)
 
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key or api_key.startswith("your_"):
-        raise HTTPException(status_code=400, detail="OpenAI API key not configured")
-
-    client = OpenAI(api_key=api_key)
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    response = complete(
+        endpoint,
+        "gpt-4o-mini",
+        [
             {"role": "system", "content": ats_scorer_system_prompt},
             {"role": "user", "content": user_prompt},
         ],
+        user_id,
+        cache=True,
         response_format={"type": "json_object"},
         max_tokens=2000,
     )
@@ -585,31 +1290,403 @@ def ats_score(
     except json.JSONDecodeError:
         logger.error("ATS score JSON parse failed", extra={"user_id": user_id, "raw": raw_json[:500]})
         raise HTTPException(status_code=500, detail="ATS scoring returned invalid JSON")
+    _check_ats_result(result, user_id)
+    return result, usage_counts(response.usage)
+
+
+ATS_REQUIRED_KEYS = {"overall_score", "categories", "red_flags", "top_improvements"}
 
-    required_keys = {"overall_score", "categories", "red_flags", "top_improvements"}
-    if not required_keys.issubset(result.keys()):
-        logger.error("ATS score response missing required keys", extra={"user_id": user_id, "keys": list(result.keys())})
+
+def _check_ats_result(result: dict, user_id: str) -> None:
+    """Reject a score JSON that lacks any of ATS_REQUIRED_KEYS."""
+    if not isinstance(result, dict) or not ATS_REQUIRED_KEYS.issubset(result.keys()):
+        keys = list(result.keys()) if isinstance(result, dict) else []
+        logger.error("ATS score response missing required keys", extra={"user_id": user_id, "keys": keys})
         raise HTTPException(status_code=500, detail="ATS scoring response was malformed")
 
+
+def _run_ats_score(
+    request: ATSScoreRequest,
+    user_id: str,
+    resume_file: tuple[bytes, str | None] | None,
+    linkedin_file: tuple[bytes, str | None] | None,
+) -> dict:
+    """Shared body of the JSON and multipart ATS scoring endpoints."""
+    resume_text, linkedin_text, resume_doc, linkedin_doc = _ats_inputs(
+        "/api/ats-score", request, user_id, resume_file, linkedin_file
+    )
+
+    result, usage = _score_resume("/api/ats-score", request, user_id, resume_text, linkedin_text)
+
+    parse_limits = _parse_limits_hit(resume_doc, linkedin_doc)
+    if parse_limits:
+        result["parse_partial"] = True
+        result["parse_limits_hit"] = parse_limits
+
     _log_event_bg(
         user_id, "ai_response",
         endpoint="/api/ats-score",
         model="gpt-4o-mini",
         overall_score=result.get("overall_score"),
         has_job_description=bool(request.job_description),
+        **(usage or {}),
     )
     logger.info("ATS score completed", extra={"user_id": user_id, "overall_score": result.get("overall_score")})
     return result
 
 
+def _require_ats_resume(request: ATSScoreRequest, resume_file: tuple[bytes, str | None] | None) -> None:
+    """422 unless the request carries a resume as text, an upload or a stored document."""
+    if not request.resume_text and resume_file is None and not request.resume_document_id:
+        raise HTTPException(status_code=422, detail="One of resume_text, resume_pdf or resume_document_id is required")
+
+
+def _log_ats_call(
+    endpoint: str,
+    request: ATSScoreRequest,
+    user_id: str,
+    resume_file: tuple[bytes, str | None] | None,
+) -> None:
+    """Record one caller's ATS scoring request (the ai_call analytics event)."""
+    log_login_if_new(user_id)
+    _log_event_bg(
+        user_id, "ai_call",
+        endpoint=endpoint,
+        model="gpt-4o-mini",
+        has_resume_pdf=resume_file is not None,
+        has_resume_document=bool(request.resume_document_id),
+        has_resume_text=bool(request.resume_text),
+        has_job_description=bool(request.job_description),
+        role_applied_for=request.role_applied_for or "",
+    )
+    logger.info(
+        "ATS score request received",
+        extra={"endpoint": endpoint, "user_id": user_id},
+    )
+
+
+def _ats_inputs(
+    endpoint: str,
+    request: ATSScoreRequest,
+    user_id: str,
+    resume_file: tuple[bytes, str | None] | None,
+    linkedin_file: tuple[bytes, str | None] | None,
+) -> tuple[str, str | None, ParseResult | None, ParseResult | None]:
+    """
+    Resolve an ATS scoring request's resume and LinkedIn text (see _require_ats_resume).
+
+    Returns:
+        (resume_text, linkedin_text, resume_doc, linkedin_doc) — the docs are None for
+        inputs that were not parsed here
+    """
+    # Pasted/generated resume text takes precedence over any uploaded or stored resume
+    resume_doc, linkedin_doc = _load_documents(
+        user_id,
+        None if request.resume_text else resume_file,
+        linkedin_file,
+        None if request.resume_text else request.resume_document_id,
+        request.linkedin_document_id,
+    )
+    resume_text = request.resume_text or resume_doc.text
+    linkedin_text = linkedin_doc.text if linkedin_doc else None
+    return resume_text, linkedin_text, resume_doc, linkedin_doc
+
+
+def _sse_event(event: str, data) -> str:
+    """One named SSE event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Score JSON members streamed as their own events; each "categories" entry is a "category" event
+_ATS_STREAM_EVENTS = {("overall_score",), ("red_flags",), ("top_improvements",)}
+
+
+async def _ats_score_events(
+    stream: LLMStream,
+    request: ATSScoreRequest,
+    user_id: str,
+    parse_limits: list[str],
+) -> AsyncIterator[str]:
+    """SSE events for a streaming ATS score, emitted as each part of the JSON completes."""
+    parser = JSONStreamParser(expand=("categories",))
+    first_event_ms = None
+    try:
+        async for text in stream.text():
+            for path, value in parser.feed(text):
+                if path in _ATS_STREAM_EVENTS:
+                    event = _sse_event(path[0], value)
+                elif path[0] == "categories" and len(path) == 2:
+                    event = _sse_event("category", {"name": path[1], **value} if isinstance(value, dict)
+                                       else {"name": path[1], "value": value})
+                else:
+                    continue
+                if first_event_ms is None:
+                    first_event_ms = round((time.perf_counter() - stream.started) * 1000, 1)
+                yield event
+        result = parser.result()
+        _check_ats_result(result, user_id)
+    except HTTPException as exc:
+        yield _sse_event("error", {"status_code": exc.status_code, "detail": exc.detail})
+        return
+    except json.JSONDecodeError:
+        # Raised by feed() for a malformed member, or by result() for an incomplete object
+        logger.error("ATS score JSON parse failed", extra={"user_id": user_id, "raw": parser.text[:500]})
+        yield _sse_event("error", {"status_code": 500, "detail": "ATS scoring returned invalid JSON"})
+        return
+    except Exception:
+        # LLMStream has already logged the upstream error
+        yield _sse_event("error", {"status_code": 502, "detail": "ATS scoring stream failed"})
+        return
+
+    if parse_limits:
+        result["parse_partial"] = True
+        result["parse_limits_hit"] = parse_limits
+    yield _sse_event("result", result)
+
+    _log_event_bg(
+        user_id, "ai_response",
+        endpoint="/api/ats-score/stream",
+        model="gpt-4o-mini",
+        overall_score=result.get("overall_score"),
+        has_job_description=bool(request.job_description),
+        first_event_ms=first_event_ms,
+        **(stream.usage or {}),
+    )
+    logger.info(
+        "ATS score completed",
+        extra={"user_id": user_id, "overall_score": result.get("overall_score"), "first_event_ms": first_event_ms},
+    )
+
+
+@app.post("/api/ats-score/stream")
+async def ats_score_stream(
+    request: ATSScoreRequest,
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/ats-score")),
+):
+    """
+    Streaming variant of /api/ats-score: server-sent events as the score JSON is generated.
+
+        event: overall_score      data: the overall score
+        event: category           data: {"name": "<category key>", ...that category's fields}
+        event: red_flags          data: the red_flags list
+        event: top_improvements   data: the top_improvements list
+        event: result             data: the complete, validated score (as /api/ats-score returns)
+        event: error              data: {"status_code", "detail"} — last event when scoring fails
+
+    Events follow the model's output order; "result" is only sent once all required keys
+    are present.
+    """
+    user_id = creds.decoded["sub"]
+    resume_file, linkedin_file = await run_in_threadpool(decode_request_files, request)
+    _require_ats_resume(request, resume_file)
+    await run_in_threadpool(_log_ats_call, "/api/ats-score/stream", request, user_id, resume_file)
+    resume_text, linkedin_text, resume_doc, linkedin_doc = await run_in_threadpool(
+        _ats_inputs, "/api/ats-score/stream", request, user_id, resume_file, linkedin_file
+    )
+    user_prompt = await run_in_threadpool(build_ats_score_prompt, request, resume_text, linkedin_text)
+
+    stream = await open_stream(
+        "/api/ats-score/stream",
+        "gpt-4o-mini",
+        [
+            {"role": "system", "content": ats_scorer_system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        user_id,
+        cache=True,
+        response_format={"type": "json_object"},
+        max_tokens=2000,
+    )
+    return StreamingResponse(
+        _ats_score_events(stream, request, user_id, _parse_limits_hit(resume_doc, linkedin_doc)),
+        media_type="text/event-stream",
+        headers=_parse_warning_headers(resume_doc, linkedin_doc),
+    )
+
+
+# Batch ATS scoring: one resume against many job descriptions
+ATS_BATCH_MAX_JOBS = int(os.getenv("ATS_BATCH_MAX_JOBS", "25"))
+ATS_BATCH_CONCURRENCY = int(os.getenv("ATS_BATCH_CONCURRENCY", "4"))
+# Fair-queuing weight of batch scoring calls, so they yield to interactive requests
+ATS_BATCH_ADMISSION_WEIGHT = float(os.getenv("ATS_BATCH_ADMISSION_WEIGHT", "0.5"))
+
+
+def _score_batch_job(
+    request: ATSBatchRequest,
+    job: ATSBatchJob,
+    user_id: str,
+    resume_text: str,
+    linkedin_text: str | None,
+) -> tuple[dict, dict | None]:
+    """Score the batch's resume against one job description (runs in the threadpool)."""
+    job_request = ATSScoreRequest(
+        job_description=job.job_description,
+        role_applied_for=job.role_applied_for or request.role_applied_for,
+    )
+    with admission_weight(ATS_BATCH_ADMISSION_WEIGHT):
+        return _score_resume("/api/ats-score/batch", job_request, user_id, resume_text, linkedin_text)
+
+
+@app.post("/api/ats-score/batch")
+async def ats_score_batch(
+    request: ATSBatchRequest,
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/ats-score/batch")),
+):
+    """
+    Score one resume against up to ATS_BATCH_MAX_JOBS job descriptions. The resume is
+    parsed once and the jobs are scored concurrently, ATS_BATCH_CONCURRENCY at a time.
+
+    Streams NDJSON, one line per job as it finishes:
+        {"type": "result", "index", "id", "result": {...ATS score...}}
+        {"type": "error",  "index", "id", "status_code", "detail"}
+    then one summary line, jobs ranked by overall_score (highest first):
+        {"type": "summary", "succeeded", "failed", "ranking": [{"index", "id", "overall_score"}]}
+    """
+    user_id = creds.decoded["sub"]
+    if not request.jobs or len(request.jobs) > ATS_BATCH_MAX_JOBS:
+        raise HTTPException(status_code=422, detail=f"Provide between 1 and {ATS_BATCH_MAX_JOBS} jobs")
+    if not request.resume_text and not request.resume_pdf and not request.resume_document_id:
+        raise HTTPException(status_code=422, detail="One of resume_text, resume_pdf or resume_document_id is required")
+
+    await run_in_threadpool(log_login_if_new, user_id)
+    _log_event_bg(
+        user_id, "ai_call",
+        endpoint="/api/ats-score/batch",
+        model="gpt-4o-mini",
+        job_count=len(request.jobs),
+        has_resume_pdf=bool(request.resume_pdf),
+        has_resume_document=bool(request.resume_document_id),
+        has_resume_text=bool(request.resume_text),
+    )
+    logger.info(
+        "ATS batch request received",
+        extra={"endpoint": "/api/ats-score/batch", "user_id": user_id, "job_count": len(request.jobs)},
+    )
+
+    resume_file, linkedin_file = await run_in_threadpool(decode_request_files, request)
+    # Pasted/generated resume text takes precedence over any uploaded or stored resume
+    resume_doc, linkedin_doc = await run_in_threadpool(
+        _load_documents,
+        user_id,
+        None if request.resume_text else resume_file,
+        linkedin_file,
+        None if request.resume_text else request.resume_document_id,
+        request.linkedin_document_id,
+    )
+    resume_text = request.resume_text or resume_doc.text
+    linkedin_text = linkedin_doc.text if linkedin_doc else None
+    parse_limits = _parse_limits_hit(resume_doc, linkedin_doc)
+
+    semaphore = asyncio.Semaphore(ATS_BATCH_CONCURRENCY)
+
+    async def score(index: int, job: ATSBatchJob) -> dict:
+        async with semaphore:
+            try:
+                result, usage = await run_in_threadpool(
+                    _score_batch_job, request, job, user_id, resume_text, linkedin_text
+                )
+            except HTTPException as exc:
+                return {"type": "error", "index": index, "id": job.id,
+                        "status_code": exc.status_code, "detail": exc.detail}
+            except Exception:
+                logger.error("ATS batch job failed", extra={"user_id": user_id, "job_index": index}, exc_info=True)
+                return {"type": "error", "index": index, "id": job.id,
+                        "status_code": 500, "detail": "ATS scoring failed"}
+        if parse_limits:
+            result["parse_partial"] = True
+            result["parse_limits_hit"] = parse_limits
+        _log_event_bg(
+            user_id, "ai_response",
+            endpoint="/api/ats-score/batch",
+            model="gpt-4o-mini",
+            job_index=index,
+            overall_score=result.get("overall_score"),
+            **(usage or {}),
+        )
+        return {"type": "result", "index": index, "id": job.id, "result": result}
+
+    async def results():
+        tasks = [asyncio.ensure_future(score(index, job)) for index, job in enumerate(request.jobs)]
+        ranking, failed = [], 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                line = await finished
+                if line["type"] == "result":
+                    ranking.append(
+                        {"index": line["index"], "id": line["id"], "overall_score": line["result"].get("overall_score")}
+                    )
+                else:
+                    failed += 1
+                yield json.dumps(line) + "\n"
+        finally:
+            # Client went away mid-batch: don't start the jobs still waiting for a slot
+            for task in tasks:
+                task.cancel()
+        ranking.sort(key=lambda entry: entry["overall_score"] if isinstance(entry["overall_score"], (int, float)) else -1,
+                     reverse=True)
+        logger.info(
+            "ATS batch completed",
+            extra={"user_id": user_id, "job_count": len(request.jobs), "failed": failed},
+        )
+        yield json.dumps({"type": "summary", "succeeded": len(ranking), "failed": failed, "ranking": ranking}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 # API endpoint for resume consultation
 @app.post("/api/consultation")
-def consultation_summary(
+async def consultation_summary(
     request: ResumeRequest,
-    creds: HTTPAuthorizationCredentials = Depends(clerk_guard),
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/consultation")),
 ):
-    user_id = creds.decoded["sub"]
-    log_login_if_new(user_id)
+    # Decoding a multi-MB base64 body is CPU work; keep it off the event loop
+    resume_file, linkedin_file = await run_in_threadpool(decode_request_files, request)
+    return await _run_consultation(request, creds.decoded["sub"], resume_file, linkedin_file)
+
+
+@app.post("/api/consultation/upload")
+async def consultation_summary_upload(
+    applicant_name: str = Form(...),
+    application_date: str = Form(...),
+    role_applied_for: str = Form(...),
+    model: str = Form(...),
+    additional_notes: str = Form(""),
+    job_description: str | None = Form(None),
+    resume_document_id: str | None = Form(None),
+    linkedin_document_id: str | None = Form(None),
+    resume_file: UploadFile | None = File(None),
+    linkedin_file: UploadFile | None = File(None),
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/consultation")),
+):
+    """Multipart/form-data variant of /api/consultation: files arrive as binary parts, not base64."""
+    request = ResumeRequest(
+        applicant_name=applicant_name,
+        application_date=application_date,
+        role_applied_for=role_applied_for,
+        resume_filename=resume_file.filename if resume_file else None,
+        linkedin_filename=linkedin_file.filename if linkedin_file else None,
+        resume_document_id=resume_document_id,
+        linkedin_document_id=linkedin_document_id,
+        job_description=job_description,
+        additional_notes=additional_notes,
+        model=model,
+    )
+    return await _run_consultation(
+        request,
+        creds.decoded["sub"],
+        await run_in_threadpool(read_upload, resume_file),
+        await run_in_threadpool(read_upload, linkedin_file),
+    )
+
+
+async def _run_consultation(
+    request: ResumeRequest,
+    user_id: str,
+    resume_file: tuple[bytes, str | None] | None,
+    linkedin_file: tuple[bytes, str | None] | None,
+) -> StreamingResponse:
+    """Shared body of the JSON and multipart resume consultation endpoints."""
+    await run_in_threadpool(log_login_if_new, user_id)
     _log_event_bg(
         user_id, "ai_call",
         endpoint="/api/consultation",
@@ -618,144 +1695,89 @@ def consultation_summary(
         role_applied_for=request.role_applied_for,
         job_description=(request.job_description or "")[:2000],
         additional_notes=request.additional_notes or "",
-        has_resume_pdf=bool(request.resume_pdf),
-        has_linkedin_pdf=bool(request.linkedin_profile_pdf),
+        has_resume_pdf=resume_file is not None,
+        has_linkedin_pdf=linkedin_file is not None,
+        has_resume_document=bool(request.resume_document_id),
+        has_linkedin_document=bool(request.linkedin_document_id),
     )
     logger.info(
         "AI request received",
         extra={"endpoint": "/api/consultation", "user_id": user_id, "model": request.model},
     )
 
-    user_prompt = user_prompt_for(request)
+    resume_doc, linkedin_doc = await run_in_threadpool(
+        _load_documents,
+        user_id, resume_file, linkedin_file, request.resume_document_id, request.linkedin_document_id,
+    )
+    resume_text = resume_doc.text if resume_doc else None
+    linkedin_text = linkedin_doc.text if linkedin_doc else None
+    user_prompt = await run_in_threadpool(user_prompt_for, request, resume_text, linkedin_text)
     prompt = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
 
-    # Select the appropriate model and client based on user's choice
-    try:
-        if request.model == "gpt-4o-mini":
-            # OpenAI GPT model
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="OpenAI API key not configured")
-
-            client = OpenAI(api_key=api_key)
-            stream = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=prompt,
-                stream=True,
-            )
-        elif request.model == "grok-beta":
-            # xAI Grok model (uses OpenAI-compatible API)
-            api_key = os.getenv("XAI_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="xAI API key not configured. Please add your XAI_API_KEY to the .env file")
-
-            client = OpenAI(
-                base_url="https://api.groq.com/openai/v1",
-                api_key=os.getenv("XAI_API_KEY"),
-            )
-
-            stream = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=prompt,
-                stream=True,
-            )
-        elif request.model == "llama-70b":
-            # Hugging Face Llama model
-            api_key = os.getenv("HUGGINGFACE_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="Hugging Face API key not configured. Please add your HUGGINGFACE_API_KEY to the .env file")
-
-            try:
-                hf_client = OpenAI(
-                    base_url="https://router.huggingface.co/v1",
-                    api_key=api_key,
-                )
-                logger.debug(
-                    "HuggingFace request",
-                    extra={"model": "meta-llama/Llama-3.1-70B-Instruct", "max_tokens": 2048},
-                )
-                stream = hf_client.chat.completions.create(
-                    model="meta-llama/Llama-3.1-70B-Instruct",
-                    messages=prompt,
-                    stream=True,
-                    max_tokens=2048,
-                )
-            except Exception as e:
-                extra = {"error_type": type(e).__name__, "model": "llama-70b"}
-                if hasattr(e, 'response'):
-                    extra["response_status"] = e.response.status_code
-                    extra["response_body"] = e.response.text
-                logger.error("HuggingFace API error", extra=extra, exc_info=True)
-                raise HTTPException(status_code=500, detail=f"Hugging Face API error: {str(e)}")
-
-        else:
-            # Default to GPT if unknown model
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="OpenAI API key not configured")
-
-            client = OpenAI(api_key=api_key)
-            stream = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=prompt,
-                stream=True,
-            )
-    except HTTPException:
-        raise
-    except Exception as e:
-        error_msg = str(e)
-        if "Incorrect API key" in error_msg or "invalid" in error_msg.lower():
-            logger.warning("Invalid API key", extra={"model": request.model, "user_id": user_id})
-            raise HTTPException(status_code=400, detail=f"Invalid API key for {request.model}. Please check your API key configuration in the .env file")
-        elif "authentication" in error_msg.lower():
-            logger.warning("Authentication failed", extra={"model": request.model, "user_id": user_id})
-            raise HTTPException(status_code=401, detail=f"Authentication failed for {request.model}. Please verify your API key")
-        else:
-            logger.error("Model initialization error", extra={"model": request.model, "user_id": user_id}, exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Error initializing {request.model}: {error_msg}")
-
-    def event_stream():
-        logger.info("AI stream started", extra={"endpoint": "/api/consultation", "user_id": user_id, "model": request.model})
-        full_response_parts: list[str] = []
-        try:
-            for chunk in stream:
-                text = chunk.choices[0].delta.content
-                if text:
-                    full_response_parts.append(text)
-                    lines = text.split("\n")
-                    for line in lines[:-1]:
-                        yield f"data: {line}\n\n"
-                        yield "data:  \n"
-                    yield f"data: {lines[-1]}\n\n"
-            full_response = "".join(full_response_parts)
-            logger.info("AI stream completed", extra={"endpoint": "/api/consultation", "user_id": user_id, "model": request.model, "response_chars": len(full_response)})
-            _log_event_bg(
-                user_id, "ai_response",
-                endpoint="/api/consultation",
-                model=request.model,
-                response_text=full_response[:100_000],
-                response_char_count=len(full_response),
-            )
-        except Exception as e:
-            logger.error("AI stream error", extra={"endpoint": "/api/consultation", "user_id": user_id, "model": request.model}, exc_info=True)
-            raise
-
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    stream = await open_stream("/api/consultation", request.model, prompt, user_id, cache=True)
+    return StreamingResponse(
+        stream.sse(on_complete=_ai_response_logger(user_id, "/api/consultation", request.model, stream)),
+        media_type="text/event-stream",
+        headers=_parse_warning_headers(resume_doc, linkedin_doc),
+    )
 
 
 #API for roadmap consultation
 
 @app.post("/api/roadmap_consultation")
-def roadmap_consultation_summary(
+async def roadmap_consultation_summary(
     request: RoadmapRequest,
-    creds: HTTPAuthorizationCredentials = Depends(clerk_guard),
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/roadmap_consultation")),
 ):
-    user_id = creds.decoded["sub"]
-    log_login_if_new(user_id)
-    log_event(
+    resume_file, linkedin_file = await run_in_threadpool(decode_request_files, request)
+    return await _run_roadmap_consultation(request, creds.decoded["sub"], resume_file, linkedin_file)
+
+
+@app.post("/api/roadmap_consultation/upload")
+async def roadmap_consultation_summary_upload(
+    current_job_title: str = Form(...),
+    time_to_prep_in_months: int = Form(...),
+    role_applied_for: str = Form(...),
+    model: str = Form(...),
+    additional_notes: str = Form(""),
+    resume_document_id: str | None = Form(None),
+    linkedin_document_id: str | None = Form(None),
+    resume_file: UploadFile | None = File(None),
+    linkedin_file: UploadFile | None = File(None),
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/roadmap_consultation")),
+):
+    """Multipart/form-data variant of /api/roadmap_consultation: files arrive as binary parts, not base64."""
+    request = RoadmapRequest(
+        current_job_title=current_job_title,
+        time_to_prep_in_months=time_to_prep_in_months,
+        role_applied_for=role_applied_for,
+        resume_filename=resume_file.filename if resume_file else None,
+        linkedin_filename=linkedin_file.filename if linkedin_file else None,
+        resume_document_id=resume_document_id,
+        linkedin_document_id=linkedin_document_id,
+        additional_notes=additional_notes,
+        model=model,
+    )
+    return await _run_roadmap_consultation(
+        request,
+        creds.decoded["sub"],
+        await run_in_threadpool(read_upload, resume_file),
+        await run_in_threadpool(read_upload, linkedin_file),
+    )
+
+
+async def _run_roadmap_consultation(
+    request: RoadmapRequest,
+    user_id: str,
+    resume_file: tuple[bytes, str | None] | None,
+    linkedin_file: tuple[bytes, str | None] | None,
+) -> StreamingResponse:
+    """Shared body of the JSON and multipart roadmap consultation endpoints."""
+    await run_in_threadpool(log_login_if_new, user_id)
+    _log_event_bg(
         user_id, "ai_call",
         endpoint="/api/roadmap_consultation",
         model=request.model,
@@ -763,167 +1785,50 @@ def roadmap_consultation_summary(
         role_applied_for=request.role_applied_for,
         time_to_prep_in_months=request.time_to_prep_in_months,
         additional_notes=request.additional_notes or "",
-        has_resume_pdf=bool(request.resume_pdf),
-        has_linkedin_pdf=bool(request.linkedin_profile_pdf),
+        has_resume_pdf=resume_file is not None,
+        has_linkedin_pdf=linkedin_file is not None,
+        has_resume_document=bool(request.resume_document_id),
+        has_linkedin_document=bool(request.linkedin_document_id),
     )
     logger.info(
         "AI request received",
         extra={"endpoint": "/api/roadmap_consultation", "user_id": user_id, "model": request.model},
     )
 
-    user_prompt = user_prompt_for_roadmap(request)
+    resume_doc, linkedin_doc = await run_in_threadpool(
+        _load_documents,
+        user_id, resume_file, linkedin_file, request.resume_document_id, request.linkedin_document_id,
+    )
+    resume_text = resume_doc.text if resume_doc else None
+    linkedin_text = linkedin_doc.text if linkedin_doc else None
+    user_prompt = await run_in_threadpool(user_prompt_for_roadmap, request, resume_text, linkedin_text)
     prompt = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
 
-    # Select the appropriate model and client based on user's choice
-    try:
-        if request.model == "gpt-4o-mini":
-            # OpenAI GPT model
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="OpenAI API key not configured")
-
-            client = OpenAI(api_key=api_key)
-            stream = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=prompt,
-                stream=True,
-            )
-        elif request.model == "grok-beta":
-            # xAI Grok model (uses OpenAI-compatible API)
-            api_key = os.getenv("XAI_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="xAI API key not configured. Please add your XAI_API_KEY to the .env file")
-
-            client = OpenAI(
-                base_url="https://api.groq.com/openai/v1",
-                api_key=os.getenv("XAI_API_KEY"),
-            )
-
-            stream = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=prompt,
-                stream=True,
-            )
-        elif request.model == "llama-70b":
-            # Hugging Face Llama model
-            api_key = os.getenv("HUGGINGFACE_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="Hugging Face API key not configured. Please add your HUGGINGFACE_API_KEY to the .env file")
-
-            try:
-                hf_client = OpenAI(
-                    base_url="https://router.huggingface.co/v1",
-                    api_key=api_key,
-                )
-                logger.debug(
-                    "HuggingFace request",
-                    extra={"model": "meta-llama/Llama-3.1-70B-Instruct", "max_tokens": 2048},
-                )
-                stream = hf_client.chat.completions.create(
-                    model="meta-llama/Llama-3.1-70B-Instruct",
-                    messages=prompt,
-                    stream=True,
-                    max_tokens=2048,
-                )
-            except Exception as e:
-                extra = {"error_type": type(e).__name__, "model": "llama-70b"}
-                if hasattr(e, 'response'):
-                    extra["response_status"] = e.response.status_code
-                    extra["response_body"] = e.response.text
-                logger.error("HuggingFace API error", extra=extra, exc_info=True)
-                raise HTTPException(status_code=500, detail=f"Hugging Face API error: {str(e)}")
-
-        else:
-            # Default to GPT if unknown model
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="OpenAI API key not configured")
-
-            client = OpenAI(api_key=api_key)
-            stream = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=prompt,
-                stream=True,
-            )
-    except HTTPException:
-        raise
-    except Exception as e:
-        error_msg = str(e)
-        if "Incorrect API key" in error_msg or "invalid" in error_msg.lower():
-            logger.warning("Invalid API key", extra={"model": request.model, "user_id": user_id})
-            raise HTTPException(status_code=400, detail=f"Invalid API key for {request.model}. Please check your API key configuration in the .env file")
-        elif "authentication" in error_msg.lower():
-            logger.warning("Authentication failed", extra={"model": request.model, "user_id": user_id})
-            raise HTTPException(status_code=401, detail=f"Authentication failed for {request.model}. Please verify your API key")
-        else:
-            logger.error("Model initialization error", extra={"model": request.model, "user_id": user_id}, exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Error initializing {request.model}: {error_msg}")
-
-    def event_stream():
-        logger.info("AI stream started", extra={"endpoint": "/api/roadmap_consultation", "user_id": user_id, "model": request.model})
-        full_response_parts: list[str] = []
-        try:
-            for chunk in stream:
-                text = chunk.choices[0].delta.content
-                if text:
-                    full_response_parts.append(text)
-                    lines = text.split("\n")
-                    for line in lines[:-1]:
-                        yield f"data: {line}\n\n"
-                        yield "data:  \n"
-                    yield f"data: {lines[-1]}\n\n"
-            full_response = "".join(full_response_parts)
-            logger.info("AI stream completed", extra={"endpoint": "/api/roadmap_consultation", "user_id": user_id, "model": request.model, "response_chars": len(full_response)})
-            log_event(
-                user_id, "ai_response",
-                endpoint="/api/roadmap_consultation",
-                model=request.model,
-                response_text=full_response[:100_000],
-                response_char_count=len(full_response),
-            )
-        except Exception as e:
-            logger.error("AI stream error", extra={"endpoint": "/api/roadmap_consultation", "user_id": user_id, "model": request.model}, exc_info=True)
-            raise
-
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    stream = await open_stream("/api/roadmap_consultation", request.model, prompt, user_id, cache=True)
+    return StreamingResponse(
+        stream.sse(on_complete=_ai_response_logger(user_id, "/api/roadmap_consultation", request.model, stream)),
+        media_type="text/event-stream",
+        headers=_parse_warning_headers(resume_doc, linkedin_doc),
+    )
 
 
 # Message Rewriter API Endpoint
 
-@app.post("/api/rewrite-message")
-def rewrite_message(
-    request: MessageRewriteRequest,
-    creds: HTTPAuthorizationCredentials = Depends(clerk_guard),
-):
-    """Rewrite a message for professional communication with 3 variations"""
-    user_id = creds.decoded["sub"]
-    log_login_if_new(user_id)
-    log_event(
-        user_id, "ai_call",
-        endpoint="/api/rewrite-message",
-        model=request.model,
-        original_message=request.original_message[:5000],
-        message_type=request.message_type,
-        formality_level=request.formality_level,
-        recipient_type=request.recipient_type,
-        additional_context=request.additional_context or "",
-    )
-    logger.info(
-        "AI request received",
-        extra={
-            "endpoint": "/api/rewrite-message",
-            "user_id": user_id,
-            "model": request.model,
-            "message_type": request.message_type,
-            "formality_level": request.formality_level,
-            "recipient_type": request.recipient_type,
-        },
-    )
+def rewrite_messages(request: MessageRewriteRequest) -> list[dict]:
+    """Chat messages asking for all 3 variations in one response, split by VARIATION_SEPARATOR."""
+    user_prompt = build_rewrite_prompt(request)
+    user_prompt += f"\n\nGenerate 3 distinct variations of this message following all guidelines. Remember to separate each variation with {VARIATION_SEPARATOR}"
+    return [
+        {"role": "system", "content": message_rewriter_system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
 
-    # Build user prompt
+
+def build_rewrite_prompt(request: MessageRewriteRequest) -> str:
+    """User prompt describing the message to rewrite, without the output instructions."""
     formality_labels = {
         1: "Casual (for peers/friends)",
         2: "Friendly Professional (for recruiters you've talked to)",
@@ -963,134 +1868,271 @@ ORIGINAL MESSAGE:
     if request.additional_context:
         user_prompt += f"\n\nADDITIONAL CONTEXT:\n{request.additional_context}"
 
-    user_prompt += "\n\nGenerate 3 distinct variations of this message following all guidelines. Remember to separate each variation with ---VARIATION_SEPARATOR---"
+    return user_prompt
 
-    prompt = [
-        {"role": "system", "content": message_rewriter_system_prompt},
-        {"role": "user", "content": user_prompt},
-    ]
 
-    # Select AI model
-    try:
-        if request.model == "gpt-4o-mini":
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="OpenAI API key not configured")
-
-            client = OpenAI(api_key=api_key)
-            stream = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=prompt,
-                stream=True,
-            )
-        elif request.model == "grok-beta":
-            api_key = os.getenv("XAI_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="xAI API key not configured")
-
-            client = OpenAI(
-                base_url="https://api.groq.com/openai/v1",
-                api_key=os.getenv("XAI_API_KEY"),
-            )
+async def _rewrite_variations_parallel(request: MessageRewriteRequest, user_id: str) -> StreamingResponse:
+    """
+    Parallel mode of /api/rewrite-message: one model call per variation, all streamed at
+    once over a single SSE response. Each call gets the same system prompt plus an
+    instruction to write only its own variation, so the last variation arrives about as
+    soon as the first instead of after it.
+
+    Events (data is JSON; `variation` is 0, 1 or 2):
+        event: delta   data: {"variation", "text"}    — the next piece of that variation
+        event: done    data: {"variation"}            — that variation is complete
+        event: error   data: {"variation", "status_code", "detail"}
+        event: end     data: {}                       — every variation has finished
+    """
+    base_prompt = build_rewrite_prompt(request)
 
-            stream = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=prompt,
-                stream=True,
-            )
-        elif request.model == "llama-70b":
-            api_key = os.getenv("HUGGINGFACE_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="Hugging Face API key not configured")
-
-            hf_client = OpenAI(
-                base_url="https://router.huggingface.co/v1",
-                api_key=api_key,
-            )
-            logger.debug(
-                "HuggingFace request",
-                extra={"model": "meta-llama/Llama-3.1-70B-Instruct", "max_tokens": 2048},
-            )
-            stream = hf_client.chat.completions.create(
-                model="meta-llama/Llama-3.1-70B-Instruct",
-                messages=prompt,
-                stream=True,
-                max_tokens=2048,
-            )
-        else:
-            # Default to GPT
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key or api_key.startswith("your_"):
-                raise HTTPException(status_code=400, detail="OpenAI API key not configured")
-
-            client = OpenAI(api_key=api_key)
-            stream = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=prompt,
-                stream=True,
-            )
-    except HTTPException:
-        raise
-    except Exception as e:
-        error_msg = str(e)
-        if "Incorrect API key" in error_msg or "invalid" in error_msg.lower():
-            logger.warning("Invalid API key", extra={"model": request.model, "user_id": user_id})
-            raise HTTPException(status_code=400, detail=f"Invalid API key for {request.model}")
-        elif "authentication" in error_msg.lower():
-            logger.warning("Authentication failed", extra={"model": request.model, "user_id": user_id})
-            raise HTTPException(status_code=401, detail=f"Authentication failed for {request.model}")
-        else:
-            logger.error("Model initialization error", extra={"model": request.model, "user_id": user_id}, exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Error initializing {request.model}: {error_msg}")
+    async def open_variation(index: int) -> LLMStream:
+        instructions = single_variation_instructions.format(
+            number=index + 1, strategy=variation_strategies[index]
+        )
+        prompt = [
+            {"role": "system", "content": message_rewriter_system_prompt},
+            {"role": "user", "content": base_prompt + "\n" + instructions},
+        ]
+        return await open_stream("/api/rewrite-message", request.model, prompt, user_id, cache=True)
+
+    opened = await asyncio.gather(
+        *(open_variation(index) for index in range(len(variation_strategies))), return_exceptions=True
+    )
+    if all(isinstance(result, BaseException) for result in opened):
+        raise opened[0]
+    started = time.perf_counter()
+
+    async def events() -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
 
-    def event_stream():
-        logger.info("AI stream started", extra={"endpoint": "/api/rewrite-message", "user_id": user_id, "model": request.model})
-        full_response_parts: list[str] = []
+        async def pump(index: int, stream: LLMStream) -> None:
+            try:
+                async for text in stream.text():
+                    await queue.put(_sse_event("delta", {"variation": index, "text": text}))
+                await queue.put(_sse_event("done", {"variation": index}))
+            except Exception as exc:
+                error = exc if isinstance(exc, HTTPException) else HTTPException(status_code=502, detail="Variation stream failed")
+                await queue.put(_sse_event("error", {"variation": index, "status_code": error.status_code,
+                                                     "detail": error.detail}))
+            finally:
+                await queue.put(None)
+
+        tasks = []
+        for index, result in enumerate(opened):
+            if isinstance(result, BaseException):
+                error = result if isinstance(result, HTTPException) else HTTPException(status_code=502, detail=str(result))
+                yield _sse_event("error", {"variation": index, "status_code": error.status_code, "detail": error.detail})
+            else:
+                tasks.append(asyncio.create_task(pump(index, result)))
         try:
-            for chunk in stream:
-                text = chunk.choices[0].delta.content
-                if text:
-                    full_response_parts.append(text)
-                    lines = text.split("\n")
-                    for line in lines[:-1]:
-                        yield f"data: {line}\n\n"
-                        yield "data:  \n"
-                    yield f"data: {lines[-1]}\n\n"
-            full_response = "".join(full_response_parts)
-            logger.info("AI stream completed", extra={"endpoint": "/api/rewrite-message", "user_id": user_id, "model": request.model, "response_chars": len(full_response)})
-            log_event(
-                user_id, "ai_response",
-                endpoint="/api/rewrite-message",
-                model=request.model,
-                response_text=full_response[:100_000],
-                response_char_count=len(full_response),
-            )
-        except Exception as e:
-            logger.error("AI stream error", extra={"endpoint": "/api/rewrite-message", "user_id": user_id, "model": request.model}, exc_info=True)
-            raise
+            remaining = len(tasks)
+            while remaining:
+                event = await queue.get()
+                if event is None:
+                    remaining -= 1
+                else:
+                    yield event
+        finally:
+            # Client went away: stop the variations still generating
+            for task in tasks:
+                task.cancel()
+
+        streams = [result for result in opened if isinstance(result, LLMStream)]
+        usage = {}
+        for stream in streams:
+            for key, value in (stream.usage or {}).items():
+                usage[key] = usage.get(key, 0) + value
+        full_response = f"\n{VARIATION_SEPARATOR}\n".join(
+            result.full_text if isinstance(result, LLMStream) else "" for result in opened
+        )
+        last_variation_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(
+            "Parallel rewrite completed",
+            extra={"user_id": user_id, "model": request.model, "variations": len(streams),
+                   "last_variation_ms": last_variation_ms},
+        )
+        _log_event_bg(
+            user_id, "ai_response",
+            endpoint="/api/rewrite-message",
+            model=request.model,
+            parallel=True,
+            response_text=full_response[:100_000],
+            response_char_count=len(full_response),
+            last_variation_ms=last_variation_ms,
+            **usage,
+        )
+        yield _sse_event("end", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/api/rewrite-message")
+async def rewrite_message(
+    request: MessageRewriteRequest,
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/rewrite-message")),
+):
+    """Rewrite a message for professional communication with 3 variations"""
+    user_id = creds.decoded["sub"]
+    await run_in_threadpool(log_login_if_new, user_id)
+    _log_event_bg(
+        user_id, "ai_call",
+        endpoint="/api/rewrite-message",
+        model=request.model,
+        original_message=request.original_message[:5000],
+        message_type=request.message_type,
+        formality_level=request.formality_level,
+        recipient_type=request.recipient_type,
+        additional_context=request.additional_context or "",
+    )
+    logger.info(
+        "AI request received",
+        extra={
+            "endpoint": "/api/rewrite-message",
+            "user_id": user_id,
+            "model": request.model,
+            "message_type": request.message_type,
+            "formality_level": request.formality_level,
+            "recipient_type": request.recipient_type,
+        },
+    )
+
+    if request.parallel:
+        return await _rewrite_variations_parallel(request, user_id)
+
+    stream = await open_stream("/api/rewrite-message", request.model, rewrite_messages(request), user_id, cache=True)
+    return StreamingResponse(
+        stream.sse(on_complete=_ai_response_logger(user_id, "/api/rewrite-message", request.model, stream)),
+        media_type="text/event-stream",
+    )
+
+
+# Bulk rewriting for outreach campaigns
+REWRITE_BULK_MAX_ITEMS = int(os.getenv("REWRITE_BULK_MAX_ITEMS", "50"))
+REWRITE_BULK_CONCURRENCY = int(os.getenv("REWRITE_BULK_CONCURRENCY", "4"))
+# Fair-queuing weight of bulk rewrite calls, so they yield to interactive requests
+REWRITE_BULK_ADMISSION_WEIGHT = float(os.getenv("REWRITE_BULK_ADMISSION_WEIGHT", "0.5"))
+
+
+class BulkRewriteItem(MessageRewriteRequest):
+    id: str | None = None  # caller's reference for the message, echoed back
+
+
+class BulkRewriteRequest(BaseModel):
+    items: list[BulkRewriteItem]
+
+
+@app.post("/api/rewrite-message/bulk")
+async def rewrite_message_bulk(
+    request: BulkRewriteRequest,
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/rewrite-message/bulk")),
+):
+    """
+    Rewrite up to REWRITE_BULK_MAX_ITEMS messages, REWRITE_BULK_CONCURRENCY at a time, on
+    the shared provider connections. Items with an identical prompt are generated once.
+
+    Streams NDJSON, one line per item as it finishes (a failed item does not stop the rest):
+        {"type": "result", "index", "id", "variations": [three messages]}
+        {"type": "error",  "index", "id", "status_code", "detail"}
+    then {"type": "summary", "succeeded", "failed"}.
+    """
+    user_id = creds.decoded["sub"]
+    if not request.items or len(request.items) > REWRITE_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"Provide between 1 and {REWRITE_BULK_MAX_ITEMS} items")
+
+    await run_in_threadpool(log_login_if_new, user_id)
+    _log_event_bg(
+        user_id, "ai_call",
+        endpoint="/api/rewrite-message/bulk",
+        item_count=len(request.items),
+        models=sorted({item.model for item in request.items}),
+    )
+    logger.info(
+        "Bulk rewrite request received",
+        extra={"endpoint": "/api/rewrite-message/bulk", "user_id": user_id, "item_count": len(request.items)},
+    )
+
+    semaphore = asyncio.Semaphore(REWRITE_BULK_CONCURRENCY)
+    generations: dict[str, asyncio.Task] = {}
+
+    async def generate(item: BulkRewriteItem, messages: list[dict]) -> tuple[str, dict | None]:
+        async with semaphore:
+            with admission_weight(REWRITE_BULK_ADMISSION_WEIGHT):
+                stream = await open_stream("/api/rewrite-message/bulk", item.model, messages, user_id, cache=True)
+                text = "".join([part async for part in stream.text()])
+        return text, stream.usage
+
+    async def rewrite(index: int, item: BulkRewriteItem) -> dict:
+        try:
+            messages = rewrite_messages(item)
+            key = make_response_key(item.model, messages, {})
+            shared = key in generations
+            if not shared:
+                generations[key] = asyncio.ensure_future(generate(item, messages))
+            text, usage = await asyncio.shield(generations[key])
+        except HTTPException as exc:
+            return {"type": "error", "index": index, "id": item.id, "status_code": exc.status_code, "detail": exc.detail}
+        except Exception:
+            logger.error("Bulk rewrite item failed", extra={"user_id": user_id, "item_index": index}, exc_info=True)
+            return {"type": "error", "index": index, "id": item.id, "status_code": 502, "detail": "Rewrite failed"}
+        _log_event_bg(
+            user_id, "ai_response",
+            endpoint="/api/rewrite-message/bulk",
+            model=item.model,
+            item_index=index,
+            response_char_count=len(text),
+            shared_generation=shared,
+            **({} if shared else usage or {}),
+        )
+        variations = [variation.strip() for variation in text.split(VARIATION_SEPARATOR) if variation.strip()]
+        return {"type": "result", "index": index, "id": item.id, "variations": variations}
+
+    async def results() -> AsyncIterator[str]:
+        tasks = [asyncio.ensure_future(rewrite(index, item)) for index, item in enumerate(request.items)]
+        failed = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                line = await finished
+                if line["type"] == "error":
+                    failed += 1
+                yield json.dumps(line) + "\n"
+        finally:
+            # Client went away mid-batch: stop the items still generating or waiting
+            for task in [*tasks, *generations.values()]:
+                task.cancel()
+        logger.info(
+            "Bulk rewrite completed",
+            extra={"user_id": user_id, "item_count": len(request.items), "generated": len(generations),
+                   "failed": failed},
+        )
+        yield json.dumps({"type": "summary", "succeeded": len(tasks) - failed, "failed": failed}) + "\n"
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 
 # Company Research API Endpoint
 
 def build_company_research_prompt(request: CompanyResearchRequest) -> str:
-    """Build the user prompt for company research."""
-    prompt_parts = [
-        f"Please research the following company: **{request.company_name}**",
-    ]
+    """Build the user prompt for company research, trimming the free-text research focus to the model's budget."""
+
+    def render(sections: dict[str, str | None]) -> str:
+        prompt_parts = [
+            f"Please research the following company: **{request.company_name}**",
+        ]
 
-    if request.target_role:
-        prompt_parts.append(f"\nTarget Role: **{request.target_role}**")
-        prompt_parts.append("Please provide role-specific insights tailored to this position.")
+        if request.target_role:
+            prompt_parts.append(f"\nTarget Role: **{request.target_role}**")
+            prompt_parts.append("Please provide role-specific insights tailored to this position.")
 
-    if request.research_focus:
-        prompt_parts.append(f"\nSpecific Research Focus: {request.research_focus}")
-        prompt_parts.append("Please emphasize these areas in your research.")
+        if sections["research_focus"]:
+            prompt_parts.append(f"\nSpecific Research Focus: {sections['research_focus']}")
+            prompt_parts.append("Please emphasize these areas in your research.")
 
-    prompt_parts.append("\nProvide comprehensive research following the output structure specified.")
+        prompt_parts.append("\nProvide comprehensive research following the output structure specified.")
 
-    return "\n".join(prompt_parts)
+        return "\n".join(prompt_parts)
+
+    return fit_prompt("/api/company-research", request.model, render, {"research_focus": request.research_focus})
 
 # --- Deep research agent setup ---
 
@@ -1121,38 +2163,17 @@ _research_tasks: dict = {}
 
 
 def _resolve_chat_model(model: str) -> ChatOpenAI:
-    """Return a ChatOpenAI instance for the requested model string."""
-    if model == "gpt-4o-mini":
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key or api_key.startswith("your_"):
-            raise HTTPException(status_code=400, detail="OpenAI API key not configured")
-        return ChatOpenAI(model="gpt-4o-mini", api_key=api_key)
-    elif model == "grok-beta":
-        api_key = os.getenv("XAI_API_KEY")
-        if not api_key or api_key.startswith("your_"):
-            raise HTTPException(status_code=400, detail="xAI API key not configured")
-        return ChatOpenAI(
-            model="llama-3.3-70b-versatile",
-            base_url="https://api.groq.com/openai/v1",
-            api_key=api_key,
-        )
-    elif model == "llama-70b":
-        api_key = os.getenv("HUGGINGFACE_API_KEY")
-        if not api_key or api_key.startswith("your_"):
-            raise HTTPException(status_code=400, detail="Hugging Face API key not configured")
-        return ChatOpenAI(
-            model="meta-llama/Llama-3.1-70B-Instruct",
-            base_url="https://router.huggingface.co/v1",
-            api_key=api_key,
-        )
-    else:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key or api_key.startswith("your_"):
-            raise HTTPException(status_code=400, detail="OpenAI API key not configured")
-        return ChatOpenAI(model="gpt-4o-mini", api_key=api_key)
+    """Return a ChatOpenAI instance for the requested model's route, on the shared connection pools."""
+    route = resolve_route(model)
+    return ChatOpenAI(
+        model=route.model,
+        base_url=PROVIDERS[route.provider]["base_url"],
+        api_key=require_provider_key(route.provider),
+        http_client=get_provider_registry().http_client(route.provider),
+    )
 
 
-def _run_simple_research(request: CompanyResearchRequest, user_prompt: str) -> str:
+def _run_simple_research(request: CompanyResearchRequest, user_prompt: str, user_id: str | None = None) -> str:
     """
     Fallback research path for Grok / Llama models that cannot handle deepagents'
     complex multi-tool schemas (they emit XML tool syntax and fail with tool_use_failed).
@@ -1183,52 +2204,67 @@ def _run_simple_research(request: CompanyResearchRequest, user_prompt: str) -> s
 
     context = "\n\n---\n\n".join(search_results) if search_results else "No search results available."
 
-    synthesis_prompt = (
-        f"{user_prompt}\n\n"
-        "=== WEB RESEARCH DATA ===\n"
-        f"{context}\n"
-        "=== END OF RESEARCH DATA ===\n\n"
-        "Using the research data above, write a comprehensive company research report "
-        "covering: company overview, culture, recent news, role-specific interview tips, "
-        "compensation, and any other relevant insights."
+    # Raw search results dominate the prompt; they are cut first when over the model's budget
+    synthesis_prompt = fit_prompt(
+        "/api/company-research",
+        request.model,
+        lambda sections: (
+            f"{user_prompt}\n\n"
+            "=== WEB RESEARCH DATA ===\n"
+            f"{sections['research_data']}\n"
+            "=== END OF RESEARCH DATA ===\n\n"
+            "Using the research data above, write a comprehensive company research report "
+            "covering: company overview, culture, recent news, role-specific interview tips, "
+            "compensation, and any other relevant insights."
+        ),
+        {"research_data": context},
     )
 
-    # Route to the correct non-GPT client (no tool schemas, plain chat completion)
-    if request.model == "grok-beta":
-        api_key = os.getenv("XAI_API_KEY")
-        if not api_key or api_key.startswith("your_"):
-            raise HTTPException(status_code=400, detail="xAI API key not configured")
-        client = OpenAI(base_url="https://api.groq.com/openai/v1", api_key=api_key)
-        model_name = "llama-3.3-70b-versatile"
-    elif request.model == "llama-70b":
-        api_key = os.getenv("HUGGINGFACE_API_KEY")
-        if not api_key or api_key.startswith("your_"):
-            raise HTTPException(status_code=400, detail="Hugging Face API key not configured")
-        client = OpenAI(base_url="https://router.huggingface.co/v1", api_key=api_key)
-        model_name = "meta-llama/Llama-3.1-70B-Instruct"
-    else:
-        # Fallback to GPT if model is unrecognised
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key or api_key.startswith("your_"):
-            raise HTTPException(status_code=400, detail="OpenAI API key not configured")
-        client = OpenAI(api_key=api_key)
-        model_name = "gpt-4o-mini"
-
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=[
+    # Plain chat completion on the request's model route — no tool schemas involved
+    response = complete(
+        "/api/company-research",
+        request.model,
+        [
             {"role": "system", "content": research_instructions},
             {"role": "user", "content": synthesis_prompt},
         ],
+        user_id,
         max_tokens=4096,
     )
     return response.choices[0].message.content
 
 
+def _research_flight_key(request: CompanyResearchRequest) -> str:
+    """Coalescing key for a research run: model plus case- and whitespace-normalised inputs."""
+    def norm(value: str | None) -> str:
+        return " ".join((value or "").lower().split())
+
+    return (
+        f"/api/company-research:{request.model}:{norm(request.company_name)}:"
+        f"{norm(request.target_role)}:{norm(request.research_focus)}"
+    )
+
+
+def _record_agent_usage(model: str, user_id: str, messages: list) -> None:
+    """Add the token usage LangChain reports on a deep agent run's AI messages to the usage totals."""
+    usage = None
+    for message in messages:
+        metadata = getattr(message, "usage_metadata", None)
+        if not metadata:
+            continue
+        usage = usage or {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        usage["prompt_tokens"] += metadata.get("input_tokens", 0)
+        usage["completion_tokens"] += metadata.get("output_tokens", 0)
+        usage["cached_tokens"] += (metadata.get("input_token_details") or {}).get("cache_read", 0)
+    get_token_usage().record("/api/company-research", resolve_route(model).model, user_id, usage)
+
+
 @app.post("/api/company-research")
 def company_research(
     request: CompanyResearchRequest,
-    creds: HTTPAuthorizationCredentials = Depends(clerk_guard),
+    response: Response,
+    idempotency_key: str | None = Header(None),
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/company-research")),
 ):
     """
     Start a background deep-research task and return a task_id immediately.
@@ -1238,8 +2274,24 @@ def company_research(
     GPT-4o-mini  → deepagents (multi-step web search agent)
     Grok / Llama → simple Tavily search + direct LLM synthesis
                    (these models fail with deepagents' complex tool schemas)
+
+    Identical research (same model, company, role and focus, from any user) that is
+    already running is not started again: the new task waits for and shares its report.
+    A retried Idempotency-Key returns the original task_id.
     """
     user_id = creds.decoded["sub"]
+    return _with_idempotency(
+        "/api/company-research",
+        user_id,
+        idempotency_key,
+        request_fingerprint(request.model_dump_json()),
+        response,
+        lambda: _start_company_research(request, user_id),
+    )
+
+
+def _start_company_research(request: CompanyResearchRequest, user_id: str) -> dict:
+    """Register a research task and run it on a daemon thread."""
     log_login_if_new(user_id)
     log_event(
         user_id, "ai_call",
@@ -1268,15 +2320,21 @@ def company_research(
             system_prompt=research_instructions,
         )
 
+    def research() -> str:
+        if agent is not None:
+            # Deep agent path (GPT-4o-mini); one admission slot covers the whole agent run
+            with get_admission_controller().limiter(resolve_route(request.model).model).acquire(user_id):
+                result = agent.invoke({"messages": [{"role": "user", "content": user_prompt}]})
+            _record_agent_usage(request.model, user_id, result["messages"])
+            return result["messages"][-1].content
+        # Simple Tavily + LLM path (Grok / Llama)
+        return _run_simple_research(request, user_prompt, user_id)
+
     def run_agent():
         try:
-            if agent is not None:
-                # Deep agent path (GPT-4o-mini)
-                result = agent.invoke({"messages": [{"role": "user", "content": user_prompt}]})
-                content = result["messages"][-1].content
-            else:
-                # Simple Tavily + LLM path (Grok / Llama)
-                content = _run_simple_research(request, user_prompt)
+            content, shared = get_request_coalescer().run(_research_flight_key(request), research)
+            if shared:
+                logger.info("Company research coalesced", extra={"task_id": task_id, "user_id": user_id})
             _research_tasks[task_id]["content"] = content
             _research_tasks[task_id]["status"] = "done"
             logger.info("Company research task completed", extra={"task_id": task_id, "user_id": user_id, "response_chars": len(content)})
@@ -1315,10 +2373,24 @@ def research_status(
 @app.post("/api/applications")
 def create_application(
     request: ApplicationRequest,
+    response: Response,
+    idempotency_key: str | None = Header(None),
     creds: HTTPAuthorizationCredentials = Depends(clerk_guard),
 ):
     """Create a new job application and store it in S3"""
     user_id = creds.decoded["sub"]
+    return _with_idempotency(
+        "/api/applications",
+        user_id,
+        idempotency_key,
+        request_fingerprint(request.model_dump_json()),
+        response,
+        lambda: _store_application(request, user_id),
+    )
+
+
+def _store_application(request: ApplicationRequest, user_id: str) -> dict:
+    """Write one new application to S3 and return the create_application response."""
     logger.info(
         "Creating application",
         extra={"user_id": user_id, "company_name": request.company_name, "position": request.position},
@@ -1556,12 +2628,267 @@ def delete_application(
         raise HTTPException(status_code=500, detail=f"Failed to delete application: {str(e)}")
 
 
+# Batch resume tailoring against saved applications
+TAILOR_MAX_APPLICATIONS = int(os.getenv("TAILOR_MAX_APPLICATIONS", "25"))
+TAILOR_CONCURRENCY = int(os.getenv("TAILOR_CONCURRENCY", "3"))
+# Fair-queuing weight of tailoring calls, so they yield to interactive requests
+TAILOR_ADMISSION_WEIGHT = float(os.getenv("TAILOR_ADMISSION_WEIGHT", "0.25"))
+# Finished jobs kept in memory for status polling; the oldest finished job goes first
+TAILOR_MAX_JOBS = int(os.getenv("TAILOR_MAX_JOBS", "1000"))
+
+
+class TailoringJobRequest(BaseModel):
+    applicant_name: str
+    application_ids: list[str]              # from GET /api/applications
+    resume_pdf: str | None = None
+    resume_filename: str | None = None
+    linkedin_profile_pdf: str | None = None
+    linkedin_filename: str | None = None
+    resume_document_id: str | None = None   # from POST /api/documents, in place of resume_pdf
+    linkedin_document_id: str | None = None
+    additional_notes: str = ""
+    model: str
+
+
+# Application ids are server-generated UUIDs; anything else must not reach an S3 key
+_APPLICATION_ID_RE = re.compile(r"[A-Za-z0-9-]{1,64}")
+
+# In-memory store for tailoring jobs, keyed by job id; values are the status dicts
+# GET /api/tailoring-jobs/{job_id} returns (plus the owning user_id)
+_tailoring_jobs: OrderedDict[str, dict] = OrderedDict()
+_tailoring_jobs_lock = threading.Lock()
+# Strong references to running job tasks, so they are not garbage collected mid-run
+_tailoring_tasks: set[asyncio.Task] = set()
+
+
+def _load_application(user_id: str, application_id: str) -> dict:
+    """Read one of the user's applications from S3; 404 if it does not exist."""
+    try:
+        file_obj = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=f"applications/{user_id}/{application_id}.json")
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchKey":
+            raise HTTPException(status_code=404, detail="Application not found")
+        raise
+    return json.loads(file_obj["Body"].read().decode("utf-8"))
+
+
+def _store_tailored_resume(user_id: str, application_id: str, job_id: str, resume: str) -> str:
+    """Write a generated resume to S3 next to the user's applications and return its key."""
+    s3_key = f"tailored-resumes/{user_id}/{application_id}/{job_id}.md"
+    s3_client.put_object(
+        Bucket=S3_BUCKET_NAME,
+        Key=s3_key,
+        Body=resume.encode("utf-8"),
+        ContentType="text/markdown",
+    )
+    return s3_key
+
+
+async def _run_tailoring_job(
+    job: dict,
+    request: TailoringJobRequest,
+    user_id: str,
+    resume_file: tuple[bytes, str | None] | None,
+    linkedin_file: tuple[bytes, str | None] | None,
+) -> None:
+    """Parse the resume once, then generate and store one tailored resume per application."""
+    job_id = job["job_id"]
+    try:
+        job["status"] = "parsing"
+        resume_doc, linkedin_doc = await run_in_threadpool(
+            _load_documents,
+            user_id, resume_file, linkedin_file, request.resume_document_id, request.linkedin_document_id,
+        )
+        resume_text = resume_doc.text if resume_doc else None
+        linkedin_text = linkedin_doc.text if linkedin_doc else None
+        job["parse_limits_hit"] = _parse_limits_hit(resume_doc, linkedin_doc)
+    except Exception as exc:
+        job["status"] = "failed"
+        job["error"] = exc.detail if isinstance(exc, HTTPException) else "Failed to parse resume"
+        job["finished_at"] = datetime.now(timezone.utc).isoformat()
+        logger.error("Tailoring job failed to parse resume", extra={"job_id": job_id, "user_id": user_id}, exc_info=True)
+        return
+
+    job["status"] = "running"
+    semaphore = asyncio.Semaphore(TAILOR_CONCURRENCY)
+
+    async def tailor(item: dict) -> None:
+        async with semaphore:
+            item["status"] = "running"
+            try:
+                application = await run_in_threadpool(_load_application, user_id, item["application_id"])
+                item["company_name"] = application.get("company_name")
+                item["position"] = application.get("position")
+                resume_request = ResumeRequest(
+                    applicant_name=request.applicant_name,
+                    application_date=application.get("application_date") or "",
+                    role_applied_for=f"{application.get('position', '')} at {application.get('company_name', '')}",
+                    # The tracker's notes are where users keep the posting's details
+                    job_description=application.get("notes") or None,
+                    additional_notes=request.additional_notes,
+                    model=request.model,
+                )
+                user_prompt = await run_in_threadpool(user_prompt_for, resume_request, resume_text, linkedin_text)
+                prompt = [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ]
+                with admission_weight(TAILOR_ADMISSION_WEIGHT):
+                    stream = await open_stream("/api/tailoring-jobs", request.model, prompt, user_id, cache=True)
+                    resume = "".join([part async for part in stream.text()])
+                item["resume_key"] = await run_in_threadpool(
+                    _store_tailored_resume, user_id, item["application_id"], job_id, resume
+                )
+                item["resume"] = resume
+                item["status"] = "done"
+                job["completed"] += 1
+                _log_event_bg(
+                    user_id, "ai_response",
+                    endpoint="/api/tailoring-jobs",
+                    model=request.model,
+                    job_id=job_id,
+                    application_id=item["application_id"],
+                    response_char_count=len(resume),
+                    **(stream.usage or {}),
+                )
+            except Exception as exc:
+                item["status"] = "failed"
+                item["error"] = exc.detail if isinstance(exc, HTTPException) else "Failed to generate resume"
+                job["failed"] += 1
+                logger.error(
+                    "Tailoring job item failed",
+                    extra={"job_id": job_id, "user_id": user_id, "application_id": item["application_id"]},
+                    exc_info=not isinstance(exc, HTTPException),
+                )
+
+    await asyncio.gather(*(tailor(item) for item in job["items"]))
+    job["status"] = "done"
+    job["finished_at"] = datetime.now(timezone.utc).isoformat()
+    logger.info(
+        "Tailoring job completed",
+        extra={"job_id": job_id, "user_id": user_id, "completed": job["completed"], "failed": job["failed"]},
+    )
+
+
+@app.post("/api/tailoring-jobs", status_code=202)
+async def create_tailoring_job(
+    request: TailoringJobRequest,
+    creds: HTTPAuthorizationCredentials = Depends(rate_limited("/api/tailoring-jobs")),
+):
+    """
+    Start a background job that generates one tailored resume per saved application
+    (the application's position, company and notes stand in for the job posting) and
+    return its job_id immediately. Poll GET /api/tailoring-jobs/{job_id} for progress;
+    each generated resume is also stored in S3 under tailored-resumes/{user}/{application}/.
+    """
+    user_id = creds.decoded["sub"]
+    application_ids = list(dict.fromkeys(request.application_ids))
+    if not application_ids or len(application_ids) > TAILOR_MAX_APPLICATIONS:
+        raise HTTPException(status_code=422, detail=f"Provide between 1 and {TAILOR_MAX_APPLICATIONS} application_ids")
+    if any(not _APPLICATION_ID_RE.fullmatch(application_id) for application_id in application_ids):
+        raise HTTPException(status_code=422, detail="Invalid application_id")
+    if not request.resume_pdf and not request.resume_document_id:
+        raise HTTPException(status_code=422, detail="One of resume_pdf or resume_document_id is required")
+    if not S3_BUCKET_NAME:
+        raise HTTPException(status_code=500, detail="S3 bucket not configured")
+    require_provider_key(resolve_route(request.model).provider)
+
+    resume_file, linkedin_file = await run_in_threadpool(decode_request_files, request)
+    job_id = str(uuid.uuid4())
+    job = {
+        "job_id": job_id,
+        "user_id": user_id,
+        "status": "queued",
+        "model": request.model,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "finished_at": None,
+        "total": len(application_ids),
+        "completed": 0,
+        "failed": 0,
+        "error": None,
+        "parse_limits_hit": [],
+        "items": [{"application_id": application_id, "status": "pending"} for application_id in application_ids],
+    }
+    with _tailoring_jobs_lock:
+        _tailoring_jobs[job_id] = job
+        finished = [key for key, value in _tailoring_jobs.items() if value["finished_at"] is not None]
+        for key in finished[: max(0, len(_tailoring_jobs) - TAILOR_MAX_JOBS)]:
+            del _tailoring_jobs[key]
+
+    await run_in_threadpool(log_login_if_new, user_id)
+    _log_event_bg(
+        user_id, "ai_call",
+        endpoint="/api/tailoring-jobs",
+        model=request.model,
+        job_id=job_id,
+        application_count=len(application_ids),
+        has_resume_pdf=resume_file is not None,
+        has_resume_document=bool(request.resume_document_id),
+    )
+    logger.info(
+        "Tailoring job submitted",
+        extra={"job_id": job_id, "user_id": user_id, "model": request.model, "application_count": len(application_ids)},
+    )
+
+    task = asyncio.create_task(_run_tailoring_job(job, request, user_id, resume_file, linkedin_file))
+    _tailoring_tasks.add(task)
+    task.add_done_callback(_tailoring_tasks.discard)
+    return {"job_id": job_id, "status": job["status"], "total": job["total"]}
+
+
+@app.get("/api/tailoring-jobs/{job_id}")
+async def tailoring_job_status(
+    job_id: str,
+    creds: HTTPAuthorizationCredentials = Depends(clerk_guard),
+):
+    """
+    Progress of a tailoring job, with each finished application's resume and S3 key.
+    Async so it reads the job on the event loop, where every job update happens.
+    """
+    job = _tailoring_jobs.get(job_id)
+    if not job or job["user_id"] != creds.decoded["sub"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {key: value for key, value in job.items() if key != "user_id"}
+
+
 @app.get("/health")
 def health_check():
     """Health check endpoint for AWS App Runner"""
     return {"status": "healthy"}
 
 
+@app.get("/api/usage")
+def token_usage(
+    creds: HTTPAuthorizationCredentials = Depends(clerk_guard),
+):
+    """The caller's LLM token usage per endpoint since this server instance started."""
+    return {"endpoints": get_token_usage().user_stats(creds.decoded["sub"])}
+
+
+@app.get("/api/metrics")
+def metrics(
+    creds: HTTPAuthorizationCredentials = Depends(admin_only),
+):
+    """
+    In-process performance counters for this server instance, including other users'
+    token usage, so admins only (ADMIN_USER_IDS); users see their own at /api/usage.
+    """
+    response_cache = get_response_cache()
+    return {
+        "parse_cache": get_parse_cache().stats(),
+        "parse_pool": get_parse_pool().stats(),
+        "document_store": get_document_store().stats(),
+        "llm_providers": get_provider_registry().stats(),
+        "llm_models": get_llm_metrics().stats(),
+        "llm_admission": get_admission_controller().stats(),
+        "rate_limits": get_rate_limiter().stats(),
+        "llm_response_cache": response_cache.stats() if response_cache else {"enabled": False},
+        "token_usage": get_token_usage().stats(),
+        "request_coalescing": get_request_coalescer().stats(),
+        "idempotency": get_idempotency_store().stats(),
+    }
+
+
 
 
 # Serve static files (our Next.js export) - MUST BE LAST!
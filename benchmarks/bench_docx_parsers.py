@@ -0,0 +1,136 @@
+"""
+Benchmark DOCX text extraction: python-docx object model vs streaming XML extraction.
+
+Generates a corpus of synthetic, table-heavy resumes (skills matrices, experience grids
+with horizontally and vertically merged cells, a few body paragraphs) and measures, for
+each extractor, extraction throughput, peak memory and output size. Every extractor runs
+in a fresh subprocess so peak RSS is not polluted by the other extractor or by corpus
+generation. The "chars" column shows the text duplicated by python-docx revisiting
+merged cells.
+
+Usage (the extractors are imported from the `saas` package, as laid out in the image):
+    python benchmarks/bench_docx_parsers.py --docs 50 --rows 200 --repeat 3
+
+Results on 20 docs x 200 rows:
+    parser          docs/s    ms/doc       chars  py heap MB   RSS +MB
+    python-docx        2.3     428.3      710345         7.0      52.2
+    streaming         31.2      32.0      297327         0.4       0.0
+"""
+import argparse
+import io
+import multiprocessing as mp
+import random
+import resource
+import time
+import tracemalloc
+
+from docx import Document as DocxDocument
+
+from saas.document_parser import parse_docx_object_model, stream_docx_text
+
+_SKILLS = ["Python", "Go", "Kubernetes", "Terraform", "PostgreSQL", "Kafka", "React", "AWS", "Spark", "dbt"]
+_ROLES = ["Senior Engineer", "Staff Engineer", "Tech Lead", "Platform Engineer", "Data Engineer"]
+_COMPANIES = ["Acme Corp", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries"]
+
+
+def _resume_docx(rng: random.Random, rows: int) -> bytes:
+    """Build one table-heavy resume with merged cells and return it as .docx bytes."""
+    doc = DocxDocument()
+    doc.add_heading("Jane Candidate", level=1)
+    doc.add_paragraph("Platform engineer with ten years of experience building data infrastructure.")
+
+    skills = doc.add_table(rows=rows // 4 + 1, cols=4)
+    for r, row in enumerate(skills.rows):
+        for c, cell in enumerate(row.cells):
+            cell.text = "Skill" if r == 0 else f"{rng.choice(_SKILLS)} ({rng.randint(1, 10)} yrs)"
+
+    doc.add_paragraph("EXPERIENCE")
+    grid = doc.add_table(rows=rows, cols=4)
+    for r in range(0, rows - 2, 3):
+        # Company name spans three rows; the role title spans two columns
+        company = grid.cell(r, 0).merge(grid.cell(r + 2, 0))
+        company.text = rng.choice(_COMPANIES)
+        role = grid.cell(r, 1).merge(grid.cell(r, 2))
+        role.text = f"{rng.choice(_ROLES)}, {rng.randint(2012, 2024)}"
+        grid.cell(r, 3).text = "Remote"
+        for k in (1, 2):
+            bullet = grid.cell(r + k, 1).merge(grid.cell(r + k, 3))
+            bullet.text = (
+                f"Scaled the {rng.choice(_SKILLS)} platform to {rng.randint(2, 900)}k users, "
+                f"cutting cost by ${rng.randint(10, 500)}k/yr"
+            )
+
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def generate_corpus(num_docs: int, rows: int, seed: int = 7) -> list[bytes]:
+    """Generate num_docs synthetic table-heavy resumes as raw .docx bytes."""
+    rng = random.Random(seed)
+    return [_resume_docx(rng, rows) for _ in range(num_docs)]
+
+
+_PARSERS = {"python-docx": parse_docx_object_model, "streaming": stream_docx_text}
+
+
+def _run_parser(name: str, corpus: list[bytes], repeat: int, queue) -> None:
+    """Subprocess entry point: time one extractor over the corpus and report peak memory."""
+    extract = _PARSERS[name]
+    extract(corpus[0])  # warm up imports
+    baseline_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    tracemalloc.start()
+    chars = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for docx_bytes in corpus:
+            chars += len(extract(docx_bytes))
+    elapsed = time.perf_counter() - start
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    queue.put({
+        "parser": name,
+        "seconds": elapsed,
+        "docs_per_s": len(corpus) * repeat / elapsed,
+        "ms_per_doc": elapsed * 1000 / (len(corpus) * repeat),
+        "chars": chars // repeat,
+        "python_heap_peak_mb": py_peak / 1024 / 1024,
+        "rss_growth_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss_kb) / 1024,
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=50, help="number of synthetic resumes")
+    parser.add_argument("--rows", type=int, default=200, help="rows in each resume's experience table")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus per extractor")
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.docs, args.rows)
+    print(f"Corpus: {len(corpus)} DOCX files, {sum(len(b) for b in corpus) / 1024 / 1024:.1f} MiB")
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for name in _PARSERS:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_parser, args=(name, corpus, args.repeat, queue))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+
+    header = f"{'parser':<12}{'docs/s':>10}{'ms/doc':>10}{'chars':>12}{'py heap MB':>12}{'RSS +MB':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['parser']:<12}{r['docs_per_s']:>10.1f}{r['ms_per_doc']:>10.1f}{r['chars']:>12}"
+            f"{r['python_heap_peak_mb']:>12.1f}{r['rss_growth_mb']:>10.1f}"
+        )
+    base, fast = results
+    print(f"\nStreaming speedup: {fast['docs_per_s'] / base['docs_per_s']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
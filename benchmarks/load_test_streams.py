@@ -0,0 +1,210 @@
+"""
+Load test: concurrent SSE streams through one API worker.
+
+Starts a fake OpenAI-compatible upstream that streams tokens slowly (like a 20–60 s
+generation, compressed), starts the API in a single uvicorn worker pointed at it — each
+in its own process — and opens N concurrent /api/consultation streams at each
+concurrency level. A level passes when every stream completes, the upstream sees all
+N streams open at once, and the API's thread count stays flat — i.e. streams run side
+by side on the event loop instead of each pinning a threadpool thread (the sync
+handlers topped out at the ~40-thread default pool).
+
+Auth is bypassed and analytics are stubbed out; nothing leaves the machine.
+
+Usage (the API is imported from the `saas` package, as laid out in the image):
+    python benchmarks/load_test_streams.py --levels 50,200,500 --tokens 40 --token-delay 0.1
+
+Results with 10 s streams (--tokens 20 --token-delay 0.5), all three processes sharing
+one CPU core, so wall time above the stream length is CPU, not queueing:
+     streams    ok   wall s  stream p50 s  TTFB p50 s  TTFB p95 s  upstream peak  API threads
+         200   200     13.2          12.2       2.010       2.277            200           47
+         500   500     23.3          19.8       5.714       9.368            500           46
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import socket
+import statistics
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _fake_upstream(tokens: int, token_delay: float) -> FastAPI:
+    """OpenAI-compatible /v1/chat/completions that streams `tokens` chunks, token_delay apart."""
+    upstream = FastAPI()
+    active = {"now": 0, "peak": 0}
+
+    @upstream.post("/stats/reset")
+    async def reset_stats():
+        peak, active["peak"] = active["peak"], 0
+        return {"peak": peak}
+
+    @upstream.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+
+        async def events():
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            try:
+                for i in range(tokens):
+                    await asyncio.sleep(token_delay)
+                    chunk = {
+                        "id": "load-test", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                        "choices": [{"index": 0, "delta": {"content": f"token{i} "}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                active["now"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return upstream
+
+
+def _run_upstream(port: int, tokens: int, token_delay: float) -> None:
+    """Subprocess entry point: serve the fake upstream."""
+    uvicorn.run(_fake_upstream(tokens, token_delay), host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def _run_api(port: int, upstream_port: int) -> None:
+    """Subprocess entry point: serve the API in one worker, pointed at the fake upstream."""
+    # Point the OpenAI provider at the fake upstream before the API builds its clients
+    os.environ["OPENAI_API_KEY"] = "sk-load-test"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{upstream_port}/v1"
+
+    from fastapi_clerk_auth import HTTPAuthorizationCredentials
+    import saas.api.server as server
+
+    server.app.dependency_overrides[server.clerk_guard] = lambda: HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials="load-test", decoded={"sub": "load-test-user"}
+    )
+    server.log_event = lambda *args, **kwargs: None
+    server.log_login_if_new = lambda *args, **kwargs: None
+    uvicorn.run(server.app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def _wait_for_port(port: int, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def _thread_count(pid: int) -> int:
+    """OS thread count of a process (Linux /proc)."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("Threads:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def _one_stream(client: httpx.AsyncClient, url: str, payload: dict) -> tuple[float | None, float, bool]:
+    """Open one SSE stream; return (time to first byte, total duration, completed ok)."""
+    start = time.perf_counter()
+    first = None
+    try:
+        async with client.stream("POST", url, json=payload) as response:
+            if response.status_code != 200:
+                return None, time.perf_counter() - start, False
+            async for _ in response.aiter_bytes():
+                if first is None:
+                    first = time.perf_counter() - start
+        return first, time.perf_counter() - start, True
+    except httpx.HTTPError:
+        return first, time.perf_counter() - start, False
+
+
+async def _run_level(url: str, concurrency: int, api_pid: int) -> dict:
+    payload = {
+        "applicant_name": "Load Test",
+        "application_date": "2025-01-01",
+        "role_applied_for": "Engineer",
+        "additional_notes": "",
+        "model": "gpt-4o-mini",
+    }
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(300.0)) as client:
+        peak_threads = 0
+
+        async def sample_threads():
+            nonlocal peak_threads
+            while True:
+                peak_threads = max(peak_threads, _thread_count(api_pid))
+                await asyncio.sleep(0.2)
+
+        sampler = asyncio.create_task(sample_threads())
+        start = time.perf_counter()
+        results = await asyncio.gather(*(_one_stream(client, url, payload) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+        sampler.cancel()
+    ttfb = sorted(r[0] for r in results if r[0] is not None)
+    return {
+        "concurrency": concurrency,
+        "ok": sum(1 for r in results if r[2]),
+        "wall_s": wall,
+        "stream_s_p50": statistics.median(r[1] for r in results),
+        "ttfb_p50_s": statistics.median(ttfb) if ttfb else float("nan"),
+        "ttfb_p95_s": ttfb[int(len(ttfb) * 0.95) - 1] if ttfb else float("nan"),
+        "api_threads_peak": peak_threads,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="50,200,500", help="comma-separated concurrency levels")
+    parser.add_argument("--tokens", type=int, default=40, help="chunks per upstream stream")
+    parser.add_argument("--token-delay", type=float, default=0.1, help="seconds between upstream chunks")
+    args = parser.parse_args()
+
+    upstream_port, api_port = _free_port(), _free_port()
+    ctx = mp.get_context("spawn")
+    upstream = ctx.Process(target=_run_upstream, args=(upstream_port, args.tokens, args.token_delay), daemon=True)
+    api = ctx.Process(target=_run_api, args=(api_port, upstream_port), daemon=True)
+    upstream.start()
+    api.start()
+    _wait_for_port(upstream_port)
+    _wait_for_port(api_port)
+
+    url = f"http://127.0.0.1:{api_port}/api/consultation"
+    single_stream_s = args.tokens * args.token_delay
+    print(f"Each stream: {args.tokens} chunks x {args.token_delay}s = {single_stream_s:.1f}s upstream\n")
+    header = (
+        f"{'streams':>8}{'ok':>6}{'wall s':>9}{'stream p50 s':>14}{'TTFB p50 s':>12}"
+        f"{'TTFB p95 s':>12}{'upstream peak':>15}{'API threads':>13}"
+    )
+    print(header)
+    print("-" * len(header))
+    try:
+        for level in (int(x) for x in args.levels.split(",")):
+            result = asyncio.run(_run_level(url, level, api.pid))
+            upstream_peak = httpx.post(f"http://127.0.0.1:{upstream_port}/stats/reset").json()["peak"]
+            print(
+                f"{result['concurrency']:>8}{result['ok']:>6}{result['wall_s']:>9.1f}{result['stream_s_p50']:>14.1f}"
+                f"{result['ttfb_p50_s']:>12.3f}{result['ttfb_p95_s']:>12.3f}{upstream_peak:>15}"
+                f"{result['api_threads_peak']:>13}"
+            )
+    finally:
+        api.terminate()
+        upstream.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+import io
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
+import fitz  # PyMuPDF
+
+from saas.logger import get_logger
+
+logger = get_logger("document_parser")
+
+
+# Parse budget — hard limits that keep pathological uploads from consuming workers and
+# OCR spend. Bytes/DOCX/image-pixel limits reject the upload outright (413); page,
+# pixel, OCR-page and wall-clock limits stop extraction early with a partial result.
+PARSE_MAX_BYTES = int(os.getenv("PARSE_MAX_BYTES", str(20 * 1024 * 1024)))
+PARSE_MAX_PAGES = int(os.getenv("PARSE_MAX_PAGES", "30"))
+PARSE_MAX_RENDER_PIXELS = int(os.getenv("PARSE_MAX_RENDER_PIXELS", str(40_000_000)))
+PARSE_MAX_OCR_PAGES = int(os.getenv("PARSE_MAX_OCR_PAGES", "10"))
+PARSE_MAX_SECONDS = float(os.getenv("PARSE_MAX_SECONDS", "90"))
+PARSE_MAX_DOCX_UNCOMPRESSED_BYTES = int(os.getenv("PARSE_MAX_DOCX_UNCOMPRESSED_BYTES", str(50 * 1024 * 1024)))
+
+
+class DocumentTooLarge(Exception):
+    """Raised when an upload exceeds a hard parse limit and must be rejected outright."""
+
+
+def check_docx_size(file_bytes: bytes) -> None:
+    """
+    Reject decompression bombs: a .docx is a zip, and a few KB can expand to gigabytes
+    of XML. Sums the declared uncompressed sizes without extracting anything.
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as zf:
+            uncompressed = sum(info.file_size for info in zf.infolist())
+    except zipfile.BadZipFile:
+        return  # legacy .doc or corrupt file — let the parser report it
+    if uncompressed > PARSE_MAX_DOCX_UNCOMPRESSED_BYTES:
+        raise DocumentTooLarge(
+            f"Word document expands to {uncompressed // (1024 * 1024)} MB "
+            f"(limit {PARSE_MAX_DOCX_UNCOMPRESSED_BYTES // (1024 * 1024)} MB)"
+        )
+
+
+# Per-page text-layer classification thresholds (see page_text_is_usable)
+PAGE_TEXT_MIN_CHARS = int(os.getenv("PAGE_TEXT_MIN_CHARS", "80"))
+PAGE_TEXT_MIN_PRINTABLE_RATIO = float(os.getenv("PAGE_TEXT_MIN_PRINTABLE_RATIO", "0.9"))
+PAGE_TEXT_MAX_GARBLED_RATIO = float(os.getenv("PAGE_TEXT_MAX_GARBLED_RATIO", "0.05"))
+
+# "(cid:123)" glyph references left behind when a font has no Unicode mapping
+_CID_GLYPH_RE = re.compile(r"\(cid:\d+\)")
+
+
+def page_text_is_usable(text: str) -> bool:
+    """
+    Decide whether a page's extracted text layer can be used as-is, or whether the
+    page must be rendered and OCR'd instead.
+
+    A page is usable when it has at least PAGE_TEXT_MIN_CHARS non-whitespace characters,
+    a printable-character ratio of at least PAGE_TEXT_MIN_PRINTABLE_RATIO, and at most
+    PAGE_TEXT_MAX_GARBLED_RATIO garbled glyphs (unmapped "(cid:N)" references, U+FFFD
+    replacement characters, private-use code points).
+    """
+    stripped = "".join(text.split())
+    if len(stripped) < PAGE_TEXT_MIN_CHARS:
+        return False
+
+    printable = sum(1 for ch in stripped if ch.isprintable())
+    if printable / len(stripped) < PAGE_TEXT_MIN_PRINTABLE_RATIO:
+        return False
+
+    cid_matches = _CID_GLYPH_RE.findall(stripped)
+    garbled = len(cid_matches) + sum(
+        1 for ch in stripped if ch == "\ufffd" or "\ue000" <= ch <= "\uf8ff"
+    )
+    glyph_count = len(stripped) - sum(len(m) for m in cid_matches) + len(cid_matches)
+    return garbled / glyph_count <= PAGE_TEXT_MAX_GARBLED_RATIO
+
+
+def open_pdf(file_bytes: bytes) -> fitz.Document:
+    """Open PDF bytes with PyMuPDF. The caller owns the document and must close it."""
+    return fitz.open(stream=file_bytes, filetype="pdf")
+
+
+def pages_needing_ocr(doc: fitz.Document, page_texts: list[str]) -> list[int]:
+    """
+    Return the 0-based indices of pages whose text layer is unusable and that carry
+    at least one image (a page with neither text nor images is simply blank).
+    """
+    return [
+        i for i, text in enumerate(page_texts)
+        if not page_text_is_usable(text) and doc[i].get_images(full=False)
+    ]
+
+
+# Image preparation before vision OCR (see render_page_for_ocr / prepare_image_for_ocr)
+OCR_MAX_EDGE_PX = int(os.getenv("OCR_MAX_EDGE_PX", "1600"))
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "96"))
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "200"))
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "80"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() in ("1", "true", "yes")
+
+
+def ocr_render_dpi(width: float, height: float) -> int:
+    """
+    Pick a render DPI for a page of the given size (in points) so its longest edge
+    lands at OCR_MAX_EDGE_PX pixels, clamped to [OCR_MIN_DPI, OCR_MAX_DPI]. A Letter/A4
+    page lands around 140–150 DPI; oversized pages are rendered coarser.
+    """
+    longest_edge_inches = max(width, height) / 72
+    if longest_edge_inches <= 0:
+        return OCR_MIN_DPI
+    dpi = int(OCR_MAX_EDGE_PX / longest_edge_inches)
+    return max(OCR_MIN_DPI, min(OCR_MAX_DPI, dpi))
+
+
+def ocr_render_pixels(width: float, height: float) -> int:
+    """Pixel count of a page of the given size (in points) rendered at ocr_render_dpi."""
+    scale = ocr_render_dpi(width, height) / 72
+    return int(width * scale) * int(height * scale)
+
+
+def render_page_for_ocr(doc: fitz.Document, page_index: int) -> tuple[bytes, str]:
+    """
+    Rasterize one page for vision OCR at an adaptive DPI, optionally in grayscale,
+    encoded as JPEG (a fraction of the size of the equivalent colour PNG).
+
+    Returns:
+        (image_bytes, mime)
+    """
+    page = doc[page_index]
+    colorspace = fitz.csGRAY if OCR_GRAYSCALE else fitz.csRGB
+    dpi = ocr_render_dpi(page.rect.width, page.rect.height)
+    pix = page.get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+    return pix.tobytes("jpeg", jpg_quality=OCR_JPEG_QUALITY), "image/jpeg"
+
+
+def render_page_png(doc: fitz.Document, page_index: int) -> bytes:
+    """Rasterize one page to colour PNG at 2× zoom — the original OCR settings, kept as a baseline."""
+    pix = doc[page_index].get_pixmap(matrix=fitz.Matrix(2, 2))
+    return pix.tobytes("png")
+
+
+def prepare_image_for_ocr(file_bytes: bytes, mime: str) -> tuple[bytes, str]:
+    """
+    Normalize an uploaded photo/scan for vision OCR: apply the EXIF orientation,
+    convert to grayscale, cap the longest edge at OCR_MAX_EDGE_PX and re-encode as JPEG.
+
+    Falls back to the original bytes if Pillow is unavailable or cannot decode the image,
+    or if re-encoding would neither rotate the image nor make the upload smaller.
+    Raises DocumentTooLarge if the image has more than PARSE_MAX_RENDER_PIXELS pixels.
+
+    Returns:
+        (image_bytes, mime)
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        logger.warning("Pillow not installed, sending image to OCR unmodified")
+        return file_bytes, mime
+
+    try:
+        with Image.open(io.BytesIO(file_bytes)) as img:
+            # Image.open only reads the header, so this runs before any pixels are decoded
+            if img.width * img.height > PARSE_MAX_RENDER_PIXELS:
+                raise DocumentTooLarge(
+                    f"Image is {img.width}x{img.height} pixels (limit {PARSE_MAX_RENDER_PIXELS:,} pixels)"
+                )
+            rotated = img.getexif().get(0x0112, 1) != 1  # EXIF Orientation tag
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("L" if OCR_GRAYSCALE else "RGB")
+            img.thumbnail((OCR_MAX_EDGE_PX, OCR_MAX_EDGE_PX))
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=OCR_JPEG_QUALITY, optimize=True)
+    except DocumentTooLarge:
+        raise
+    except Image.DecompressionBombError as exc:
+        raise DocumentTooLarge(str(exc))
+    except Exception as exc:
+        logger.warning("Image preparation failed, sending original", extra={"error": str(exc)})
+        return file_bytes, mime
+
+    prepared = out.getvalue()
+    if len(prepared) >= len(file_bytes) and not rotated:
+        return file_bytes, mime
+    logger.debug(
+        "Image prepared for OCR",
+        extra={"original_bytes": len(file_bytes), "prepared_bytes": len(prepared)},
+    )
+    return prepared, "image/jpeg"
+
+
+# Streaming DOCX extraction (see stream_docx_text)
+DOCX_STREAMING_PARSER = os.getenv("DOCX_STREAMING_PARSER", "true").lower() in ("1", "true", "yes")
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_W_P, _W_TC, _W_TBL, _W_BODY = _W + "p", _W + "tc", _W + "tbl", _W + "body"
+_W_PPR, _W_VMERGE = _W + "pPr", _W + "vMerge"
+# Run-level elements and the text they contribute, matching python-docx's Paragraph.text
+_W_RUN_TEXT = {_W + "tab": "\t", _W + "br": "\n", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+
+def stream_docx_text(file_bytes: bytes) -> str:
+    """
+    Extract text from a .docx by streaming word/document.xml through an incremental
+    XML parser, without building python-docx's object model.
+
+    Paragraphs and table cells are emitted in document order. Each cell is emitted
+    once: a horizontally merged cell is a single <w:tc>, and the continuation cells of
+    a vertical merge (<w:vMerge/> without val="restart") are skipped. Text boxes are
+    included; the legacy VML copy of a text box (mc:Fallback) is ignored so its text
+    is not duplicated. Elements are cleared as soon as they are consumed, so memory
+    stays flat regardless of document length.
+
+    Returns:
+        Non-empty paragraphs and cells joined by blank lines
+
+    Raises:
+        zipfile.BadZipFile / KeyError if the file is not a .docx with word/document.xml,
+        xml.etree.ElementTree.ParseError if the XML is malformed.
+    """
+    parts: list[str] = []
+    paragraphs: list[list[str]] = []  # run-text buffers of the open <w:p> elements
+    cells: list[list] = []  # [paragraph depth at open, paragraph texts, is merge continuation]
+    body = None
+    fallback_depth = 0
+    ppr_depth = 0
+
+    with zipfile.ZipFile(io.BytesIO(file_bytes)) as zf, zf.open("word/document.xml") as xml_file:
+        for event, elem in ElementTree.iterparse(xml_file, events=("start", "end")):
+            tag = elem.tag
+            if tag == _MC_FALLBACK:
+                fallback_depth += 1 if event == "start" else -1
+                if event == "end":
+                    elem.clear()
+                continue
+            if fallback_depth:
+                continue
+
+            if event == "start":
+                if tag == _W_P:
+                    paragraphs.append([])
+                elif tag == _W_TC:
+                    cells.append([len(paragraphs), [], False])
+                elif tag == _W_PPR:
+                    ppr_depth += 1  # tab stops and the paragraph mark's run properties live here
+                elif tag == _W_BODY:
+                    body = elem
+                continue
+
+            if tag == _W + "t":
+                if paragraphs:
+                    paragraphs[-1].append(elem.text or "")
+            elif tag in _W_RUN_TEXT:
+                if paragraphs and not ppr_depth:
+                    paragraphs[-1].append(_W_RUN_TEXT[tag])
+            elif tag == _W_PPR:
+                ppr_depth -= 1
+            elif tag == _W_VMERGE:
+                if cells and elem.get(_W + "val", "continue") != "restart":
+                    cells[-1][2] = True
+            elif tag == _W_P:
+                text = "".join(paragraphs.pop())
+                if cells and cells[-1][0] == len(paragraphs):
+                    cells[-1][1].append(text)
+                elif text.strip():
+                    parts.append(text)
+                elem.clear()
+            elif tag == _W_TC:
+                _, texts, continuation = cells.pop()
+                text = "\n".join(texts)
+                if not continuation and text.strip():
+                    parts.append(text)
+                elem.clear()
+
+            # Drop finished top-level blocks so the tree never holds more than one
+            if body is not None and not paragraphs and not cells and tag in (_W_P, _W_TBL):
+                body.clear()
+
+    return "\n\n".join(parts)
+
+
+def parse_docx_object_model(file_bytes: bytes) -> str:
+    """
+    Extract text using python-docx: non-empty paragraphs, then non-empty table cells.
+    Merged cells are returned once per grid position they span, so their text repeats.
+    """
+    from docx import Document as DocxDocument
+
+    doc = DocxDocument(io.BytesIO(file_bytes))
+    parts: list[str] = []
+    for para in doc.paragraphs:
+        if para.text.strip():
+            parts.append(para.text)
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                if cell.text.strip():
+                    parts.append(cell.text)
+    return "\n\n".join(parts)
+
+
+# --- Process-pool jobs -------------------------------------------------------------
+# Top-level functions taking and returning plain bytes/str/lists so they can be pickled
+# to the parse pool's worker processes (see saas.parse_pool).
+
+def extract_pdf_layers(file_bytes: bytes) -> tuple[list[str], list[int], int, list[tuple[float, float]]]:
+    """
+    Open a PDF once, extract the text layer of the first PARSE_MAX_PAGES pages and
+    classify it.
+
+    Returns:
+        (page_texts, 0-based indices of pages that need OCR, total page count,
+         (width, height) in points of each page that needs OCR)
+    """
+    doc = open_pdf(file_bytes)
+    try:
+        page_count = doc.page_count
+        page_texts = [doc[i].get_text() or "" for i in range(min(page_count, PARSE_MAX_PAGES))]
+        ocr_indices = pages_needing_ocr(doc, page_texts)
+        ocr_sizes = [(doc[i].rect.width, doc[i].rect.height) for i in ocr_indices]
+        return page_texts, ocr_indices, page_count, ocr_sizes
+    finally:
+        doc.close()
+
+
+def render_pages_job(
+    file_bytes: bytes, pages: list[int], baseline_pages: list[int]
+) -> list[tuple[bytes, str, bytes | None]]:
+    """
+    Open a PDF once and render a chunk of pages for OCR.
+
+    Args:
+        file_bytes:     PDF bytes
+        pages:          0-based page indices to render
+        baseline_pages: subset of pages to also render with the original 2× PNG settings
+
+    Returns:
+        One (image_bytes, mime, baseline_png_or_None) per requested page, in order
+    """
+    doc = open_pdf(file_bytes)
+    try:
+        rendered = []
+        for i in pages:
+            img_bytes, mime = render_page_for_ocr(doc, i)
+            baseline = render_page_png(doc, i) if i in baseline_pages else None
+            rendered.append((img_bytes, mime, baseline))
+        return rendered
+    finally:
+        doc.close()
+
+
+def parse_docx_bytes(file_bytes: bytes) -> str:
+    """
+    Extract text from a .docx (or .doc) file. Uses the streaming extractor
+    (stream_docx_text) when DOCX_STREAMING_PARSER is enabled, falling back to the
+    python-docx object model if the file has no readable word/document.xml.
+    Raises DocumentTooLarge for decompression bombs.
+    """
+    check_docx_size(file_bytes)
+    if DOCX_STREAMING_PARSER:
+        try:
+            return stream_docx_text(file_bytes)
+        except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as exc:
+            logger.warning(
+                "Streaming DOCX extraction failed, falling back to python-docx",
+                extra={"error_type": type(exc).__name__, "error": str(exc)},
+            )
+    return parse_docx_object_model(file_bytes)
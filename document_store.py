@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from saas.logger import get_logger
+
+logger = get_logger("document_store")
+
+# Lifecycle of an ingested document
+STATUS_PROCESSING = "processing"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+class DocumentStore:
+    """
+    Per-user store of ingested documents and their extracted text, so a resume or
+    LinkedIn export is uploaded and parsed once and then referenced by document_id.
+
+    - Records are plain dicts keyed by (user_id, document_id); a user can only ever
+      read their own documents.
+    - Every record expires `ttl_seconds` after ingestion.
+    - Each user keeps at most `max_documents_per_user` documents, and the extracted
+      text of all documents is bounded by `max_bytes`; the oldest go first.
+    - Re-ingesting identical content returns the existing document instead of a new one.
+
+    Thread-safe; ingestion jobs complete records from background threads while request
+    handlers wait on them.
+    """
+
+    def __init__(self, ttl_seconds: float, max_documents_per_user: int, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_documents_per_user = max_documents_per_user
+        self.max_bytes = max_bytes
+        # Insertion-ordered and the TTL is fixed, so the oldest (first to expire) is always first
+        self._records: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self._user_docs: dict[str, OrderedDict[str, None]] = {}
+        self._bytes = 0
+        self._cond = threading.Condition()
+        self.ingested = 0
+        self.reused = 0
+        self.failed = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def create(self, user_id: str, filename: str | None, size_bytes: int, content_key: str) -> tuple[dict, bool]:
+        """
+        Register a document for ingestion, or return the user's existing, unexpired
+        document with the same content.
+
+        Returns:
+            (record, created) — created is False when an existing record was reused
+        """
+        with self._cond:
+            self._purge_expired()
+            for doc_id in reversed(self._user_docs.get(user_id, ())):
+                record = self._records[(user_id, doc_id)]
+                if record["content_key"] == content_key and record["status"] != STATUS_FAILED:
+                    self.reused += 1
+                    return dict(record), False
+
+            now = time.time()
+            record = {
+                "document_id": uuid.uuid4().hex,
+                "status": STATUS_PROCESSING,
+                "filename": filename,
+                "size_bytes": size_bytes,
+                "content_key": content_key,
+                "created_at": now,
+                "expires_at": now + self.ttl_seconds,
+                "text": None,
+                "char_count": 0,
+                "partial": False,
+                "limits_hit": [],
+                "page_count": 0,
+                "ocr_page_count": 0,
+                "error": None,
+                "error_status": None,
+            }
+            self._records[(user_id, record["document_id"])] = record
+            user_docs = self._user_docs.setdefault(user_id, OrderedDict())
+            user_docs[record["document_id"]] = None
+            self.ingested += 1
+            while len(user_docs) > self.max_documents_per_user:
+                self._remove(user_id, next(iter(user_docs)))
+                self.evictions += 1
+            return dict(record), True
+
+    def complete(self, user_id: str, document_id: str, text: str, **fields) -> None:
+        """Store the extracted text (plus partial/limits_hit/page counts) and mark the document ready."""
+        with self._cond:
+            record = self._records.get((user_id, document_id))
+            if record is None:
+                return  # expired or evicted while parsing
+            size = len(text.encode("utf-8"))
+            record.update(fields, text=text, char_count=len(text), status=STATUS_READY, _size=size)
+            self._bytes += size
+            if self._bytes > self.max_bytes:
+                for key, old in list(self._records.items()):
+                    if self._bytes <= self.max_bytes:
+                        break
+                    if old is not record and old.get("_size"):
+                        self._remove(*key)
+                        self.evictions += 1
+            self._cond.notify_all()
+
+    def fail(self, user_id: str, document_id: str, error: str, error_status: int) -> None:
+        """Mark the document failed with the error and HTTP status a direct upload would have got."""
+        with self._cond:
+            record = self._records.get((user_id, document_id))
+            if record is not None:
+                record.update(status=STATUS_FAILED, error=error, error_status=error_status)
+            self.failed += 1
+            self._cond.notify_all()
+
+    def get(self, user_id: str, document_id: str, wait: float = 0) -> dict | None:
+        """
+        Return a copy of the user's document record, or None if it does not exist or
+        has expired. With wait > 0, blocks up to that many seconds while it is processing.
+        """
+        deadline = time.monotonic() + wait
+        with self._cond:
+            while True:
+                self._purge_expired()
+                record = self._records.get((user_id, document_id))
+                if record is None:
+                    return None
+                remaining = deadline - time.monotonic()
+                if record["status"] != STATUS_PROCESSING or remaining <= 0:
+                    return {k: v for k, v in record.items() if not k.startswith("_")}
+                self._cond.wait(remaining)
+
+    def delete(self, user_id: str, document_id: str) -> bool:
+        """Remove the user's document. Returns False if it did not exist."""
+        with self._cond:
+            if (user_id, document_id) not in self._records:
+                return False
+            self._remove(user_id, document_id)
+            return True
+
+    def _remove(self, user_id: str, document_id: str) -> None:
+        """Drop one record. Caller holds the lock."""
+        record = self._records.pop((user_id, document_id))
+        self._bytes -= record.get("_size", 0)
+        user_docs = self._user_docs[user_id]
+        del user_docs[document_id]
+        if not user_docs:
+            del self._user_docs[user_id]
+
+    def _purge_expired(self) -> None:
+        """Drop expired records from the front of the store. Caller holds the lock."""
+        now = time.time()
+        while self._records:
+            (user_id, document_id), record = next(iter(self._records.items()))
+            if record["expires_at"] > now:
+                break
+            self._remove(user_id, document_id)
+            self.expired += 1
+
+    def stats(self) -> dict:
+        """Return document counts, counters and current memory usage."""
+        with self._cond:
+            self._purge_expired()
+            processing = sum(1 for r in self._records.values() if r["status"] == STATUS_PROCESSING)
+            return {
+                "documents": len(self._records),
+                "processing": processing,
+                "users": len(self._user_docs),
+                "ingested": self.ingested,
+                "reused": self.reused,
+                "failed": self.failed,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_document_store: DocumentStore | None = None
+_document_store_lock = threading.Lock()
+
+
+def get_document_store() -> DocumentStore:
+    """
+    Return the process-wide document store, creating it on first call.
+
+    Configured via env vars:
+        DOCUMENT_TTL_SECONDS            how long an ingested document stays usable (default 24 h)
+        DOCUMENT_STORE_MAX_PER_USER     documents kept per user, oldest evicted first (default 20)
+        DOCUMENT_STORE_MAX_BYTES        memory budget for stored text (default 128 MiB)
+    """
+    global _document_store
+    if _document_store is None:
+        with _document_store_lock:
+            if _document_store is None:
+                _document_store = DocumentStore(
+                    ttl_seconds=float(os.getenv("DOCUMENT_TTL_SECONDS", str(24 * 3600))),
+                    max_documents_per_user=int(os.getenv("DOCUMENT_STORE_MAX_PER_USER", "20")),
+                    max_bytes=int(os.getenv("DOCUMENT_STORE_MAX_BYTES", str(128 * 1024 * 1024))),
+                )
+                logger.info("Document store initialized", extra=_document_store.stats())
+    return _document_store
@@ -0,0 +1,147 @@
+import json
+
+
+class _Frame:
+    """An open object or array; `path` is the chain of member names from the root."""
+
+    __slots__ = ("kind", "path", "key", "expect_key", "value_start")
+
+    def __init__(self, kind: str, path: tuple[str, ...]):
+        self.kind = kind
+        self.path = path
+        self.key: str | None = None
+        self.expect_key = kind == "{"
+        self.value_start = 0
+
+
+class JSONStreamParser:
+    """
+    Incremental scanner for one JSON object arriving in chunks (e.g. a json_object model
+    response). feed() returns each member of the root object as soon as its value is
+    complete, and likewise each member of the objects named in `expand`, so a caller can
+    show "overall_score" or one category of "categories" before the rest has arrived.
+
+    Only member boundaries are tracked while scanning; each completed value is decoded
+    with json.loads. Text before the root "{" and after its "}" is ignored. Anything but
+    "," or a closing bracket after a value raises json.JSONDecodeError, as json.loads would.
+
+    Example:
+        parser = JSONStreamParser(expand=("categories",))
+        parser.feed('{"score": 7, "categories": {"a": {"x": 1}')
+        → [(("score",), 7), (("categories", "a"), {"x": 1})]
+    """
+
+    def __init__(self, expand: tuple[str, ...] = ()):
+        self.expand = {(name,) for name in expand}
+        self._text = ""
+        self._pos = 0
+        self._stack: list[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._scalar_start: int | None = None
+        self._value_done = False  # a value just ended; only "," or a closer may follow
+        self._root_start = 0
+        self._root_end: int | None = None
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._text
+
+    def feed(self, chunk: str) -> list[tuple[tuple[str, ...], object]]:
+        """
+        Add the next chunk of text.
+
+        Returns:
+            (path, value) for each watched member completed by this chunk, in order —
+            path is ("name",) for a root member or ("parent", "name") for an expanded one
+
+        Raises:
+            json.JSONDecodeError: a value is followed by something other than "," or a
+                closing bracket
+        """
+        self._text += chunk
+        events: list[tuple[tuple[str, ...], object]] = []
+        text = self._text
+        i = self._pos
+        while i < len(text) and self._root_end is None:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._string_closed(i + 1, events)
+            elif not self._stack:
+                if ch == "{":
+                    self._root_start = i
+                    self._stack.append(_Frame("{", ()))
+            elif self._value_done and not (ch in ",}]" or ch.isspace()):
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, i)
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+                frame = self._stack[-1]
+                if not (frame.kind == "{" and frame.expect_key):
+                    frame.value_start = i
+            elif ch in "{[":
+                parent = self._stack[-1]
+                parent.value_start = i
+                path = parent.path + (parent.key,) if parent.kind == "{" else parent.path + ("[]",)
+                self._stack.append(_Frame(ch, path))
+            elif ch in "}]":
+                self._end_scalar(i, events)
+                self._stack.pop()
+                if self._stack:
+                    self._member_done(i + 1, events)
+                    self._value_done = True
+                else:
+                    self._root_end = i + 1
+            elif ch == ",":
+                self._end_scalar(i, events)
+                self._value_done = False
+                frame = self._stack[-1]
+                if frame.kind == "{":
+                    frame.expect_key = True
+            elif ch == ":":
+                self._stack[-1].expect_key = False
+            elif ch.isspace():
+                if self._scalar_start is not None:
+                    self._end_scalar(i, events)
+                    self._value_done = True
+            elif self._scalar_start is None:
+                # First character of a number, true, false or null
+                self._scalar_start = i
+                self._stack[-1].value_start = i
+            i += 1
+        self._pos = i
+        return events
+
+    def result(self):
+        """Decode the root object. Raises json.JSONDecodeError if it is invalid or incomplete."""
+        if self._root_end is None:
+            raise json.JSONDecodeError("Incomplete JSON object", self._text, len(self._text))
+        return json.loads(self._text[self._root_start:self._root_end])
+
+    def _string_closed(self, end: int, events: list) -> None:
+        frame = self._stack[-1]
+        if frame.kind == "{" and frame.expect_key:
+            frame.key = json.loads(self._text[self._string_start:end])
+        else:
+            self._member_done(end, events)
+            self._value_done = True
+
+    def _end_scalar(self, end: int, events: list) -> None:
+        if self._scalar_start is not None:
+            self._scalar_start = None
+            self._member_done(end, events)
+
+    def _member_done(self, end: int, events: list) -> None:
+        """The value of the innermost open object's current member ends at `end`."""
+        frame = self._stack[-1]
+        if frame.kind == "{" and (not frame.path or frame.path in self.expand):
+            value = json.loads(self._text[frame.value_start:end])
+            events.append((frame.path + (frame.key,), value))
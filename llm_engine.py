@@ -0,0 +1,786 @@
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable, Iterator, NamedTuple
+
+import openai
+from fastapi import HTTPException
+
+from saas.admission import AdmissionRejected, AdmissionSlot, get_admission_controller
+from saas.llm_providers import PROVIDERS, get_async_llm_client, get_llm_client, provider_api_key
+from saas.logger import get_logger
+from saas.response_cache import get_response_cache, make_response_key
+from saas.token_usage import get_token_usage, usage_counts
+
+logger = get_logger("llm_engine")
+
+
+class ModelRoute(NamedTuple):
+    provider: str   # key into saas.llm_providers.PROVIDERS
+    model: str      # upstream model name
+    params: dict    # default chat.completions.create() params for this model
+
+
+# Model names accepted by the API → upstream provider and model
+MODEL_ROUTES = {
+    "gpt-4o-mini": ModelRoute("openai", "gpt-4o-mini", {}),
+    "grok-beta": ModelRoute("groq", "llama-3.3-70b-versatile", {}),
+    "llama-70b": ModelRoute("huggingface", "meta-llama/Llama-3.1-70B-Instruct", {"max_tokens": 2048}),
+}
+DEFAULT_MODEL = "gpt-4o-mini"  # unknown model names fall back to this
+
+
+def resolve_route(model: str) -> ModelRoute:
+    """Map an API model name to its provider route, defaulting to DEFAULT_MODEL."""
+    return MODEL_ROUTES.get(model, MODEL_ROUTES[DEFAULT_MODEL])
+
+
+def require_provider_key(provider: str) -> str:
+    """Return the provider's API key, or raise a 400 telling the operator which key to set."""
+    api_key = provider_api_key(provider)
+    if api_key is None:
+        config = PROVIDERS[provider]
+        raise HTTPException(
+            status_code=400,
+            detail=f"{config['label']} API key not configured. "
+                   f"Please add your {config['api_key_env']} to the .env file",
+        )
+    return api_key
+
+
+def upstream_error(exc: Exception, model: str, endpoint: str, user_id: str | None) -> HTTPException:
+    """Map an exception from a provider call to the HTTPException the client sees."""
+    if isinstance(exc, HTTPException):
+        return exc
+    error_msg = str(exc)
+    extra = {"endpoint": endpoint, "model": model, "user_id": user_id, "error_type": type(exc).__name__}
+    if isinstance(exc, AdmissionRejected) or getattr(exc, "status_code", None) == 429:
+        # Our queue or the provider's rate limit: a retryable 503, not a server error
+        if isinstance(exc, AdmissionRejected):
+            retry_after = exc.retry_after
+        else:
+            retry_after = min(60, max(1, math.ceil(retry_after_seconds(exc) or 5)))
+        logger.warning("Model at capacity", extra={**extra, "retry_after": retry_after})
+        return HTTPException(
+            status_code=503,
+            detail=f"{model} is busy right now. Please retry in {retry_after} seconds",
+            headers={"Retry-After": str(retry_after)},
+        )
+    if "Incorrect API key" in error_msg or "invalid" in error_msg.lower():
+        logger.warning("Invalid API key", extra=extra)
+        return HTTPException(
+            status_code=400,
+            detail=f"Invalid API key for {model}. Please check your API key configuration in the .env file",
+        )
+    if "authentication" in error_msg.lower():
+        logger.warning("Authentication failed", extra=extra)
+        return HTTPException(status_code=401, detail=f"Authentication failed for {model}. Please verify your API key")
+    response = getattr(exc, "response", None)
+    if response is not None:
+        extra["response_status"] = response.status_code
+        extra["response_body"] = response.text[:2000]
+    logger.error("Model request error", extra=extra, exc_info=True)
+    return HTTPException(status_code=500, detail=f"Error initializing {model}: {error_msg}")
+
+
+def sse_frames(text: str) -> Iterator[str]:
+    """
+    Frame one chunk of model output as SSE events. Newlines cannot appear inside a
+    data field, so each line is its own event with a "data:  " marker between lines.
+    """
+    lines = text.split("\n")
+    for line in lines[:-1]:
+        yield f"data: {line}\n\n"
+        yield "data:  \n"
+    yield f"data: {lines[-1]}\n\n"
+
+
+class LLMStream:
+    """
+    One open streaming chat completion. Iterate text() for the raw content deltas or
+    sse() for framed events; either records time-to-first-token and inter-token
+    latency for the model when the stream finishes, plus the token usage the
+    provider reports in its final chunk (`usage`, see saas.token_usage.usage_counts).
+
+    A stream built with cached_text replays a cached response in one chunk instead.
+    A stream built with cache_key stores its full text in the response cache once it
+    completes. The model's admission slot is held until the stream ends (or the
+    LLMStream is garbage collected without ever being iterated).
+    """
+
+    def __init__(
+        self,
+        stream,
+        endpoint: str,
+        model: str,
+        route: ModelRoute,
+        user_id: str | None,
+        started: float,
+        cache_key: str | None = None,
+        cached_text: str | None = None,
+        slot: AdmissionSlot | None = None,
+    ):
+        self._stream = stream
+        self._slot = slot
+        if slot is not None:
+            weakref.finalize(self, slot.release)
+        self.cache_key = cache_key
+        self.cached_text = cached_text
+        self.endpoint = endpoint
+        self.model = model
+        self.route = route
+        self.user_id = user_id
+        self.started = started
+        self.ttft: float | None = None
+        self.text_parts: list[str] = []
+        self.usage: dict | None = None
+
+    @property
+    def full_text(self) -> str:
+        return "".join(self.text_parts)
+
+    async def text(self) -> AsyncIterator[str]:
+        """Yield non-empty content deltas as they arrive."""
+        log_extra = {"endpoint": self.endpoint, "user_id": self.user_id, "model": self.model}
+        if self.cached_text is not None:
+            logger.info("AI stream replayed from cache", extra={**log_extra, "response_chars": len(self.cached_text)})
+            self.text_parts.append(self.cached_text)
+            if self.cached_text:
+                yield self.cached_text
+            return
+
+        logger.info("AI stream started", extra=log_extra)
+        gaps: list[float] = []
+        last = None
+        try:
+            async for chunk in self._stream:
+                # The usage chunk comes last, with no choices; Groq also nests it under x_groq
+                usage = chunk.usage or ((chunk.model_extra or {}).get("x_groq") or {}).get("usage")
+                if usage:
+                    self.usage = usage_counts(usage)
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if not text:
+                    continue
+                now = time.perf_counter()
+                if last is None:
+                    self.ttft = now - self.started
+                else:
+                    gaps.append(now - last)
+                last = now
+                self.text_parts.append(text)
+                yield text
+        except Exception:
+            get_llm_metrics().record_error(self.route.model)
+            logger.error("AI stream error", extra=log_extra, exc_info=True)
+            raise
+        finally:
+            if self._slot is not None:
+                self._slot.release()
+        get_llm_metrics().record_stream(self.route.model, self.ttft, gaps)
+        get_token_usage().record(self.endpoint, self.route.model, self.user_id, self.usage)
+        cache = get_response_cache() if self.cache_key else None
+        if cache is not None:
+            cache.put(self.cache_key, self.full_text, self.full_text)
+        logger.info(
+            "AI stream completed",
+            extra={
+                **log_extra,
+                "response_chars": len(self.full_text),
+                "ttft_ms": round(self.ttft * 1000, 1) if self.ttft is not None else None,
+                "duration_ms": round((time.perf_counter() - self.started) * 1000, 1),
+                **(self.usage or {}),
+            },
+        )
+
+    async def sse(self, on_complete: Callable[[str], None] | None = None) -> AsyncIterator[str]:
+        """Yield SSE-framed events; call on_complete(full_text) once the stream has finished."""
+        async for text in self.text():
+            for frame in sse_frames(text):
+                yield frame
+        if on_complete is not None:
+            on_complete(self.full_text)
+
+
+async def open_stream(
+    endpoint: str,
+    model: str,
+    messages: list[dict],
+    user_id: str | None = None,
+    cache: bool = False,
+    **params,
+) -> LLMStream:
+    """
+    Route `model` to its provider and start a streaming chat completion on the shared
+    async client. Errors before the first byte surface as HTTPException, so the caller
+    can still return a proper status code.
+
+    Transient failures are retried and then failed over to the model's fallback (see
+    FailoverPolicy). With hedging on, a stream whose first token is slower than the
+    model's recent TTFT percentile races a second request to the fallback model; the
+    first to produce a token is served and the other is closed.
+
+    Args:
+        endpoint: API path, for logs and errors
+        model:    API model name (see MODEL_ROUTES)
+        messages: chat messages
+        user_id:  Clerk user id, for logs
+        cache:    serve/store the response through the LLM response cache, if enabled;
+                  a response from the fallback model is not stored (the key names `model`)
+        params:   extra create() params, overriding the route's defaults
+    """
+    route = resolve_route(model)
+    require_provider_key(route.provider)
+    started = time.perf_counter()
+
+    response_cache = get_response_cache() if cache else None
+    cache_key = make_response_key(route.model, messages, {**route.params, **params}) if response_cache else None
+    if response_cache is not None:
+        cached_text = response_cache.get(cache_key, endpoint)
+        if cached_text is not None:
+            return LLMStream(None, endpoint, model, route, user_id, started, cached_text=cached_text)
+
+    policy = get_failover_policy()
+    fallback = policy.fallback_for(model)
+    hedge_after = policy.hedge_delay(route.model) if fallback else None
+    try:
+        if hedge_after is None:
+            opened = await _open_with_failover(endpoint, model, fallback, messages, params, user_id)
+        else:
+            opened = await _open_hedged(endpoint, model, fallback, hedge_after, messages, params, user_id)
+    except Exception as exc:
+        raise upstream_error(exc, model, endpoint, user_id)
+    return LLMStream(
+        opened.chunks,
+        endpoint,
+        opened.model,
+        resolve_route(opened.model),
+        user_id,
+        started,
+        cache_key=cache_key if opened.model == model else None,
+        slot=opened.slot,
+    )
+
+
+class _OpenedStream(NamedTuple):
+    model: str              # API model name that is serving the stream
+    stream: object          # the SDK's AsyncStream, for close()
+    chunks: object          # async iterator of chunks, including any already read
+    slot: AdmissionSlot     # the model's admission slot, held until the stream is done
+
+    async def discard(self) -> None:
+        """Close a stream that will not be served and free its slot."""
+        self.slot.release()
+        await self.stream.close()
+
+
+async def _create_stream(
+    endpoint: str, model: str, messages: list[dict], params: dict, user_id: str | None
+) -> tuple[object, AdmissionSlot]:
+    """
+    Open one streaming completion on `model`'s route once admitted, retrying transient
+    failures. The slot is not held during retry backoff.
+
+    Returns:
+        (the SDK's AsyncStream, its admission slot — the caller releases it)
+    """
+    route = resolve_route(model)
+    policy = get_failover_policy()
+    limiter = get_admission_controller().limiter(route.model)
+    if PROVIDERS[route.provider].get("stream_usage") and "stream_options" not in params:
+        params = {**params, "stream_options": {"include_usage": True}}
+    attempt = 0
+    while True:
+        slot = await limiter.acquire_async(user_id)
+        try:
+            stream = await get_async_llm_client(route.provider).chat.completions.create(
+                model=route.model,
+                messages=messages,
+                stream=True,
+                **{**route.params, **params},
+            )
+            return stream, slot
+        except BaseException as exc:
+            slot.release()
+            if not isinstance(exc, Exception):
+                raise
+            get_llm_metrics().record_error(route.model)
+            delay = policy.retry_delay(exc, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            _log_retry(endpoint, model, user_id, exc, attempt, delay)
+            await asyncio.sleep(delay)
+
+
+async def _open_with_failover(
+    endpoint: str, model: str, fallback: str | None, messages: list[dict], params: dict, user_id: str | None
+) -> _OpenedStream:
+    """Open a stream on `model`, or on `fallback` once `model` has exhausted its retries or is at capacity."""
+    try:
+        stream, slot = await _create_stream(endpoint, model, messages, params, user_id)
+        return _OpenedStream(model, stream, stream, slot)
+    except Exception as exc:
+        if fallback is None or not should_fail_over(exc):
+            raise
+        _log_failover(endpoint, model, fallback, user_id, exc)
+    stream, slot = await _create_stream(endpoint, fallback, messages, params, user_id)
+    return _OpenedStream(fallback, stream, stream, slot)
+
+
+async def _chain(buffered: list, stream) -> AsyncIterator:
+    for chunk in buffered:
+        yield chunk
+    async for chunk in stream:
+        yield chunk
+
+
+async def _open_primed(
+    endpoint: str, model: str, messages: list[dict], params: dict, user_id: str | None
+) -> _OpenedStream:
+    """Open a stream and read up to its first content token, so racing attempts compare on TTFT."""
+    stream, slot = await _create_stream(endpoint, model, messages, params, user_id)
+    buffered = []
+    try:
+        while True:
+            chunk = await stream.__anext__()
+            buffered.append(chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                break
+    except StopAsyncIteration:
+        pass
+    except BaseException:
+        # Includes cancellation of the losing side of a hedge: release its connection and slot
+        slot.release()
+        await stream.close()
+        raise
+    return _OpenedStream(model, stream, _chain(buffered, stream), slot)
+
+
+async def _open_hedged(
+    endpoint: str,
+    model: str,
+    fallback: str,
+    hedge_after: float,
+    messages: list[dict],
+    params: dict,
+    user_id: str | None,
+) -> _OpenedStream:
+    """
+    Start `model`; if it has no first token after `hedge_after` seconds, also start
+    `fallback` and serve whichever produces a token first, cancelling the other.
+    """
+    primary = asyncio.create_task(_open_primed(endpoint, model, messages, params, user_id))
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            exc = primary.exception()
+            if exc is None:
+                return primary.result()
+            if not should_fail_over(exc):
+                raise exc
+            _log_failover(endpoint, model, fallback, user_id, exc)
+            return await _open_primed(endpoint, fallback, messages, params, user_id)
+
+        logger.info(
+            "Hedging slow model request",
+            extra={"endpoint": endpoint, "user_id": user_id, "model": model, "fallback_model": fallback,
+                   "hedge_after_ms": round(hedge_after * 1000, 1)},
+        )
+        get_llm_metrics().record_event(resolve_route(model).model, "hedges")
+        hedge = asyncio.create_task(_open_primed(endpoint, fallback, messages, params, user_id))
+        tasks.append(hedge)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [task for task in done if task.exception() is None]
+            if not winners:
+                continue
+            winner = primary if primary in winners else hedge
+            for loser in pending:
+                loser.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in winners:
+                if task is not winner:
+                    await task.result().discard()
+            if winner is hedge:
+                get_llm_metrics().record_event(resolve_route(model).model, "hedge_wins")
+            logger.info(
+                "Hedged request settled",
+                extra={"endpoint": endpoint, "user_id": user_id, "model": model, "served_by": winner.result().model},
+            )
+            return winner.result()
+        raise primary.exception()
+    except asyncio.CancelledError:
+        # Client went away mid-race: stop both attempts (each closes its own stream)
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+def complete(
+    endpoint: str,
+    model: str,
+    messages: list[dict],
+    user_id: str | None = None,
+    cache: bool = False,
+    **params,
+):
+    """
+    Non-streaming chat completion routed like open_stream, on the shared sync client,
+    with the same retries and failover (but no hedging).
+
+    Returns:
+        The SDK's ChatCompletion (the cached one on a response cache hit)
+    """
+    route = resolve_route(model)
+    require_provider_key(route.provider)
+
+    response_cache = get_response_cache() if cache else None
+    cache_key = make_response_key(route.model, messages, {**route.params, **params}) if response_cache else None
+    if response_cache is not None:
+        cached = response_cache.get(cache_key, endpoint)
+        if cached is not None:
+            logger.info("AI response served from cache", extra={"endpoint": endpoint, "user_id": user_id, "model": model})
+            return cached
+
+    fallback = get_failover_policy().fallback_for(model)
+    served_by = model
+    try:
+        try:
+            response = _complete_with_retries(endpoint, model, messages, params, user_id)
+        except Exception as exc:
+            if fallback is None or not should_fail_over(exc):
+                raise
+            _log_failover(endpoint, model, fallback, user_id, exc)
+            served_by = fallback
+            response = _complete_with_retries(endpoint, fallback, messages, params, user_id)
+    except Exception as exc:
+        raise upstream_error(exc, model, endpoint, user_id)
+    # The key names the requested model, so a fallback's response is not stored under it
+    if response_cache is not None and served_by == model:
+        response_cache.put(cache_key, response, response.choices[0].message.content or "")
+    return response
+
+
+def _complete_with_retries(endpoint: str, model: str, messages: list[dict], params: dict, user_id: str | None):
+    """One non-streaming completion on `model`'s route once admitted, retrying transient failures."""
+    route = resolve_route(model)
+    policy = get_failover_policy()
+    limiter = get_admission_controller().limiter(route.model)
+    attempt = 0
+    while True:
+        slot = limiter.acquire(user_id)
+        started = time.perf_counter()
+        try:
+            try:
+                response = get_llm_client(route.provider).chat.completions.create(
+                    model=route.model,
+                    messages=messages,
+                    **{**route.params, **params},
+                )
+            finally:
+                slot.release()  # before any retry backoff, so a sleeping retry holds no slot
+        except Exception as exc:
+            get_llm_metrics().record_error(route.model)
+            delay = policy.retry_delay(exc, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            _log_retry(endpoint, model, user_id, exc, attempt, delay)
+            time.sleep(delay)
+            continue
+        get_llm_metrics().record_completion(route.model, time.perf_counter() - started)
+        get_token_usage().record(endpoint, route.model, user_id, usage_counts(response.usage))
+        return response
+
+
+def _log_retry(endpoint: str, model: str, user_id: str | None, exc: Exception, attempt: int, delay: float) -> None:
+    get_llm_metrics().record_event(resolve_route(model).model, "retries")
+    logger.warning(
+        "Retrying model request",
+        extra={"endpoint": endpoint, "user_id": user_id, "model": model, "attempt": attempt,
+               "delay_ms": round(delay * 1000, 1), "error_type": type(exc).__name__,
+               "status_code": getattr(exc, "status_code", None)},
+    )
+
+
+def _log_failover(endpoint: str, model: str, fallback: str, user_id: str | None, exc: Exception) -> None:
+    get_llm_metrics().record_event(resolve_route(model).model, "failovers")
+    logger.warning(
+        "Failing over to fallback model",
+        extra={"endpoint": endpoint, "user_id": user_id, "model": model, "fallback_model": fallback,
+               "error_type": type(exc).__name__, "status_code": getattr(exc, "status_code", None)},
+    )
+
+
+# Upstream statuses worth retrying: timeouts, lock conflicts, rate limits and server errors
+_RETRYABLE_STATUS = {408, 409, 429}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for connection errors, timeouts, 408/409/429 and 5xx responses from a provider."""
+    if isinstance(exc, openai.APIConnectionError):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in _RETRYABLE_STATUS or exc.status_code >= 500
+    return False
+
+
+def should_fail_over(exc: BaseException) -> bool:
+    """Whether a call that failed with exc is worth repeating on the fallback model."""
+    return is_retryable(exc) or isinstance(exc, AdmissionRejected)
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """Seconds the provider asked us to wait (retry-after-ms / retry-after headers), if any."""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    for header, divisor in (("retry-after-ms", 1000), ("retry-after", 1)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) / divisor)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+class FailoverPolicy:
+    """
+    How provider calls recover from slow or failing upstreams.
+
+    - Retries: up to `max_retries` more attempts on retryable errors, sleeping for the
+      provider's Retry-After when it sends one, else a full-jitter exponential backoff
+      (uniform in [0, min(backoff_max, backoff_base * 2**attempt)]). A Retry-After longer
+      than `retry_after_max` is not waited out; the call fails over instead.
+    - Failover: once retries are exhausted, the call is repeated on the model's fallback
+      (`fallbacks`, API model name → API model name), if that provider is configured.
+    - Hedging (streams only, opt-in): when a model has at least `hedge_min_samples`
+      recent TTFT samples, a stream with no first token after its `hedge_percentile`
+      TTFT (but at least `hedge_min_delay` seconds) also starts on the fallback.
+    """
+
+    def __init__(
+        self,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        retry_after_max: float,
+        fallbacks: dict[str, str],
+        hedge_enabled: bool,
+        hedge_percentile: float,
+        hedge_min_samples: int,
+        hedge_min_delay: float,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.fallbacks = fallbacks
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+
+    def retry_delay(self, exc: BaseException, attempt: int) -> float | None:
+        """Seconds to wait before retry number attempt + 1, or None to stop retrying."""
+        if attempt >= self.max_retries or not is_retryable(exc):
+            return None
+        retry_after = retry_after_seconds(exc)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.retry_after_max else None
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def fallback_for(self, model: str) -> str | None:
+        """The fallback API model for `model`, if one is set and its provider has a key."""
+        fallback = self.fallbacks.get(model)
+        if not fallback or fallback not in MODEL_ROUTES or fallback == model:
+            return None
+        if provider_api_key(MODEL_ROUTES[fallback].provider) is None:
+            return None
+        return fallback
+
+    def hedge_delay(self, upstream_model: str) -> float | None:
+        """Seconds to wait for a first token before hedging, or None when not hedging."""
+        if not self.hedge_enabled:
+            return None
+        threshold = get_llm_metrics().ttft_percentile(upstream_model, self.hedge_percentile, self.hedge_min_samples)
+        if threshold is None:
+            return None
+        return max(self.hedge_min_delay, threshold)
+
+
+def _parse_fallbacks(value: str) -> dict[str, str]:
+    """Parse "grok-beta=llama-70b,llama-70b=grok-beta" into a dict."""
+    fallbacks = {}
+    for pair in value.split(","):
+        if "=" in pair:
+            model, fallback = pair.split("=", 1)
+            fallbacks[model.strip()] = fallback.strip()
+    return fallbacks
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_failover_policy: FailoverPolicy | None = None
+_failover_policy_lock = threading.Lock()
+
+
+def get_failover_policy() -> FailoverPolicy:
+    """
+    Return the process-wide failover policy, creating it on first call.
+
+    Configured via env vars:
+        LLM_MAX_RETRIES                 retries per provider after the first attempt (default 2)
+        LLM_RETRY_BACKOFF_BASE          first backoff ceiling in seconds, doubled per retry (default 0.5)
+        LLM_RETRY_BACKOFF_MAX           backoff ceiling in seconds (default 8)
+        LLM_RETRY_AFTER_MAX             longest Retry-After honoured before failing over (default 20)
+        LLM_FALLBACK_MODELS             model=fallback pairs, comma-separated
+                                        (default "grok-beta=llama-70b,llama-70b=grok-beta")
+        LLM_HEDGE_ENABLED               hedge slow streams to the fallback model (default false)
+        LLM_HEDGE_PERCENTILE            TTFT percentile that triggers the hedge (default 0.95)
+        LLM_HEDGE_MIN_SAMPLES           TTFT samples needed before hedging a model (default 20)
+        LLM_HEDGE_MIN_DELAY_SECONDS     never hedge sooner than this (default 1)
+    """
+    global _failover_policy
+    if _failover_policy is None:
+        with _failover_policy_lock:
+            if _failover_policy is None:
+                _failover_policy = FailoverPolicy(
+                    max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+                    backoff_base=float(os.getenv("LLM_RETRY_BACKOFF_BASE", "0.5")),
+                    backoff_max=float(os.getenv("LLM_RETRY_BACKOFF_MAX", "8")),
+                    retry_after_max=float(os.getenv("LLM_RETRY_AFTER_MAX", "20")),
+                    fallbacks=_parse_fallbacks(os.getenv("LLM_FALLBACK_MODELS", "grok-beta=llama-70b,llama-70b=grok-beta")),
+                    hedge_enabled=os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes"),
+                    hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+                    hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+                    hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1")),
+                )
+    return _failover_policy
+
+
+def _percentile_ms(values, q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+class LLMMetrics:
+    """
+    Per-model latency counters over a sliding window of recent calls:
+    time-to-first-token and inter-token gaps for streams, total latency for
+    non-streaming completions.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._models: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model: str) -> dict:
+        if model not in self._models:
+            self._models[model] = {
+                "streams": 0,
+                "completions": 0,
+                "errors": 0,
+                "retries": 0,
+                "failovers": 0,
+                "hedges": 0,
+                "hedge_wins": 0,
+                "ttft": deque(maxlen=self.window),
+                "inter_token": deque(maxlen=self.window),
+                "latency": deque(maxlen=self.window),
+            }
+        return self._models[model]
+
+    def record_stream(self, model: str, ttft: float | None, gaps: list[float]) -> None:
+        with self._lock:
+            entry = self._model(model)
+            entry["streams"] += 1
+            if ttft is not None:
+                entry["ttft"].append(ttft)
+            entry["inter_token"].extend(gaps)
+
+    def record_completion(self, model: str, latency: float) -> None:
+        with self._lock:
+            entry = self._model(model)
+            entry["completions"] += 1
+            entry["latency"].append(latency)
+
+    def record_error(self, model: str) -> None:
+        with self._lock:
+            self._model(model)["errors"] += 1
+
+    def record_event(self, model: str, counter: str) -> None:
+        """Count a retry, failover, hedge or hedge win for the model."""
+        with self._lock:
+            self._model(model)[counter] += 1
+
+    def ttft_percentile(self, model: str, q: float, min_samples: int = 1) -> float | None:
+        """Recent time-to-first-token percentile for a model, in seconds; None with too few samples."""
+        with self._lock:
+            samples = list(self._models.get(model, {}).get("ttft", ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        return sorted(samples)[min(len(samples) - 1, int(q * len(samples)))]
+
+    def stats(self) -> dict:
+        """Per-model counts and p50/p95 latencies in milliseconds."""
+        with self._lock:
+            return {
+                model: {
+                    "streams": entry["streams"],
+                    "completions": entry["completions"],
+                    "errors": entry["errors"],
+                    "retries": entry["retries"],
+                    "failovers": entry["failovers"],
+                    "hedges": entry["hedges"],
+                    "hedge_wins": entry["hedge_wins"],
+                    "ttft_ms_p50": _percentile_ms(entry["ttft"], 0.5),
+                    "ttft_ms_p95": _percentile_ms(entry["ttft"], 0.95),
+                    "inter_token_ms_p50": _percentile_ms(entry["inter_token"], 0.5),
+                    "inter_token_ms_p95": _percentile_ms(entry["inter_token"], 0.95),
+                    "completion_ms_p50": _percentile_ms(entry["latency"], 0.5),
+                    "completion_ms_p95": _percentile_ms(entry["latency"], 0.95),
+                }
+                for model, entry in self._models.items()
+            }
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_llm_metrics: LLMMetrics | None = None
+_llm_metrics_lock = threading.Lock()
+
+
+def get_llm_metrics() -> LLMMetrics:
+    """
+    Return the process-wide LLM latency metrics, creating them on first call.
+
+    Configured via env vars:
+        LLM_METRICS_WINDOW  samples kept per model and series (default 2000)
+    """
+    global _llm_metrics
+    if _llm_metrics is None:
+        with _llm_metrics_lock:
+            if _llm_metrics is None:
+                _llm_metrics = LLMMetrics(window=int(os.getenv("LLM_METRICS_WINDOW", "2000")))
+    return _llm_metrics
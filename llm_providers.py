@@ -0,0 +1,299 @@
+import os
+import threading
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from saas.logger import get_logger
+
+logger = get_logger("llm_providers")
+
+# OpenAI-compatible upstreams. The "grok-beta" option is served by Groq, keyed by XAI_API_KEY.
+# stream_usage: the provider accepts stream_options={"include_usage": True} and sends a final usage chunk.
+PROVIDERS = {
+    "openai": {"base_url": None, "api_key_env": "OPENAI_API_KEY", "label": "OpenAI", "stream_usage": True},
+    "groq": {
+        "base_url": "https://api.groq.com/openai/v1",
+        "api_key_env": "XAI_API_KEY",
+        "label": "xAI",
+        "stream_usage": True,
+    },
+    "huggingface": {
+        "base_url": "https://router.huggingface.co/v1",
+        "api_key_env": "HUGGINGFACE_API_KEY",
+        "label": "Hugging Face",
+        "stream_usage": True,
+    },
+}
+
+# httpcore trace events emitted only when a request has to open a new connection
+_CONNECT_EVENT = "connection.connect_tcp.complete"
+_TLS_EVENT = "connection.start_tls.complete"
+
+
+class ProviderNotConfigured(Exception):
+    """Raised when a provider's API key is missing or still a placeholder."""
+
+
+def provider_api_key(provider: str) -> str | None:
+    """Return the provider's API key, or None if unset or a "your_..." placeholder."""
+    api_key = os.getenv(PROVIDERS[provider]["api_key_env"])
+    if not api_key or api_key.startswith("your_"):
+        return None
+    return api_key
+
+
+class _PoolCounters:
+    """Per-provider request/connection counters, fed by httpx event hooks and httpcore tracing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.error_responses = 0
+
+    def on_request(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    def on_response(self, response: httpx.Response) -> None:
+        if response.status_code >= 400:
+            with self._lock:
+                self.error_responses += 1
+
+    def _trace(self, event_name: str, info: dict) -> None:
+        if event_name == _CONNECT_EVENT:
+            with self._lock:
+                self.connections_opened += 1
+        elif event_name == _TLS_EVENT:
+            with self._lock:
+                self.tls_handshakes += 1
+
+    # httpx.AsyncClient requires coroutine hooks, and async httpcore awaits its trace callback
+
+    async def aon_request(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._atrace
+
+    async def aon_response(self, response: httpx.Response) -> None:
+        self.on_response(response)
+
+    async def _atrace(self, event_name: str, info: dict) -> None:
+        self._trace(event_name, info)
+
+
+class ProviderRegistry:
+    """
+    Long-lived OpenAI SDK clients, one per provider, each on its own keep-alive httpx
+    connection pool. Built once at startup so requests reuse warm TLS connections instead
+    of paying a DNS lookup, TCP connect and TLS handshake before every first token.
+
+    Each provider has a sync client (threadpool handlers, OCR, research) and an async
+    client (streaming endpoints) with separate pools under the same limits. Clients are
+    shared by all requests; per-request settings (e.g. max_retries for OCR) go through
+    client.with_options(), which reuses the pool.
+
+    The SDK's own retries are off (max_retries=0): saas.llm_engine retries and fails
+    over between providers itself. `read_timeouts` overrides the read timeout for
+    individual providers.
+    """
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        connect_timeout: float,
+        read_timeout: float,
+        pool_timeout: float,
+        read_timeouts: dict[str, float] | None = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # read applies between streamed chunks, not to the whole generation
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout, read=read_timeout, write=connect_timeout, pool=pool_timeout
+        )
+        self.timeouts = {
+            name: httpx.Timeout(connect=connect_timeout, read=seconds, write=connect_timeout, pool=pool_timeout)
+            for name, seconds in (read_timeouts or {}).items()
+        }
+        self._clients: dict[str, OpenAI] = {}
+        self._http_clients: dict[str, httpx.Client] = {}
+        self._async_clients: dict[str, AsyncOpenAI] = {}
+        self._async_http_clients: dict[str, httpx.AsyncClient] = {}
+        self._counters = {name: _PoolCounters() for name in PROVIDERS}
+        self._lock = threading.RLock()
+
+    def build(self) -> list[str]:
+        """Create clients for every provider with a configured key. Returns their names."""
+        built = []
+        for name in PROVIDERS:
+            try:
+                self.client(name)
+                self.async_client(name)
+                built.append(name)
+            except ProviderNotConfigured:
+                continue
+        logger.info(
+            "LLM provider clients ready",
+            extra={
+                "providers": built,
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "keepalive_expiry": self.limits.keepalive_expiry,
+            },
+        )
+        return built
+
+    def client(self, provider: str) -> OpenAI:
+        """Return the shared client for a provider. Raises ProviderNotConfigured without a key."""
+        client = self._clients.get(provider)
+        if client is not None:
+            return client
+        with self._lock:
+            if provider not in self._clients:
+                api_key = provider_api_key(provider)
+                if api_key is None:
+                    raise ProviderNotConfigured(f"{PROVIDERS[provider]['api_key_env']} is not configured")
+                self._clients[provider] = OpenAI(
+                    api_key=api_key,
+                    base_url=PROVIDERS[provider]["base_url"],
+                    http_client=self.http_client(provider),
+                    max_retries=0,
+                )
+            return self._clients[provider]
+
+    def http_client(self, provider: str) -> httpx.Client:
+        """Return the provider's pooled httpx client (also handed to LangChain's ChatOpenAI)."""
+        http_client = self._http_clients.get(provider)
+        if http_client is not None:
+            return http_client
+        with self._lock:
+            if provider not in self._http_clients:
+                counters = self._counters[provider]
+                self._http_clients[provider] = httpx.Client(
+                    limits=self.limits,
+                    timeout=self.timeouts.get(provider, self.timeout),
+                    follow_redirects=True,
+                    event_hooks={"request": [counters.on_request], "response": [counters.on_response]},
+                )
+            return self._http_clients[provider]
+
+    def async_client(self, provider: str) -> AsyncOpenAI:
+        """Return the shared async client for a provider. Raises ProviderNotConfigured without a key."""
+        client = self._async_clients.get(provider)
+        if client is not None:
+            return client
+        with self._lock:
+            if provider not in self._async_clients:
+                api_key = provider_api_key(provider)
+                if api_key is None:
+                    raise ProviderNotConfigured(f"{PROVIDERS[provider]['api_key_env']} is not configured")
+                counters = self._counters[provider]
+                http_client = httpx.AsyncClient(
+                    limits=self.limits,
+                    timeout=self.timeouts.get(provider, self.timeout),
+                    follow_redirects=True,
+                    event_hooks={"request": [counters.aon_request], "response": [counters.aon_response]},
+                )
+                self._async_http_clients[provider] = http_client
+                self._async_clients[provider] = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=PROVIDERS[provider]["base_url"],
+                    http_client=http_client,
+                    max_retries=0,
+                )
+            return self._async_clients[provider]
+
+    def close(self) -> None:
+        """Close the sync connection pools (application shutdown)."""
+        for http_client in list(self._http_clients.values()):
+            http_client.close()
+
+    async def aclose(self) -> None:
+        """Close the async connection pools (application shutdown)."""
+        for http_client in list(self._async_http_clients.values()):
+            await http_client.aclose()
+
+    def stats(self) -> dict:
+        """Per-provider request and connection counters plus the current pool occupancy."""
+        result = {}
+        for name, counters in self._counters.items():
+            http_clients = [c for c in (self._http_clients.get(name), self._async_http_clients.get(name)) if c]
+            if not http_clients:
+                continue
+            # httpx has no public pool API; httpcore's ConnectionPool lists its connections
+            connections = []
+            for http_client in http_clients:
+                pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+                connections.extend(getattr(pool, "connections", []))
+            with counters._lock:
+                requests = counters.requests
+                result[name] = {
+                    "requests": requests,
+                    "connections_opened": counters.connections_opened,
+                    "tls_handshakes": counters.tls_handshakes,
+                    "connection_reuse_ratio": (
+                        round(1 - counters.connections_opened / requests, 4) if requests else 0.0
+                    ),
+                    "error_responses": counters.error_responses,
+                    "open_connections": len(connections),
+                    "idle_connections": sum(1 for c in connections if c.is_idle()),
+                }
+        return result
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_provider_registry: ProviderRegistry | None = None
+_provider_registry_lock = threading.Lock()
+
+
+def get_provider_registry() -> ProviderRegistry:
+    """
+    Return the process-wide provider registry, creating it on first call.
+
+    Configured via env vars:
+        LLM_HTTP_MAX_CONNECTIONS        connections per provider and pool; each active stream
+                                        holds one (default 500)
+        LLM_HTTP_MAX_KEEPALIVE          idle connections kept warm per provider (default 20)
+        LLM_HTTP_KEEPALIVE_SECONDS      how long an idle connection is kept (default 60)
+        LLM_HTTP_CONNECT_TIMEOUT        connect/write timeout in seconds (default 5)
+        LLM_HTTP_READ_TIMEOUT           max gap between response bytes, in seconds (default 120)
+        LLM_HTTP_READ_TIMEOUT_<NAME>    read timeout for one provider, e.g. LLM_HTTP_READ_TIMEOUT_GROQ
+        LLM_HTTP_POOL_TIMEOUT           wait for a free pooled connection, in seconds (default 10)
+    """
+    global _provider_registry
+    if _provider_registry is None:
+        with _provider_registry_lock:
+            if _provider_registry is None:
+                _provider_registry = ProviderRegistry(
+                    max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "500")),
+                    max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+                    keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60")),
+                    connect_timeout=float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "5")),
+                    read_timeout=float(os.getenv("LLM_HTTP_READ_TIMEOUT", "120")),
+                    pool_timeout=float(os.getenv("LLM_HTTP_POOL_TIMEOUT", "10")),
+                    read_timeouts={
+                        name: float(os.environ[f"LLM_HTTP_READ_TIMEOUT_{name.upper()}"])
+                        for name in PROVIDERS
+                        if os.getenv(f"LLM_HTTP_READ_TIMEOUT_{name.upper()}")
+                    },
+                )
+    return _provider_registry
+
+
+def get_llm_client(provider: str) -> OpenAI:
+    """Shortcut for get_provider_registry().client(provider)."""
+    return get_provider_registry().client(provider)
+
+
+def get_async_llm_client(provider: str) -> AsyncOpenAI:
+    """Shortcut for get_provider_registry().async_client(provider)."""
+    return get_provider_registry().async_client(provider)
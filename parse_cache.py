@@ -0,0 +1,173 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from saas.logger import get_logger
+
+logger = get_logger("parse_cache")
+
+
+def make_cache_key(file_bytes: bytes, file_type: str) -> str:
+    """Content-addressed key: SHA-256 of the decoded bytes plus the detected file type."""
+    return f"{file_type}-{hashlib.sha256(file_bytes).hexdigest()}"
+
+
+class ParseCache:
+    """
+    Two-tier cache for extracted document text.
+
+    - Memory tier: LRU ordered dict bounded by the total UTF-8 size of the cached text.
+    - Disk tier (optional): one file per key under `disk_dir`, survives restarts.
+      Oldest files (by mtime) are pruned once `disk_max_bytes` is exceeded.
+
+    Thread-safe; the sync FastAPI handlers call into it from the shared threadpool.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: str | None = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[-2:] / f"{key}.txt"
+
+    def get(self, key: str) -> str | None:
+        """Return cached text for key, promoting disk hits into the memory tier."""
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                text = path.read_text(encoding="utf-8")
+            except FileNotFoundError:
+                text = None
+            except OSError as exc:
+                logger.warning("Parse cache disk read failed", extra={"key": key, "error": str(exc)})
+                text = None
+            if text is not None:
+                try:
+                    os.utime(path)  # refresh mtime so disk pruning stays LRU-ish
+                except OSError:
+                    pass
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._store(key, text)
+                return text
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, text: str) -> None:
+        """Insert text into the memory tier and, if configured, the disk tier."""
+        with self._lock:
+            self._store(key, text)
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+                tmp_path.write_text(text, encoding="utf-8")
+                os.replace(tmp_path, path)
+            except OSError as exc:
+                logger.warning("Parse cache disk write failed", extra={"key": key, "error": str(exc)})
+                return
+            if self.disk_max_bytes:
+                self._prune_disk()
+
+    def _store(self, key: str, text: str) -> None:
+        """Insert into the memory LRU and evict until within budget. Caller holds the lock."""
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return  # would evict everything else; leave it to the disk tier
+        if key in self._entries:
+            self._bytes -= self._sizes[key]
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        self._sizes[key] = size
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            old_key, _ = self._entries.popitem(last=False)
+            self._bytes -= self._sizes.pop(old_key)
+            self.evictions += 1
+
+    def _prune_disk(self) -> None:
+        """Delete the least recently used disk entries until within disk_max_bytes."""
+        try:
+            files = [(p.stat(), p) for p in self.disk_dir.glob("*/*.txt")]
+        except OSError:
+            return
+        total = sum(st.st_size for st, _ in files)
+        if total <= self.disk_max_bytes:
+            return
+        for st, path in sorted(files, key=lambda f: f[0].st_mtime):
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= st.st_size
+            if total <= self.disk_max_bytes:
+                break
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current memory usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": self.disk_dir is not None,
+            }
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_parse_cache: ParseCache | None = None
+_parse_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> ParseCache:
+    """
+    Return the process-wide parse cache, creating it on first call.
+
+    Configured via env vars:
+        PARSE_CACHE_MAX_BYTES       memory budget for cached text (default 64 MiB)
+        PARSE_CACHE_DIR             enables the on-disk tier when set
+        PARSE_CACHE_DISK_MAX_BYTES  disk budget, 0 = unbounded (default 512 MiB)
+    """
+    global _parse_cache
+    if _parse_cache is None:
+        with _parse_cache_lock:
+            if _parse_cache is None:
+                _parse_cache = ParseCache(
+                    max_bytes=int(os.getenv("PARSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+                    disk_dir=os.getenv("PARSE_CACHE_DIR") or None,
+                    disk_max_bytes=int(os.getenv("PARSE_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024))),
+                )
+                logger.info("Parse cache initialized", extra=_parse_cache.stats())
+    return _parse_cache
@@ -0,0 +1,217 @@
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from saas.logger import get_logger, setup_logging
+
+logger = get_logger("parse_pool")
+
+
+class ParsePoolFull(Exception):
+    """Raised when the parse queue is at capacity and no slot freed up in time."""
+
+
+class ParseJobTimeout(Exception):
+    """Raised when a parse job exceeds its wall-clock budget."""
+
+
+def _init_worker() -> None:
+    """Worker process initializer: configure JSON logging like the API process."""
+    setup_logging()
+
+
+def _alarm_handler(signum, frame):
+    raise ParseJobTimeout("Parse job exceeded its time limit")
+
+
+def _run_job(fn, timeout: float, args: tuple):
+    """
+    Worker-side wrapper: run fn(*args) under a SIGALRM deadline so a runaway document
+    is interrupted inside the worker instead of pinning it until the pool is recycled.
+    """
+    if timeout > 0:
+        signal.signal(signal.SIGALRM, _alarm_handler)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args)
+    finally:
+        if timeout > 0:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class ParsePool:
+    """
+    Dedicated process pool for CPU-bound document work (PDF text extraction, page
+    rendering, DOCX parsing), so it neither holds the API process's GIL nor occupies
+    the shared request threadpool for the duration of the parse.
+
+    - Bounded queue: at most `workers + max_queue` jobs are admitted at once; callers
+      wait up to `queue_wait` seconds for a slot, then get ParsePoolFull.
+    - Per-job timeout: enforced in the worker via SIGALRM and, as a backstop, by the
+      caller; a job that overruns the backstop gets the pool recycled.
+    - Worker recycling: each worker process exits after `max_tasks_per_child` jobs,
+      releasing whatever memory PyMuPDF / python-docx accumulated.
+
+    With workers=0 jobs run inline in the calling thread (local development, tests).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        job_timeout: float,
+        max_tasks_per_child: int,
+        queue_wait: float,
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self.queue_wait = queue_wait
+        self._slots = threading.BoundedSemaphore(max(1, workers + max_queue))
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.recycles = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    max_tasks_per_child=self.max_tasks_per_child or None,
+                )
+                logger.info("Parse pool started", extra={"workers": self.workers})
+            return self._executor
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        """Tear down a pool whose worker is stuck; the next submit starts a fresh one."""
+        with self._lock:
+            if self._executor is not executor:
+                return  # already recycled by another caller
+            self._executor = None
+            self.recycles += 1
+        # ProcessPoolExecutor has no public API to kill a busy worker
+        for proc in list(getattr(executor, "_processes", {}).values()):
+            proc.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning("Parse pool recycled after a stuck job")
+
+    def submit(self, fn, *args) -> Future:
+        """
+        Queue fn(*args) on the pool and return its future. Blocks up to queue_wait
+        seconds for a queue slot, then raises ParsePoolFull.
+        """
+        if not self._slots.acquire(timeout=self.queue_wait):
+            with self._lock:
+                self.rejected += 1
+            logger.warning("Parse queue full, rejecting job", extra={"job": fn.__name__})
+            raise ParsePoolFull("Document parsing is at capacity, please retry shortly")
+
+        with self._lock:
+            self.submitted += 1
+            self._in_flight += 1
+
+        if self.workers <= 0:
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as exc:
+                future.set_exception(exc)
+        else:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(_run_job, fn, self.job_timeout, args)
+            except Exception:
+                self._release(None)
+                raise
+            future._parse_executor = executor  # remembered so result() can recycle it
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future | None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if future is not None and not future.cancelled():
+                if future.exception() is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                    if isinstance(future.exception(), ParseJobTimeout):
+                        self.timeouts += 1
+        self._slots.release()
+
+    def result(self, future: Future):
+        """
+        Wait for a job submitted via submit(). If the worker-side deadline somehow
+        failed to fire, recycle the pool after a short grace period.
+        """
+        backstop = self.job_timeout + 5 if self.job_timeout > 0 else None
+        try:
+            return future.result(timeout=backstop)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            executor = getattr(future, "_parse_executor", None)
+            if executor is not None:
+                self._recycle(executor)
+            raise ParseJobTimeout("Parse job exceeded its time limit")
+
+    def run(self, fn, *args):
+        """Submit fn(*args) and wait for its result."""
+        return self.result(self.submit(fn, *args))
+
+    def stats(self) -> dict:
+        """Return queue depth and job counters."""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "recycles": self.recycles,
+            }
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_parse_pool: ParsePool | None = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool() -> ParsePool:
+    """
+    Return the process-wide parse pool, creating it on first call.
+
+    Configured via env vars:
+        PARSE_POOL_WORKERS              worker processes, 0 = run inline (default: CPU count, max 4)
+        PARSE_POOL_MAX_QUEUE            jobs allowed to wait beyond the busy workers (default 16)
+        PARSE_POOL_QUEUE_WAIT_SECONDS   how long a caller waits for a queue slot (default 10)
+        PARSE_JOB_TIMEOUT_SECONDS       per-job wall-clock limit (default 60)
+        PARSE_POOL_MAX_TASKS_PER_CHILD  jobs before a worker process is replaced (default 100)
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        with _parse_pool_lock:
+            if _parse_pool is None:
+                _parse_pool = ParsePool(
+                    workers=int(os.getenv("PARSE_POOL_WORKERS", str(min(4, os.cpu_count() or 1)))),
+                    max_queue=int(os.getenv("PARSE_POOL_MAX_QUEUE", "16")),
+                    job_timeout=float(os.getenv("PARSE_JOB_TIMEOUT_SECONDS", "60")),
+                    max_tasks_per_child=int(os.getenv("PARSE_POOL_MAX_TASKS_PER_CHILD", "100")),
+                    queue_wait=float(os.getenv("PARSE_POOL_QUEUE_WAIT_SECONDS", "10")),
+                )
+    return _parse_pool
@@ -0,0 +1,200 @@
+import os
+import threading
+from typing import Callable
+
+from saas.llm_engine import resolve_route
+from saas.logger import get_logger
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to the ~4 chars/token heuristic
+    tiktoken = None
+
+logger = get_logger("prompt_budget")
+
+# Appended to a section that had to be cut to fit the budget
+TRUNCATION_MARKER = "\n[... truncated to fit the model's context budget ...]"
+
+# Encoding used for models tiktoken does not know (the Llama 3 vocabulary is closest to o200k)
+_FALLBACK_ENCODING = "o200k_base"
+
+
+class _Tokenizer:
+    """
+    Counts and truncates text in model tokens with tiktoken when it is installed and its
+    encoding files can be loaded; otherwise approximates one token per 4 characters.
+    Encodings are loaded once per process, and a failed load is not retried.
+    """
+
+    def __init__(self):
+        self._encodings: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def encoding(self, model: str):
+        """tiktoken encoding for an upstream model name, or None to use the heuristic."""
+        if tiktoken is None:
+            return None
+        try:
+            name = tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            name = _FALLBACK_ENCODING
+        if name in self._encodings:
+            return self._encodings[name]
+        with self._lock:
+            if name not in self._encodings:
+                try:
+                    encoding = tiktoken.get_encoding(name)
+                except Exception as exc:
+                    # e.g. no network to fetch the BPE file and nothing in TIKTOKEN_CACHE_DIR
+                    logger.warning(
+                        "tiktoken encoding unavailable, estimating tokens as chars/4",
+                        extra={"encoding": name, "error": str(exc)},
+                    )
+                    encoding = None
+                self._encodings[name] = encoding
+            return self._encodings[name]
+
+    def count(self, text: str, model: str) -> int:
+        encoding = self.encoding(model)
+        if encoding is None:
+            return (len(text) + 3) // 4
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int, model: str) -> str:
+        """The longest prefix of text within max_tokens, cut back to a line break when one is near."""
+        encoding = self.encoding(model)
+        if encoding is None:
+            prefix = text[: max_tokens * 4]
+        else:
+            prefix = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+        cut = prefix.rfind("\n")
+        if cut > len(prefix) * 0.8:
+            prefix = prefix[:cut]
+        return prefix
+
+
+class PromptBudgeter:
+    """
+    Keeps user prompts within a per-model token budget.
+
+    A prompt is rendered from named sections (resume, LinkedIn export, job description,
+    notes...) listed highest priority first. If the rendered prompt is over budget, the
+    excess is cut from the lowest-priority section first, then the next, so the job
+    description survives longest. Cut sections end with TRUNCATION_MARKER.
+    """
+
+    def __init__(self, budgets: dict[str, int], default_budget: int):
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.tokenizer = _Tokenizer()
+
+    def budget_for(self, model: str) -> int:
+        """User-prompt token budget for an API model name."""
+        return self.budgets.get(model, self.default_budget)
+
+    def fit(
+        self,
+        endpoint: str,
+        model: str,
+        render: Callable[[dict[str, str | None]], str],
+        sections: dict[str, str | None],
+    ) -> str:
+        """
+        Render the prompt from `sections`, trimming them to the model's budget if needed.
+
+        Args:
+            endpoint: API path, for logs
+            model:    API model name (see saas.llm_engine.MODEL_ROUTES)
+            render:   builds the prompt text from a sections dict
+            sections: section name → text (or None when absent), highest priority first
+
+        Returns:
+            The prompt text
+        """
+        upstream_model = resolve_route(model).model
+        budget = self.budget_for(model)
+        prompt = render(sections)
+        prompt_tokens = self.tokenizer.count(prompt, upstream_model)
+        section_tokens = {
+            name: self.tokenizer.count(text, upstream_model) if text else 0 for name, text in sections.items()
+        }
+        trimmed: dict[str, int] = {}
+
+        if prompt_tokens > budget:
+            excess = prompt_tokens - budget + self.tokenizer.count(TRUNCATION_MARKER, upstream_model) * len(sections)
+            fitted = dict(sections)
+            for name in reversed(list(sections)):
+                if excess <= 0:
+                    break
+                available = section_tokens[name]
+                if not available:
+                    continue
+                cut = min(excess, available)
+                fitted[name] = self.tokenizer.truncate(sections[name], available - cut, upstream_model) + TRUNCATION_MARKER
+                trimmed[name] = cut
+                excess -= cut
+            prompt = render(fitted)
+            prompt_tokens = self.tokenizer.count(prompt, upstream_model)
+
+        log = logger.warning if trimmed else logger.info
+        log(
+            "Prompt trimmed to token budget" if trimmed else "Prompt token count",
+            extra={
+                "endpoint": endpoint,
+                "model": model,
+                "tokenizer": "tiktoken" if self.tokenizer.encoding(upstream_model) is not None else "chars/4",
+                "budget_tokens": budget,
+                "prompt_tokens": prompt_tokens,
+                "section_tokens": section_tokens,
+                "trimmed_tokens": trimmed,
+            },
+        )
+        return prompt
+
+
+def _parse_budgets(value: str) -> dict[str, int]:
+    """Parse "gpt-4o-mini=24000,llama-70b=6000" into a dict."""
+    budgets = {}
+    for pair in value.split(","):
+        if "=" in pair:
+            model, tokens = pair.split("=", 1)
+            budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_prompt_budgeter: PromptBudgeter | None = None
+_prompt_budgeter_lock = threading.Lock()
+
+
+def get_prompt_budgeter() -> PromptBudgeter:
+    """
+    Return the process-wide prompt budgeter, creating it on first call.
+
+    Configured via env vars:
+        PROMPT_TOKEN_BUDGETS        model=tokens pairs, comma-separated: the largest user prompt
+                                    sent to each model (default
+                                    "gpt-4o-mini=24000,grok-beta=12000,llama-70b=6000")
+        PROMPT_TOKEN_BUDGET_DEFAULT budget for models not listed (default 12000)
+    """
+    global _prompt_budgeter
+    if _prompt_budgeter is None:
+        with _prompt_budgeter_lock:
+            if _prompt_budgeter is None:
+                _prompt_budgeter = PromptBudgeter(
+                    budgets=_parse_budgets(
+                        os.getenv("PROMPT_TOKEN_BUDGETS", "gpt-4o-mini=24000,grok-beta=12000,llama-70b=6000")
+                    ),
+                    default_budget=int(os.getenv("PROMPT_TOKEN_BUDGET_DEFAULT", "12000")),
+                )
+    return _prompt_budgeter
+
+
+def fit_prompt(
+    endpoint: str,
+    model: str,
+    render: Callable[[dict[str, str | None]], str],
+    sections: dict[str, str | None],
+) -> str:
+    """Shortcut for get_prompt_budgeter().fit(...)."""
+    return get_prompt_budgeter().fit(endpoint, model, render, sections)
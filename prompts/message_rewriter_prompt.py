@@ -309,4 +309,20 @@ If user provides additional context:
 6. Each variation should feel distinct while maintaining the core message
 7. Return ONLY the messages, no explanations or commentary
 8. Do NOT wrap output in code fences (```) or any code block markers. Output plain text only.
-"""
\ No newline at end of file
+"""
+
+# Parallel mode: each variation is its own model call. The system prompt above is sent
+# unchanged (so all three calls share a cacheable prefix) and this override is appended
+# to the user prompt with the variation's strategy filled in.
+VARIATION_SEPARATOR = "---VARIATION_SEPARATOR---"
+
+variation_strategies = [
+    "Concise and direct (shorter, gets to the point quickly)",
+    "Balanced and detailed (medium length, well-structured)",
+    "Warm and personable (slightly longer, builds rapport)",
+]
+
+single_variation_instructions = """
+OUTPUT OVERRIDE: The other variations are being written separately. Write ONLY variation {number} of 3, using this approach: {strategy}.
+Output that one complete, ready-to-send message and nothing else - no separator, no label, no commentary.
+"""
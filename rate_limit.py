@@ -0,0 +1,227 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from saas.logger import get_logger
+
+try:
+    import redis
+except ImportError:  # optional: only needed for RATE_LIMIT_BACKEND=redis
+    redis = None
+
+logger = get_logger("rate_limit")
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a user has used up their request budget for an endpoint."""
+
+    def __init__(self, endpoint: str, retry_after: int):
+        super().__init__(f"Rate limit exceeded for {endpoint}")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class MemoryBucketBackend:
+    """
+    Token buckets held in this process — correct for a single worker only. Keeps the
+    `max_keys` most recently used buckets; a dropped bucket comes back full.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1.0) -> float:
+        """
+        Take `cost` tokens from the bucket at key, refilled at `rate` tokens/second up to `burst`.
+
+        Returns:
+            0.0 if the tokens were taken, else seconds until they will be available
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": self.name, "buckets": len(self._buckets)}
+
+
+# Refill-and-take in one round trip, so concurrent workers cannot both spend the last token.
+# Uses the Redis server clock, which every worker shares. Returns the wait in milliseconds.
+_TAKE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return wait
+"""
+
+
+class RedisBucketBackend:
+    """
+    Token buckets shared by every worker through Redis. Each bucket is a hash that expires
+    once it would have refilled, so idle users cost nothing. If Redis is unreachable the
+    request is allowed: rate limiting degrades rather than taking the API down.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, key_prefix: str = "ratelimit:"):
+        self.client = client
+        self.key_prefix = key_prefix
+        self._take = client.register_script(_TAKE_SCRIPT)
+        self.errors = 0
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1.0) -> float:
+        """Same contract as MemoryBucketBackend.take."""
+        try:
+            wait_ms = self._take(keys=[self.key_prefix + key], args=[rate, burst, cost])
+        except Exception as exc:
+            self.errors += 1
+            logger.warning("Rate limit backend unavailable, allowing request", extra={"error": str(exc)})
+            return 0.0
+        return int(wait_ms) / 1000
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "errors": self.errors}
+
+
+class RateLimiter:
+    """
+    Per-user, per-endpoint token-bucket rate limits. Each (user, endpoint) pair gets a
+    bucket of `burst` requests that refills at `per_minute` requests per minute, so short
+    bursts pass but a script hammering an endpoint is held to the sustained rate.
+    """
+
+    def __init__(self, backend, limits: dict[str, tuple[float, int]], default_limit: tuple[float, int]):
+        self.backend = backend
+        self.limits = limits
+        self.default_limit = default_limit
+        self.rejected: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def limit_for(self, endpoint: str) -> tuple[float, int]:
+        """(requests per minute, burst) for an API path."""
+        return self.limits.get(endpoint, self.default_limit)
+
+    def check(self, user_id: str, endpoint: str, cost: float = 1.0) -> None:
+        """
+        Spend `cost` requests from the user's bucket for endpoint.
+
+        Raises:
+            RateLimitExceeded: the bucket is empty; retry_after says when it will not be
+        """
+        per_minute, burst = self.limit_for(endpoint)
+        wait = self.backend.take(f"{user_id}:{endpoint}", per_minute / 60, burst, cost)
+        if wait <= 0:
+            return
+        with self._lock:
+            self.rejected[endpoint] = self.rejected.get(endpoint, 0) + 1
+        retry_after = max(1, math.ceil(wait))
+        logger.warning(
+            "Rate limit exceeded",
+            extra={"user_id": user_id, "endpoint": endpoint, "retry_after": retry_after},
+        )
+        raise RateLimitExceeded(endpoint, retry_after)
+
+    def stats(self) -> dict:
+        with self._lock:
+            rejected = dict(self.rejected)
+        return {**self.backend.stats(), "rejected": rejected}
+
+
+def _parse_limit(value: str) -> tuple[float, int]:
+    """Parse "per_minute:burst"."""
+    per_minute, _, burst = value.partition(":")
+    return float(per_minute), int(burst or math.ceil(float(per_minute)))
+
+
+def _parse_limits(value: str) -> dict[str, tuple[float, int]]:
+    """Parse "/api/rewrite-message=20:10,/api/company-research=5:3" into a dict."""
+    limits = {}
+    for pair in value.split(","):
+        if "=" in pair:
+            endpoint, limit = pair.rsplit("=", 1)
+            limits[endpoint.strip()] = _parse_limit(limit.strip())
+    return limits
+
+
+def _make_backend():
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    if backend == "redis":
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the redis package")
+        client = redis.Redis.from_url(
+            os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"),
+            socket_timeout=float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.2")),
+        )
+        return RedisBucketBackend(client)
+    if backend != "memory":
+        raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+    return MemoryBucketBackend(max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")))
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_rate_limiter: RateLimiter | None = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Return the process-wide rate limiter, creating it on first call.
+
+    Configured via env vars:
+        RATE_LIMITS                 endpoint=per_minute:burst pairs, comma-separated (default
+                                    "/api/rewrite-message=20:10,/api/company-research=5:3,
+                                    /api/ats-score/batch=6:2,/api/rewrite-message/bulk=4:2,
+                                    /api/tailoring-jobs=2:2")
+        RATE_LIMIT_DEFAULT          per_minute:burst for other AI endpoints (default 30:10)
+        RATE_LIMIT_BACKEND          "memory" (per worker) or "redis" (shared by all workers)
+        RATE_LIMIT_REDIS_URL        Redis URL for the redis backend (default redis://localhost:6379/0)
+        RATE_LIMIT_REDIS_TIMEOUT    Redis socket timeout in seconds (default 0.2)
+        RATE_LIMIT_MAX_KEYS         buckets kept by the memory backend (default 100000)
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(
+                    backend=_make_backend(),
+                    limits=_parse_limits(os.getenv(
+                        "RATE_LIMITS",
+                        "/api/rewrite-message=20:10,/api/company-research=5:3,"
+                        "/api/ats-score/batch=6:2,/api/rewrite-message/bulk=4:2,/api/tailoring-jobs=2:2",
+                    )),
+                    default_limit=_parse_limit(os.getenv("RATE_LIMIT_DEFAULT", "30:10")),
+                )
+    return _rate_limiter
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from saas.logger import get_logger
+
+logger = get_logger("response_cache")
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_response_key(model: str, messages: list[dict], params: dict) -> str:
+    """
+    Cache key for a chat completion: upstream model, a hash of the system prompt, a hash
+    of the user prompt and a hash of the sampling params (response_format, max_tokens...).
+    Editing a system prompt changes its hash, so the prompt version is part of the key.
+    """
+    system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    conversation = json.dumps([m for m in messages if m["role"] != "system"], sort_keys=True)
+    options = json.dumps(params, sort_keys=True, default=str)
+    return f"{model}:{_sha256(system)[:16]}:{_sha256(conversation)}:{_sha256(options)[:16]}"
+
+
+class ResponseCache:
+    """
+    In-memory LRU cache of finished LLM responses, bounded by total UTF-8 size and with
+    a fixed TTL per entry. Values are the full response text (streams) or the SDK
+    response object (non-streaming completions), sized by their text.
+
+    Thread-safe; hits and misses are counted per endpoint.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, object, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._endpoints: dict[str, dict[str, int]] = {}
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key: str, endpoint: str):
+        """Return the cached value for key, or None; counts a hit or miss for endpoint."""
+        with self._lock:
+            counters = self._endpoints.setdefault(endpoint, {"hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                self._drop(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            counters["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, value, text: str) -> None:
+        """Cache value under key; text is the response content used to size the entry."""
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time() + self.ttl_seconds, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key = next(iter(self._entries))
+                self._drop(old_key)
+                self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        """Remove one entry. Caller holds the lock."""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        """Return per-endpoint hit ratios and current memory usage."""
+        with self._lock:
+            endpoints = {}
+            for endpoint, counters in self._endpoints.items():
+                lookups = counters["hits"] + counters["misses"]
+                endpoints[endpoint] = {
+                    **counters,
+                    "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+                }
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "endpoints": endpoints,
+            }
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_response_cache: ResponseCache | None = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache | None:
+    """
+    Return the process-wide LLM response cache, or None unless it is enabled.
+
+    Configured via env vars:
+        LLM_CACHE_ENABLED        opt in to response caching (default false)
+        LLM_CACHE_TTL_SECONDS    how long a response is replayed (default 1 h)
+        LLM_CACHE_MAX_BYTES      memory budget for cached responses (default 32 MiB)
+    """
+    global _response_cache
+    if os.getenv("LLM_CACHE_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+                    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600")),
+                )
+                logger.info("LLM response cache initialized", extra=_response_cache.stats())
+    return _response_cache
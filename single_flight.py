@@ -0,0 +1,182 @@
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from saas.logger import get_logger
+
+logger = get_logger("single_flight")
+
+
+class IdempotencyConflict(Exception):
+    """Raised when a key is reused for a request whose fingerprint differs from the original."""
+
+
+def request_fingerprint(*parts: str | bytes | None) -> str:
+    """SHA-256 over the request's identifying parts (JSON body, raw upload bytes...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b""
+        elif isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class _Flight:
+    """One execution of a keyed call; followers wait on `done` and read its outcome."""
+
+    __slots__ = ("fingerprint", "done", "result", "error", "followers")
+
+    def __init__(self, fingerprint: str | None):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution: the first caller
+    runs the function and every caller that arrives while it is running blocks and
+    receives the same result (or exception).
+
+    With `retain_seconds` > 0, successful results are also kept for that long, so a
+    later call with the same key replays the result instead of running again — the
+    semantics of an Idempotency-Key. Failures are never retained, so a retry after an
+    error runs again. At most `max_retained` results are kept; the oldest go first.
+
+    Callers pass a request fingerprint; attaching to or replaying a key with a different
+    fingerprint raises IdempotencyConflict instead of returning someone else's result.
+
+    Thread-safe; meant for blocking handlers running in the threadpool.
+    """
+
+    def __init__(self, name: str, retain_seconds: float = 0, max_retained: int = 0):
+        self.name = name
+        self.retain_seconds = retain_seconds
+        self.max_retained = max_retained
+        self._flights: dict[str, _Flight] = {}
+        # Completed flights kept for replay, oldest first (retention is fixed, so also first to expire)
+        self._retained: deque[tuple[float, str]] = deque()
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.replayed = 0
+        self.conflicts = 0
+
+    def run(self, key: str, fn: Callable[[], object], fingerprint: str | None = None) -> tuple[object, bool]:
+        """
+        Run fn() under key, or share the result of the call already running or retained.
+
+        Returns:
+            (result, shared) — shared is True when the result came from another caller's run
+        """
+        with self._lock:
+            self._purge_expired()
+            flight = self._flights.get(key)
+            if flight is not None:
+                if flight.fingerprint != fingerprint:
+                    self.conflicts += 1
+                    raise IdempotencyConflict(key)
+                if flight.done.is_set():
+                    self.replayed += 1
+                else:
+                    self.coalesced += 1
+                    flight.followers += 1
+                leader = False
+            else:
+                flight = _Flight(fingerprint)
+                self._flights[key] = flight
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except BaseException as exc:
+            flight.error = exc
+            with self._lock:
+                self._flights.pop(key, None)
+                flight.done.set()
+            raise
+
+        with self._lock:
+            if self.retain_seconds > 0:
+                self._retained.append((time.monotonic() + self.retain_seconds, key))
+                while len(self._retained) > self.max_retained:
+                    self._flights.pop(self._retained.popleft()[1], None)
+            else:
+                self._flights.pop(key, None)
+            flight.done.set()
+        if flight.followers:
+            logger.info(
+                "Coalesced concurrent requests",
+                extra={"single_flight": self.name, "followers": flight.followers},
+            )
+        return flight.result, False
+
+    def _purge_expired(self) -> None:
+        """Drop retained results past their retention. Caller holds the lock."""
+        now = time.monotonic()
+        while self._retained and self._retained[0][0] <= now:
+            self._flights.pop(self._retained.popleft()[1], None)
+
+    def stats(self) -> dict:
+        """Return execution/coalescing/replay counters and the current number of keys."""
+        with self._lock:
+            self._purge_expired()
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "replayed": self.replayed,
+                "conflicts": self.conflicts,
+                "in_flight": len(self._flights) - len(self._retained),
+                "retained": len(self._retained),
+            }
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_request_coalescer: SingleFlight | None = None
+_idempotency_store: SingleFlight | None = None
+_single_flight_lock = threading.Lock()
+
+
+def get_request_coalescer() -> SingleFlight:
+    """Return the process-wide coalescer for identical in-flight requests (nothing retained)."""
+    global _request_coalescer
+    if _request_coalescer is None:
+        with _single_flight_lock:
+            if _request_coalescer is None:
+                _request_coalescer = SingleFlight("coalescer")
+    return _request_coalescer
+
+
+def get_idempotency_store() -> SingleFlight:
+    """
+    Return the process-wide Idempotency-Key store, creating it on first call.
+
+    Configured via env vars:
+        IDEMPOTENCY_TTL_SECONDS     how long a completed response is replayed (default 24 h)
+        IDEMPOTENCY_MAX_KEYS        completed responses kept, oldest dropped first (default 10000)
+    """
+    global _idempotency_store
+    if _idempotency_store is None:
+        with _single_flight_lock:
+            if _idempotency_store is None:
+                _idempotency_store = SingleFlight(
+                    "idempotency",
+                    retain_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600))),
+                    max_retained=int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000")),
+                )
+    return _idempotency_store
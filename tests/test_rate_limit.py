@@ -0,0 +1,149 @@
+"""
+Tests for saas.rate_limit: RateLimiter over the in-process memory backend and over the
+Redis backend, the latter running the real _TAKE_SCRIPT against an in-memory fake Redis.
+
+Usage (imports the `saas` package, as laid out in the image; the Redis backend tests
+need lupa to run Lua and are skipped without it):
+    pip install pytest lupa
+    python -m pytest tests/
+"""
+import pytest
+
+from saas import rate_limit
+from saas.rate_limit import MemoryBucketBackend, RateLimiter, RateLimitExceeded, RedisBucketBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class FakeRedis:
+    """
+    The part of redis.Redis that RedisBucketBackend uses: register_script() returns a
+    callable that runs the Lua script, with redis.call backed by a dict of hashes.
+    """
+
+    def __init__(self, clock: FakeClock):
+        lupa = pytest.importorskip("lupa")
+        self.clock = clock
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.ttls_ms: dict[str, int] = {}
+        self.lua = lupa.LuaRuntime()
+        self.lua.globals().redis = self.lua.table_from({"call": self._call})
+
+    def _call(self, command: str, *args):
+        command = command.upper()
+        if command == "TIME":
+            seconds, micros = divmod(round(self.clock.now * 1_000_000), 1_000_000)
+            return self.lua.table_from([str(seconds), str(micros)])
+        key = args[0]
+        if command == "HMGET":
+            fields = self.hashes.get(key, {})
+            # Redis passes a missing field to Lua as false
+            return self.lua.table_from([fields.get(name, False) for name in args[1:]])
+        if command == "HSET":
+            fields = self.hashes.setdefault(key, {})
+            for name, value in zip(args[1::2], args[2::2]):
+                fields[name] = str(value)
+            return 0
+        if command == "PEXPIRE":
+            self.ttls_ms[key] = int(args[1])
+            return 1
+        raise NotImplementedError(command)
+
+    def register_script(self, script: str):
+        run = self.lua.eval(f"function(KEYS, ARGV) {script} end")
+
+        def call(keys, args):
+            # Redis hands ARGV to the script as strings and truncates a Lua number reply
+            result = run(self.lua.table_from(keys), self.lua.table_from([str(arg) for arg in args]))
+            return int(result)
+
+        return call
+
+
+class BrokenRedis:
+    def register_script(self, script: str):
+        def call(keys, args):
+            raise ConnectionError("redis down")
+        return call
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock.now)
+    return clock
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request, clock):
+    if request.param == "memory":
+        return MemoryBucketBackend(max_keys=100)
+    return RedisBucketBackend(FakeRedis(clock))
+
+
+def make_limiter(backend, per_minute: float = 60, burst: int = 2) -> RateLimiter:
+    return RateLimiter(backend, limits={"/api/x": (per_minute, burst)}, default_limit=(600, 10))
+
+
+def test_burst_then_reject_until_refilled(backend, clock):
+    limiter = make_limiter(backend)
+    limiter.check("user_1", "/api/x")
+    limiter.check("user_1", "/api/x")
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        limiter.check("user_1", "/api/x")
+    assert exc_info.value.retry_after == 1
+    assert limiter.stats()["rejected"] == {"/api/x": 1}
+
+    clock.advance(1.0)
+    limiter.check("user_1", "/api/x")
+    with pytest.raises(RateLimitExceeded):
+        limiter.check("user_1", "/api/x")
+
+
+def test_refill_is_capped_at_burst(backend, clock):
+    limiter = make_limiter(backend)
+    clock.advance(3600)
+    limiter.check("user_1", "/api/x")
+    limiter.check("user_1", "/api/x")
+    with pytest.raises(RateLimitExceeded):
+        limiter.check("user_1", "/api/x")
+
+
+def test_buckets_are_per_user_and_endpoint(backend, clock):
+    limiter = make_limiter(backend, burst=1)
+    limiter.check("user_1", "/api/x")
+    with pytest.raises(RateLimitExceeded):
+        limiter.check("user_1", "/api/x")
+    limiter.check("user_2", "/api/x")
+    limiter.check("user_1", "/api/other")  # default limit, its own bucket
+
+
+def test_retry_after_covers_the_cost(backend, clock):
+    limiter = make_limiter(backend, per_minute=6, burst=3)
+    limiter.check("user_1", "/api/x", cost=3)
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        limiter.check("user_1", "/api/x", cost=2)
+    assert exc_info.value.retry_after == 20
+
+    clock.advance(20)
+    limiter.check("user_1", "/api/x", cost=2)
+
+
+def test_redis_bucket_expires_once_refilled(clock):
+    client = FakeRedis(clock)
+    make_limiter(RedisBucketBackend(client), per_minute=60, burst=5).check("user_1", "/api/x")
+    assert client.ttls_ms == {"ratelimit:user_1:/api/x": 6000}
+
+
+def test_redis_backend_fails_open():
+    backend = RedisBucketBackend(BrokenRedis())
+    limiter = make_limiter(backend, burst=1)
+    for _ in range(3):
+        limiter.check("user_1", "/api/x")
+    assert limiter.stats() == {"backend": "redis", "errors": 3, "rejected": {}}
@@ -0,0 +1,108 @@
+import os
+import threading
+from collections import OrderedDict
+
+_COUNTERS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def _field(obj, name: str):
+    """Read a usage field from an SDK model or a plain dict (e.g. Groq's x_groq.usage)."""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def usage_counts(usage) -> dict | None:
+    """
+    Normalise a provider usage object to prompt/completion/cached token counts.
+    cached_tokens is the part of the prompt served from the provider's prefix cache
+    (prompt_tokens_details.cached_tokens; 0 when the provider does not report it).
+
+    Returns:
+        {"prompt_tokens", "completion_tokens", "cached_tokens"}, or None without usage
+    """
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": _field(usage, "prompt_tokens") or 0,
+        "completion_tokens": _field(usage, "completion_tokens") or 0,
+        "cached_tokens": _field(_field(usage, "prompt_tokens_details"), "cached_tokens") or 0,
+    }
+
+
+def _summary(counters: dict) -> dict:
+    calls = counters["calls"]
+    prompt = counters["prompt_tokens"]
+    return {
+        **counters,
+        "avg_prompt_tokens": round(prompt / calls, 1) if calls else 0.0,
+        "avg_completion_tokens": round(counters["completion_tokens"] / calls, 1) if calls else 0.0,
+        "cached_prompt_ratio": round(counters["cached_tokens"] / prompt, 4) if prompt else 0.0,
+    }
+
+
+class TokenUsage:
+    """
+    In-memory token usage totals: per endpoint and upstream model, and per user and
+    endpoint. The per-user table keeps the `max_users` most recently active users.
+
+    Thread-safe; fed by saas.llm_engine after every provider call that reports usage.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._endpoints: dict[tuple[str, str], dict] = {}
+        self._users: OrderedDict[str, dict[str, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, model: str, user_id: str | None, counts: dict | None) -> None:
+        """Add one call's usage_counts() under endpoint/model and, when known, the user."""
+        if counts is None:
+            return
+        with self._lock:
+            totals = [self._endpoints.setdefault((endpoint, model), dict.fromkeys(_COUNTERS, 0))]
+            if user_id:
+                user = self._users.setdefault(user_id, {})
+                self._users.move_to_end(user_id)
+                totals.append(user.setdefault(endpoint, dict.fromkeys(_COUNTERS, 0)))
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            for entry in totals:
+                entry["calls"] += 1
+                for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                    entry[key] += counts[key]
+
+    def user_stats(self, user_id: str) -> dict:
+        """One user's totals per endpoint."""
+        with self._lock:
+            return {endpoint: _summary(dict(c)) for endpoint, c in self._users.get(user_id, {}).items()}
+
+    def stats(self) -> dict:
+        """Totals per endpoint and model, with average prompt size and cached-prompt ratio."""
+        with self._lock:
+            endpoints: dict[str, dict] = {}
+            for (endpoint, model), counters in self._endpoints.items():
+                endpoints.setdefault(endpoint, {})[model] = _summary(dict(counters))
+            return {"endpoints": endpoints, "users_tracked": len(self._users)}
+
+
+# Lazily initialized — populated on first use, after load_dotenv() has run
+_token_usage: TokenUsage | None = None
+_token_usage_lock = threading.Lock()
+
+
+def get_token_usage() -> TokenUsage:
+    """
+    Return the process-wide token usage totals, creating them on first call.
+
+    Configured via env vars:
+        TOKEN_USAGE_MAX_USERS   users whose totals are kept, least recent dropped (default 10000)
+    """
+    global _token_usage
+    if _token_usage is None:
+        with _token_usage_lock:
+            if _token_usage is None:
+                _token_usage = TokenUsage(max_users=int(os.getenv("TOKEN_USAGE_MAX_USERS", "10000")))
+    return _token_usage